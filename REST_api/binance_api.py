@@ -1,37 +1,43 @@
-import requests
-from .base_api import BaseApi
-from . import hist_bar_const as hbc
+import numpy as np
+from .http_api import HttpApi, decode_kline_array, matrix_to_columns
+from .. import hist_bar_const as hbc
 
-class BinanceApi(BaseApi):
+class BinanceApi(HttpApi):
     """
     Binance specific API for historical data.
     """
-    def __init__(self):
-        super().__init__('binance')
-
-    def get_hist_bars(self, symbol, interval):
-        standardized_symbol = self._standardize_symbol(symbol)
-        standardized_interval = self._standardize_interval(interval)
-        # Implement the actual API call here
-        # For now, returning dummy data
-        dummy_data = {
-            hbc.OHLCV_TIMESTAMP: [1672531200000, 1672531260000],
-            hbc.OHLCV_OPEN: [40000, 40100],
-            hbc.OHLCV_HIGH: [40200, 40300],
-            hbc.OHLCV_LOW: [39800, 39900],
-            hbc.OHLCV_CLOSE: [40100, 40200],
-            hbc.OHLCV_VOLUME: [100, 120]
+    page_limit = hbc.BINANCE_PAGE_LIMIT
+    request_weight = hbc.BINANCE_KLINES_WEIGHT
+
+    def __init__(self, transport=None):
+        super().__init__('binance', transport)
+
+    def _build_request(self, symbol, interval, start_time, end_time):
+        params = {
+            'symbol': self._standardize_symbol(symbol),
+            'interval': self._standardize_interval(interval),
+            'limit': self.page_limit,
         }
-        return self._parse_data(dummy_data)
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
+
+        return hbc.BINANCE_API_URL + hbc.BINANCE_KLINES_PATH, params
 
     def _standardize_symbol(self, symbol):
-        # Implement symbol standardization for Binance
-        return symbol.upper()
+        return symbol.replace('-', '').replace('/', '').upper()
 
     def _standardize_interval(self, interval):
-        # Implement interval standardization for Binance
+        # Binance uses the same interval names as hist_bar_const
         return interval
 
+    def _parse_content(self, content):
+        matrix = decode_kline_array(content, hbc.BINANCE_KLINE_WIDTH)
+        if matrix is None:
+            return super()._parse_content(content)
+        return matrix_to_columns(matrix)
+
     def _parse_data(self, data):
-        # Implement data parsing for Binance
-        return data
+        # Each kline is [open_time, open, high, low, close, volume, close_time, ...]
+        return matrix_to_columns(np.array(data, dtype=np.float64).reshape(-1, hbc.BINANCE_KLINE_WIDTH))
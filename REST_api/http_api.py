@@ -0,0 +1,123 @@
+import json
+import warnings
+from abc import abstractmethod
+import numpy as np
+from ..base_api import BaseApi
+from ..ohclv_data import OhclvData
+from .. import hist_bar_const as hbc
+from ..metrics import REGISTRY
+from .http_transport import get_shared_transport
+
+
+def decode_kline_array(content, row_width):
+    """
+    Decodes a raw JSON array of kline arrays straight into a float64 matrix.
+
+    Only works for payloads whose values are all numbers or numeric strings, such as
+    Binance klines. Brackets and quotes are stripped and the remaining comma separated
+    numbers are parsed by NumPy in one pass, without building Python objects.
+
+    Args:
+        content (bytes): The raw response body.
+        row_width (int): The number of values in every kline.
+
+    Returns:
+        np.ndarray: An (n, row_width) matrix, or None if the payload is not a plain kline array.
+    """
+    if not content.lstrip().startswith(b'['):
+        return None
+    text = content.translate(None, b'[]" \n\r\t')
+    if not text:
+        return np.empty((0, row_width), dtype=np.float64)
+    try:
+        with warnings.catch_warnings():
+            # Older NumPy only warns when it stops at a non-numeric value
+            warnings.simplefilter('error', DeprecationWarning)
+            values = np.fromstring(text, dtype=np.float64, sep=',')
+    except (ValueError, DeprecationWarning):
+        return None
+    if len(values) % row_width or len(values) != text.count(b',') + 1:
+        return None
+    return values.reshape(-1, row_width)
+
+
+def matrix_to_columns(matrix, columns=(0, 1, 2, 3, 4, 5), reverse=False):
+    """
+    Splits a kline matrix into contiguous OHLCV columns.
+
+    Args:
+        matrix (np.ndarray): An (n, k) float64 matrix of klines.
+        columns (tuple): The row positions of timestamp, open, high, low, close and volume.
+        reverse (bool): Whether the rows are newest first.
+
+    Returns:
+        dict: Arrays keyed by the standardized field names. The price and volume columns
+            are rows of a single transposed block, so OhclvData adopts them without copies.
+    """
+    if reverse:
+        matrix = matrix[::-1]
+    block = np.ascontiguousarray(matrix[:, list(columns)].T)
+    return {
+        hbc.OHLCV_TIMESTAMP: block[0].astype(np.int64),
+        hbc.OHLCV_OPEN: block[1],
+        hbc.OHLCV_HIGH: block[2],
+        hbc.OHLCV_LOW: block[3],
+        hbc.OHLCV_CLOSE: block[4],
+        hbc.OHLCV_VOLUME: block[5],
+    }
+
+
+class HttpApi(BaseApi):
+    """
+    Base class for exchanges that serve klines over a public HTTP endpoint.
+
+    Subclasses describe the request with `_build_request` and unwrap the response with
+    `_unwrap_payload`; this class performs the call through the shared, rate-limited
+    HttpTransport, blocking for get_hist_bars and natively async for aget_hist_bars.
+    """
+    # Rate-limit weight of one kline request.
+    request_weight = 1
+
+    def __init__(self, exchange, transport=None):
+        super().__init__(exchange)
+        self.transport = transport or get_shared_transport()
+        self._fetch_seconds = REGISTRY.histogram('rest_fetch_seconds', 'Duration of kline requests, including rate limiting and retries.', exchange=exchange)
+        self._parse_seconds = REGISTRY.histogram('rest_parse_seconds', 'Duration of parsing kline responses.', exchange=exchange)
+        self._bytes_in = REGISTRY.counter('rest_bytes_in_total', 'Kline response bytes received.', exchange=exchange)
+
+    def get_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        url, params = self._build_request(symbol, interval, start_time, end_time)
+        with self._fetch_seconds.time():
+            content = self.transport.get_content(self.exchange, url, params, self.request_weight)
+        return self._parse_timed(content)
+
+    async def aget_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        url, params = self._build_request(symbol, interval, start_time, end_time)
+        with self._fetch_seconds.time():
+            content = await self.transport.aget_content(self.exchange, url, params, self.request_weight)
+        return self._parse_timed(content)
+
+    def _parse_timed(self, content):
+        self._bytes_in.inc(len(content))
+        with self._parse_seconds.time():
+            return OhclvData(self._parse_content(content))
+
+    @abstractmethod
+    def _build_request(self, symbol, interval, start_time, end_time):
+        """
+        Returns:
+            tuple: The (url, params) of the kline request.
+        """
+
+    def _parse_content(self, content):
+        """
+        Parses a raw response body into OHLCV columns. Exchanges with a plain numeric
+        payload override this with a fast path that skips JSON decoding.
+        """
+        return self._parse_data(self._unwrap_payload(json.loads(content)))
+
+    def _unwrap_payload(self, payload):
+        """
+        Returns the kline rows from a decoded response, raising on exchange errors.
+        """
+        return payload
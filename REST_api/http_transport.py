@@ -0,0 +1,270 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from .. import hist_bar_const as hbc
+
+# Failures worth retrying with backoff; timeouts come from hbc.HTTP_TIMEOUT
+_RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout)
+_ARETRYABLE_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+# Priority of the requests issued in the current context, see request_priority().
+_request_priority = contextvars.ContextVar('request_priority', default=hbc.PRIORITY_BACKFILL)
+
+
+@contextlib.contextmanager
+def request_priority(priority):
+    """
+    Sets the scheduling priority of HTTP requests made in this context.
+
+    Example:
+        with request_priority(hbc.PRIORITY_LIVE):
+            hist_api.get_hist_bars(symbol, interval, start_time, end_time)
+    """
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+class RateLimiter:
+    """
+    A token bucket that hands out request weight in priority order.
+
+    Waiters queue in a heap ordered by (priority, arrival); only the head of the queue
+    may take tokens, so live requests overtake queued backfill requests.
+    """
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._cancelled = set()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self, weight=1, priority=hbc.PRIORITY_BACKFILL):
+        """ Blocks until `weight` tokens are granted. """
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                delay = self._try_take(ticket, weight)
+                if delay == 0:
+                    return
+                time.sleep(delay)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    async def aacquire(self, weight=1, priority=hbc.PRIORITY_BACKFILL):
+        """ Waits without blocking the event loop until `weight` tokens are granted. """
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                delay = self._try_take(ticket, weight)
+                if delay == 0:
+                    return
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    def pause(self, seconds):
+        """ Stops granting tokens for `seconds`, e.g. after the exchange answered 429. """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+    def _enqueue(self, priority):
+        with self._lock:
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiters, ticket)
+            return ticket
+
+    def _cancel(self, ticket):
+        with self._lock:
+            self._cancelled.add(ticket)
+            self._drop_cancelled()
+
+    def _drop_cancelled(self):
+        while self._waiters and self._waiters[0] in self._cancelled:
+            self._cancelled.discard(heapq.heappop(self._waiters))
+
+    def _try_take(self, ticket, weight):
+        """ Takes the tokens if `ticket` is at the head of the queue, else returns the time to wait. """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+            self._updated = now
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            self._drop_cancelled()
+            shortfall = weight - self._tokens
+            if self._waiters[0] == ticket and shortfall <= 0:
+                heapq.heappop(self._waiters)
+                self._tokens -= weight
+                return 0
+            return max(shortfall / self.refill_per_second, 0.005)
+
+
+class HttpTransport:
+    """
+    A connection-pooled HTTP client shared by the REST_api exchanges.
+
+    Keeps one keep-alive `requests.Session` for blocking calls and one `aiohttp`
+    session for async calls, throttles each exchange through its own RateLimiter and
+    retries throttled or failed requests with exponential backoff.
+    """
+    def __init__(self, pool_size=hbc.HTTP_POOL_SIZE, max_retries=hbc.HTTP_MAX_RETRIES,
+                 backoff_base=hbc.HTTP_BACKOFF_BASE, rate_limits=None):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.rate_limits = dict(hbc.RATE_LIMITS, **(rate_limits or {}))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._async_session = None
+        self._async_loop = None
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, exchange):
+        """ Returns the RateLimiter of `exchange`, or None if it has no configured limit. """
+        with self._lock:
+            if exchange not in self._limiters:
+                limit = self.rate_limits.get(exchange)
+                self._limiters[exchange] = RateLimiter(*limit) if limit else None
+            return self._limiters[exchange]
+
+    def get_json(self, exchange, url, params=None, weight=1):
+        """ Performs a rate-limited GET and returns the decoded JSON body. """
+        return json.loads(self.get_content(exchange, url, params, weight))
+
+    def get_content(self, exchange, url, params=None, weight=1):
+        """
+        Performs a rate-limited GET and returns the raw response body.
+
+        Raises:
+            requests.HTTPError: If the request still fails after all retries.
+        """
+        limiter = self.limiter(exchange)
+        priority = _request_priority.get()
+        for attempt in range(self.max_retries + 1):
+            if limiter is not None:
+                limiter.acquire(weight, priority)
+            try:
+                response = self.session.get(url, params=params, timeout=hbc.HTTP_TIMEOUT)
+            except _RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in hbc.HTTP_RETRY_STATUSES and attempt < self.max_retries:
+                time.sleep(self._on_retryable(limiter, response.status_code, response.headers, attempt))
+                continue
+            response.raise_for_status()
+            return response.content
+
+    async def aget_json(self, exchange, url, params=None, weight=1):
+        """ Awaitable version of get_json. """
+        return json.loads(await self.aget_content(exchange, url, params, weight))
+
+    async def aget_content(self, exchange, url, params=None, weight=1):
+        """
+        Awaitable version of get_content.
+
+        Raises:
+            aiohttp.ClientResponseError: If the request still fails after all retries.
+        """
+        limiter = self.limiter(exchange)
+        priority = _request_priority.get()
+        session = self._get_async_session()
+        for attempt in range(self.max_retries + 1):
+            if limiter is not None:
+                await limiter.aacquire(weight, priority)
+            try:
+                async with session.get(url, params=params) as response:
+                    if response.status in hbc.HTTP_RETRY_STATUSES and attempt < self.max_retries:
+                        delay = self._on_retryable(limiter, response.status, response.headers, attempt)
+                    else:
+                        response.raise_for_status()
+                        return await response.read()
+            except _ARETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            await asyncio.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+    async def aclose(self):
+        if self._async_session is not None and self._async_loop is asyncio.get_running_loop():
+            await self._async_session.close()
+        self._async_session = None
+        self.close()
+
+    def _get_async_session(self):
+        # The session binds to the running loop, so it is created on first use
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_session.closed or self._async_loop is not loop:
+            self._async_loop = loop
+            connector = aiohttp.TCPConnector(limit_per_host=self.pool_size, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(total=hbc.HTTP_TIMEOUT)
+            self._async_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._async_session
+
+    def _on_retryable(self, limiter, status, headers, attempt):
+        delay = self._backoff(attempt)
+        retry_after = headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        # Throttling responses mean the exchange's window is exhausted for everyone
+        if status in (418, 429) and limiter is not None:
+            limiter.pause(delay)
+        return delay
+
+    def _backoff(self, attempt):
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random() / 2)
+
+
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+
+def get_shared_transport():
+    """ Returns the process-wide HttpTransport, creating it on first use. """
+    global _shared_transport
+    with _shared_transport_lock:
+        if _shared_transport is None:
+            _shared_transport = HttpTransport()
+        return _shared_transport
+
+
+async def aclose_shared_transport():
+    """ Closes the process-wide HttpTransport if it was created. """
+    global _shared_transport
+    with _shared_transport_lock:
+        transport, _shared_transport = _shared_transport, None
+    if transport is not None:
+        await transport.aclose()
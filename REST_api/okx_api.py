@@ -1,37 +1,47 @@
-import requests
-from .base_api import BaseApi
-from . import hist_bar_const as hbc
+import numpy as np
+from .http_api import HttpApi, matrix_to_columns
+from .. import hist_bar_const as hbc
 
-class OkxApi(BaseApi):
+class OkxApi(HttpApi):
     """
     OKX specific API for historical data.
     """
-    def __init__(self):
-        super().__init__('okx')
-
-    def get_hist_bars(self, symbol, interval):
-        standardized_symbol = self._standardize_symbol(symbol)
-        standardized_interval = self._standardize_interval(interval)
-        # Implement the actual API call here
-        # For now, returning dummy data
-        dummy_data = {
-            hbc.OHLCV_TIMESTAMP: [1672531200000, 1672531260000],
-            hbc.OHLCV_OPEN: [40000, 40100],
-            hbc.OHLCV_HIGH: [40200, 40300],
-            hbc.OHLCV_LOW: [39800, 39900],
-            hbc.OHLCV_CLOSE: [40100, 40200],
-            hbc.OHLCV_VOLUME: [100, 120]
+    page_limit = hbc.OKX_PAGE_LIMIT
+
+    def __init__(self, transport=None):
+        super().__init__('okx', transport)
+
+    def _build_request(self, symbol, interval, start_time, end_time):
+        params = {
+            'instId': self._standardize_symbol(symbol),
+            'bar': self._standardize_interval(interval),
+            'limit': self.page_limit,
         }
-        return self._parse_data(dummy_data)
+        # OKX pages backwards: 'after' returns bars older than the given
+        # timestamp and 'before' returns bars newer than it (both exclusive).
+        if end_time is not None:
+            params['after'] = end_time + 1
+        if start_time is not None:
+            params['before'] = start_time - 1
+
+        return hbc.OKX_API_URL + hbc.OKX_KLINES_PATH, params
+
+    def _unwrap_payload(self, payload):
+        if payload.get('code') != '0':
+            raise ValueError(f"OKX API error {payload.get('code')}: {payload.get('msg')}")
+        return payload['data']
 
     def _standardize_symbol(self, symbol):
-        # Implement symbol standardization for OKX
-        return symbol.upper()
+        return symbol.replace('_', '-').replace('/', '-').upper()
 
     def _standardize_interval(self, interval):
-        # Implement interval standardization for OKX
-        return interval
+        interval_map = {
+            hbc.INTERVAL_1HOUR: '1H',
+            hbc.INTERVAL_4HOUR: '4H',
+            hbc.INTERVAL_1DAY: '1Dutc',
+        }
+        return interval_map.get(interval, interval)
 
     def _parse_data(self, data):
-        # Implement data parsing for OKX
-        return data
+        # Each candle is [ts, open, high, low, close, vol, ...] as strings, newest first
+        return matrix_to_columns(np.array(data, dtype=np.float64).reshape(-1, hbc.OKX_KLINE_WIDTH), reverse=True)
@@ -1,6 +1,9 @@
+import numpy as np
 from tigeropen.quote.quote_client import QuoteClient
-from .base_api import BaseApi
-from . import hist_bar_const as hbc
+from ..base_api import BaseApi
+from ..ohclv_data import OhclvData
+from .. import hist_bar_const as hbc
+from ..metrics import REGISTRY
 
 # TODO: Replace with your actual Tiger API credentials
 TIGER_LICENSE = 'your_license'
@@ -11,16 +14,22 @@ class TigerApi(BaseApi):
     """
     Tiger specific API for historical data.
     """
+    page_limit = hbc.TIGER_PAGE_LIMIT
+
     def __init__(self):
         super().__init__('tiger')
         self.client = QuoteClient(license=TIGER_LICENSE, private_key=TIGER_PRIVATE_KEY, tiger_id=TIGER_ACCOUNT)
+        self._fetch_seconds = REGISTRY.histogram('rest_fetch_seconds', 'Duration of kline requests, including rate limiting and retries.', exchange=self.exchange)
+        self._parse_seconds = REGISTRY.histogram('rest_parse_seconds', 'Duration of parsing kline responses.', exchange=self.exchange)
 
     def get_hist_bars(self, symbol, interval, start_time=None, end_time=None):
         standardized_symbol = self._standardize_symbol(symbol)
         standardized_interval = self._standardize_interval(interval)
 
-        bars = self.client.get_bars(symbols=[standardized_symbol], period=standardized_interval, begin_time=start_time, end_time=end_time)
-        return self._parse_data(bars)
+        with self._fetch_seconds.time():
+            bars = self.client.get_bars(symbols=[standardized_symbol], period=standardized_interval, begin_time=start_time, end_time=end_time)
+        with self._parse_seconds.time():
+            return OhclvData(self._parse_data(bars))
 
     def _standardize_symbol(self, symbol):
         # Symbol format for Tiger depends on the market.
@@ -42,12 +51,13 @@ class TigerApi(BaseApi):
         if data.empty:
             return {}
 
+        # to_numpy returns the DataFrame's own buffer when the dtype already matches
         parsed_data = {
-            hbc.OHLCV_TIMESTAMP: data['time'].tolist(),
-            hbc.OHLCV_OPEN: data['open'].tolist(),
-            hbc.OHLCV_HIGH: data['high'].tolist(),
-            hbc.OHLCV_LOW: data['low'].tolist(),
-            hbc.OHLCV_CLOSE: data['close'].tolist(),
-            hbc.OHLCV_VOLUME: data['volume'].tolist(),
+            hbc.OHLCV_TIMESTAMP: data['time'].to_numpy(dtype=np.int64),
+            hbc.OHLCV_OPEN: data['open'].to_numpy(dtype=np.float64),
+            hbc.OHLCV_HIGH: data['high'].to_numpy(dtype=np.float64),
+            hbc.OHLCV_LOW: data['low'].to_numpy(dtype=np.float64),
+            hbc.OHLCV_CLOSE: data['close'].to_numpy(dtype=np.float64),
+            hbc.OHLCV_VOLUME: data['volume'].to_numpy(dtype=np.float64),
         }
         return parsed_data
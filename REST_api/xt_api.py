@@ -1,37 +1,46 @@
-import requests
-from .base_api import BaseApi
-from . import hist_bar_const as hbc
+import numpy as np
+from .http_api import HttpApi, matrix_to_columns
+from .. import hist_bar_const as hbc
 
-class XtApi(BaseApi):
+class XtApi(HttpApi):
     """
     XT specific API for historical data.
     """
-    def __init__(self):
-        super().__init__('xt')
-
-    def get_hist_bars(self, symbol, interval):
-        standardized_symbol = self._standardize_symbol(symbol)
-        standardized_interval = self._standardize_interval(interval)
-        # Implement the actual API call here
-        # For now, returning dummy data
-        dummy_data = {
-            hbc.OHLCV_TIMESTAMP: [1672531200000, 1672531260000],
-            hbc.OHLCV_OPEN: [40000, 40100],
-            hbc.OHLCV_HIGH: [40200, 40300],
-            hbc.OHLCV_LOW: [39800, 39900],
-            hbc.OHLCV_CLOSE: [40100, 40200],
-            hbc.OHLCV_VOLUME: [100, 120]
+    page_limit = hbc.XT_PAGE_LIMIT
+
+    def __init__(self, transport=None):
+        super().__init__('xt', transport)
+
+    def _build_request(self, symbol, interval, start_time, end_time):
+        params = {
+            'symbol': self._standardize_symbol(symbol),
+            'interval': self._standardize_interval(interval),
+            'limit': self.page_limit,
         }
-        return self._parse_data(dummy_data)
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
+
+        return hbc.XT_API_URL + hbc.XT_KLINES_PATH, params
+
+    def _unwrap_payload(self, payload):
+        if payload.get('rc') != 0:
+            raise ValueError(f"XT API error {payload.get('mc')}")
+        return payload['result']
 
     def _standardize_symbol(self, symbol):
-        # Implement symbol standardization for XT
-        return symbol.lower()
+        return symbol.replace('-', '_').replace('/', '_').lower()
 
     def _standardize_interval(self, interval):
-        # Implement interval standardization for XT
+        # XT uses the same interval names as hist_bar_const
         return interval
 
     def _parse_data(self, data):
-        # Implement data parsing for XT
-        return data
+        # Each kline is {'t': ts, 'o': open, 'h': high, 'l': low, 'c': close, 'q': qty, 'v': value}
+        matrix = np.array([(row['t'], row['o'], row['h'], row['l'], row['c'], row['q']) for row in data],
+                          dtype=np.float64).reshape(-1, 6)
+        timestamps = matrix[:, 0]
+        if np.any(timestamps[1:] < timestamps[:-1]):
+            matrix = matrix[np.argsort(timestamps, kind='stable')]
+        return matrix_to_columns(matrix)
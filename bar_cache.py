@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from .bar_store import BarStore
+from .ohclv_data import OhclvData
+from . import hist_bar_const as hbc
+
+COVERAGE_FILE = 'coverage.json'
+
+
+class BarCache:
+    """
+    A disk-backed cache of historical bars keyed by (exchange, symbol, interval).
+
+    Bars are kept in a memory-mapped BarStore partition per key, next to a coverage file
+    listing the inclusive [start, end] millisecond ranges that have already been fetched
+    from the exchange.
+    """
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._stores = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def missing_ranges(self, exchange, symbol, interval, start_time, end_time):
+        """
+        Returns the parts of [start_time, end_time] that are not covered by the cache.
+
+        Args:
+            exchange (str): The exchange name.
+            symbol (str): The symbol.
+            interval (str): A standardized interval from hist_bar_const.
+            start_time (int): Inclusive range start in epoch milliseconds.
+            end_time (int): Inclusive range end in epoch milliseconds.
+
+        Returns:
+            list: Inclusive (start, end) tuples in ascending order.
+        """
+        missing = []
+        cursor = start_time
+        for covered_start, covered_end in self._read_coverage(self._key_dir(exchange, symbol, interval)):
+            if covered_end < cursor:
+                continue
+            if covered_start > end_time:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start - 1))
+            cursor = covered_end + 1
+        if cursor <= end_time:
+            missing.append((cursor, end_time))
+        return missing
+
+    def load(self, exchange, symbol, interval, start_time=None, end_time=None):
+        """
+        Loads cached bars with timestamps in [start_time, end_time].
+
+        Returns:
+            OhclvData: The cached bars in ascending timestamp order.
+        """
+        return self._store(exchange).load(symbol, interval, start_time, end_time)
+
+    def store(self, exchange, symbol, interval, ohlcv, ranges):
+        """
+        Merges freshly fetched bars into the cache and marks `ranges` as covered.
+
+        Bars in `ohlcv` replace cached bars with the same timestamp. Coverage is only
+        recorded up to the last closed bar, so a still-forming bar is refetched later.
+
+        Args:
+            ohlcv (OhclvData): The fetched bars.
+            ranges (list): The inclusive (start, end) ranges that were fetched.
+        """
+        key_dir = self._key_dir(exchange, symbol, interval)
+        with self._key_lock(key_dir):
+            store = self._store(exchange)
+            coverage = self._read_coverage(key_dir)
+            last = store.last_timestamp(symbol, interval)
+            if len(ohlcv) and (last is None or ohlcv.timestamps[0] > last):
+                store.append(symbol, interval, ohlcv)
+            elif len(ohlcv):
+                # Typically a refresh starting at the forming bar: only the overlapping
+                # tail is merged and rewritten
+                first = int(ohlcv.timestamps[0])
+                tail = self._merge(store.load(symbol, interval, start_time=first), ohlcv)
+                # Uncover the tail while it is rewritten, so a crash leads to a refetch
+                self._write_coverage(key_dir, [(start, min(end, first - 1)) for start, end in coverage if start < first])
+                store.replace_tail(symbol, interval, tail)
+
+            # Bars open on interval boundaries, so a range covers every timestamp up to
+            # the next boundary after its end.
+            interval_ms = hbc.INTERVAL_MS[interval]
+            closed_end = self._last_closed_end(interval)
+            for start, end in ranges:
+                end = min(end // interval_ms * interval_ms + interval_ms - 1, closed_end)
+                if start <= end:
+                    coverage.append((start, end))
+            self._write_coverage(key_dir, self._merge_ranges(coverage))
+
+    def _store(self, exchange):
+        with self._locks_guard:
+            if exchange not in self._stores:
+                self._stores[exchange] = BarStore(self.root_dir, exchange)
+            return self._stores[exchange]
+
+    def _key_dir(self, exchange, symbol, interval):
+        return self._store(exchange).partition_dir(symbol, interval)
+
+    def _key_lock(self, key_dir):
+        with self._locks_guard:
+            return self._locks.setdefault(key_dir, threading.Lock())
+
+    @staticmethod
+    def _merge(cached, fresh):
+        # Fresh bars win over cached ones with the same timestamp
+        return OhclvData.merge(cached, fresh)
+
+    @staticmethod
+    def _read_coverage(key_dir):
+        path = os.path.join(key_dir, COVERAGE_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [tuple(r) for r in json.load(f)]
+
+    def _write_coverage(self, key_dir, coverage):
+        os.makedirs(key_dir, exist_ok=True)
+        self._atomic_write(os.path.join(key_dir, COVERAGE_FILE), lambda f: f.write(json.dumps(coverage).encode('utf-8')))
+
+    @staticmethod
+    def _merge_ranges(ranges):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def _last_closed_end(interval):
+        interval_ms = hbc.INTERVAL_MS[interval]
+        now = int(time.time() * 1000)
+        return now // interval_ms * interval_ms - 1
+
+    @staticmethod
+    def _atomic_write(path, write):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,263 @@
+import struct
+import numpy as np
+from .ohclv_data import OhclvData
+
+CODEC_MAGIC = b'OHLZ'
+CODEC_VERSION = 1
+# Magic, version, bar count and the first and last timestamp, so readers can skip blocks
+BLOCK_HEADER = struct.Struct('<4sBIqq')
+# Column mode and the byte length of its varints
+SECTION_HEADER = struct.Struct('<BI')
+# Length prefix of each block in a stream written by write_blocks
+FRAME_HEADER = struct.Struct('<I')
+
+MODE_DELTA_OF_DELTA = 0
+MODE_XOR = 0xFF  # modes 0..MAX_SCALE of price and volume sections are decimal places
+MAX_SCALE = 9
+MAX_EXACT = 2 ** 53  # largest scaled magnitude a float64 represents exactly
+MAX_VARINT_BYTES = 10
+SCALE_SAMPLE = 64  # values checked against every scale before whole columns are
+DEFAULT_BLOCK_SIZE = 4096
+
+
+def encode_block(ohlcv, start=0, stop=None):
+    """
+    Encodes a slice of bars as a single compressed block.
+
+    After the header, the block holds a section each for the timestamps, prices and
+    volumes: a mode byte, a byte length and LEB128 varints. Timestamps are zigzag
+    delta-of-deltas, so a regular series takes a byte per bar. Prices that are exact
+    decimals with at most MAX_SCALE places are scaled integers, the open relative to the
+    previous close and the rest relative to the open; volumes are scaled the same way.
+    Other columns fall back to each value's float64 bits XORed with the previous one's.
+
+    Args:
+        ohlcv (OhclvData): The bars, in ascending timestamp order for the best ratio.
+        start (int): Index of the first bar to encode.
+        stop (int): Index after the last bar to encode, the end if None.
+
+    Returns:
+        bytes: The encoded block.
+    """
+    timestamps = ohlcv.timestamps[start:stop]
+    prices = [column[start:stop] for column in (ohlcv.open, ohlcv.high, ohlcv.low, ohlcv.close)]
+    volume = ohlcv.volume[start:stop]
+    count = len(timestamps)
+
+    first, last = (int(timestamps[0]), int(timestamps[-1])) if count else (0, 0)
+    deltas = np.diff(timestamps)
+    delta_of_deltas = deltas.copy()
+    delta_of_deltas[1:] -= deltas[:-1]
+    return b''.join((
+        BLOCK_HEADER.pack(CODEC_MAGIC, CODEC_VERSION, count, first, last),
+        _section(MODE_DELTA_OF_DELTA, _encode_varints(_zigzag(delta_of_deltas))),
+        _encode_prices(*prices),
+        _encode_volume(volume),
+    ))
+
+
+def decode_block(value):
+    """
+    Decodes a block produced by encode_block, vectorized over whole columns.
+
+    Decoding is lossless: the bars compare equal to the encoded ones.
+
+    Returns:
+        OhclvData: The decoded bars.
+    """
+    count, first, _ = block_info(value)
+    offset = BLOCK_HEADER.size
+
+    _, payload, offset = _read_section(value, offset)
+    deltas = np.cumsum(_unzigzag(_decode_varints(payload, max(count - 1, 0))))
+    timestamps = np.empty(count, dtype=np.int64)
+    timestamps[:1] = first
+    np.cumsum(deltas, out=timestamps[1:])
+    timestamps[1:] += first
+
+    mode, payload, offset = _read_section(value, offset)
+    residuals = _decode_varints(payload, 4 * count).reshape(4, count)
+    if mode == MODE_XOR:
+        prices = [_unxor(column) for column in residuals]
+    else:
+        open_residual, high, low, close = _unzigzag(residuals)
+        # open = previous close + residual, with every other price relative to the open
+        increments = open_residual.copy()
+        increments[1:] += close[:-1]
+        open_ = np.cumsum(increments)
+        factor = 10.0 ** mode
+        prices = [column / factor for column in (open_, open_ + high, open_ + low, open_ + close)]
+
+    mode, payload, offset = _read_section(value, offset)
+    volume = _decode_varints(payload, count)
+    volume = _unxor(volume) if mode == MODE_XOR else _unzigzag(volume) / 10.0 ** mode
+    if offset != len(value):
+        raise ValueError('Compressed block has trailing bytes.')
+    return OhclvData.from_arrays(timestamps, *prices, volume)
+
+
+def block_info(value):
+    """
+    Reads a block header without decoding the bars.
+
+    Returns:
+        tuple: (count, first timestamp, last timestamp) of the block.
+    """
+    magic, version, count, first, last = BLOCK_HEADER.unpack_from(value)
+    if magic != CODEC_MAGIC or version != CODEC_VERSION:
+        raise ValueError(f'Unsupported compressed block (magic={magic!r}, version={version}).')
+    return count, first, last
+
+
+def write_blocks(file, ohlcv, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Writes bars to a binary file as length-prefixed blocks of `block_size` bars.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    written = 0
+    for start in range(0, len(ohlcv), block_size):
+        block = encode_block(ohlcv, start, start + block_size)
+        file.write(FRAME_HEADER.pack(len(block)))
+        file.write(block)
+        written += FRAME_HEADER.size + len(block)
+    return written
+
+
+def read_blocks(file, start_time=None, end_time=None):
+    """
+    Reads bars written by write_blocks with start_time <= timestamp <= end_time.
+
+    Blocks outside the range are skipped from their headers without being decoded.
+
+    Returns:
+        OhclvData: The bars in ascending timestamp order without duplicates.
+    """
+    pages = []
+    while True:
+        frame = file.read(FRAME_HEADER.size)
+        if not frame:
+            break
+        block = file.read(FRAME_HEADER.unpack(frame)[0])
+        _, first, last = block_info(block)
+        if (start_time is not None and last < start_time) or (end_time is not None and first > end_time):
+            continue
+        pages.append(decode_block(block).between(start_time, end_time))
+    return OhclvData.merge(*pages)
+
+
+def _section(mode, payload):
+    return SECTION_HEADER.pack(mode, len(payload)) + payload
+
+
+def _read_section(value, offset):
+    mode, size = SECTION_HEADER.unpack_from(value, offset)
+    offset += SECTION_HEADER.size
+    if offset + size > len(value):
+        raise ValueError('Compressed block is truncated.')
+    return mode, value[offset:offset + size], offset + size
+
+
+def _encode_prices(open_, high, low, close):
+    scale = _decimal_scale(np.concatenate((open_, high, low, close)))
+    if scale is None:
+        return _section(MODE_XOR, _encode_varints(np.concatenate([_xor(column) for column in (open_, high, low, close)])))
+
+    factor = 10.0 ** scale
+    open_, high, low, close = (np.rint(column * factor).astype(np.int64) for column in (open_, high, low, close))
+    open_residual = open_.copy()
+    open_residual[1:] -= close[:-1]
+    residuals = np.concatenate((open_residual, high - open_, low - open_, close - open_))
+    return _section(scale, _encode_varints(_zigzag(residuals)))
+
+
+def _encode_volume(volume):
+    scale = _decimal_scale(volume)
+    if scale is None:
+        return _section(MODE_XOR, _encode_varints(_xor(volume)))
+    return _section(scale, _encode_varints(_zigzag(np.rint(volume * 10.0 ** scale).astype(np.int64))))
+
+
+def _decimal_scale(values):
+    """ Returns the fewest decimal places that represent every value exactly, or None. """
+    if not np.all(np.isfinite(values)) or np.any(np.signbit(values) & (values == 0)):
+        return None
+    # Most columns either fail every scale or pass a small one; a sample settles that cheaply
+    scale = _sample_scale(values[:SCALE_SAMPLE], 0)
+    while scale is not None:
+        factor = 10.0 ** scale
+        scaled = np.rint(values * factor)
+        if len(scaled) and np.abs(scaled).max() >= MAX_EXACT:
+            return None
+        if np.array_equal(scaled / factor, values):
+            return scale
+        scale = _sample_scale(values, scale + 1)
+    return None
+
+
+def _sample_scale(values, first):
+    for scale in range(first, MAX_SCALE + 1):
+        factor = 10.0 ** scale
+        if np.array_equal(np.rint(values * factor) / factor, values):
+            return scale
+    return None
+
+
+def _xor(values):
+    bits = np.ascontiguousarray(values, dtype='<f8').view(np.uint64)
+    xored = bits.copy()
+    xored[1:] ^= bits[:-1]
+    return xored
+
+
+def _unxor(xored):
+    return np.bitwise_xor.accumulate(xored).view(np.float64)
+
+
+def _zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(values):
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def _encode_varints(values):
+    """ Encodes unsigned integers as LEB128 varints, 7 bits per byte, low bits first. """
+    lengths = np.ones(len(values), dtype=np.int64)
+    for position in range(1, MAX_VARINT_BYTES):
+        lengths += values >= np.uint64(1 << (7 * position))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    encoded = np.empty(int(ends[-1]) if len(values) else 0, dtype=np.uint8)
+    for position in range(MAX_VARINT_BYTES):
+        mask = lengths > position
+        if not mask.any():
+            break
+        chunk = (values[mask] >> np.uint64(7 * position)) & np.uint64(0x7F)
+        # The high bit marks that more bytes of the same value follow
+        chunk |= (lengths[mask] > position + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[mask] + position] = chunk
+    return encoded.tobytes()
+
+
+def _decode_varints(payload, count):
+    data = np.frombuffer(payload, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    if len(ends) != count or (count and ends[-1] != len(data) - 1):
+        raise ValueError('Compressed block has a corrupt varint section.')
+    starts = np.zeros(count, dtype=np.int64)
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    longest = int(lengths.max()) if count else 0
+    if longest > MAX_VARINT_BYTES:
+        raise ValueError('Compressed block has a corrupt varint section.')
+
+    values = np.zeros(count, dtype=np.uint64)
+    for position in range(longest):
+        mask = lengths > position
+        chunk = data[starts[mask] + position].astype(np.uint64) & np.uint64(0x7F)
+        values[mask] |= chunk << np.uint64(7 * position)
+    return values
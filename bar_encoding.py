@@ -0,0 +1,149 @@
+import json
+import struct
+import numpy as np
+from .bar_codec import encode_block
+from .ohclv_data import OhclvData
+from . import hist_bar_const as hbc
+
+ENCODING_JSON = 'json'
+ENCODING_STRUCT = 'struct'
+ENCODING_BATCH = 'batch'
+ENCODING_COMPRESSED = 'compressed'
+
+# One bar per message: little-endian int64 timestamp followed by five float64 fields.
+STRUCT_DTYPE = np.dtype([
+    (hbc.OHLCV_TIMESTAMP, '<i8'),
+    (hbc.OHLCV_OPEN, '<f8'),
+    (hbc.OHLCV_HIGH, '<f8'),
+    (hbc.OHLCV_LOW, '<f8'),
+    (hbc.OHLCV_CLOSE, '<f8'),
+    (hbc.OHLCV_VOLUME, '<f8'),
+])
+
+# Many bars per message: magic, version and bar count, then one column per field.
+BATCH_MAGIC = b'OHLC'
+BATCH_VERSION = 1
+BATCH_HEADER = struct.Struct('<4sBI')
+
+
+def encode_json_records(ohlcv, start=0, stop=None, extra_columns=None):
+    """
+    Encodes bars as one JSON object per bar.
+
+    Args:
+        extra_columns (dict): Additional arrays aligned with the bars, e.g. indicator
+            values, added to every object under their key. NaN is encoded as null.
+
+    Returns:
+        tuple: (keys, values) lists of bytes, one entry per bar.
+    """
+    columns = {
+        hbc.OHLCV_TIMESTAMP: ohlcv.timestamps[start:stop].tolist(),
+        hbc.OHLCV_OPEN: ohlcv.open[start:stop].tolist(),
+        hbc.OHLCV_HIGH: ohlcv.high[start:stop].tolist(),
+        hbc.OHLCV_LOW: ohlcv.low[start:stop].tolist(),
+        hbc.OHLCV_CLOSE: ohlcv.close[start:stop].tolist(),
+        hbc.OHLCV_VOLUME: ohlcv.volume[start:stop].tolist(),
+    }
+    for name, values in (extra_columns or {}).items():
+        columns[name] = [None if value != value else value for value in values[start:stop].tolist()]
+    keys = [str(ts).encode('utf-8') for ts in columns[hbc.OHLCV_TIMESTAMP]]
+    values = [json.dumps(dict(zip(columns, row))).encode('utf-8') for row in zip(*columns.values())]
+    return keys, values
+
+
+def encode_struct_records(ohlcv, start=0, stop=None):
+    """
+    Encodes bars as fixed-size STRUCT_DTYPE records, one record per bar.
+
+    Returns:
+        tuple: (keys, values) lists of bytes, one entry per bar.
+    """
+    timestamps = ohlcv.timestamps[start:stop]
+    records = np.empty(len(timestamps), dtype=STRUCT_DTYPE)
+    records[hbc.OHLCV_TIMESTAMP] = timestamps
+    records[hbc.OHLCV_OPEN] = ohlcv.open[start:stop]
+    records[hbc.OHLCV_HIGH] = ohlcv.high[start:stop]
+    records[hbc.OHLCV_LOW] = ohlcv.low[start:stop]
+    records[hbc.OHLCV_CLOSE] = ohlcv.close[start:stop]
+    records[hbc.OHLCV_VOLUME] = ohlcv.volume[start:stop]
+
+    buffer = records.tobytes()
+    size = STRUCT_DTYPE.itemsize
+    keys = [str(ts).encode('utf-8') for ts in timestamps.tolist()]
+    values = [buffer[i:i + size] for i in range(0, len(buffer), size)]
+    return keys, values
+
+
+def decode_struct_record(value):
+    """
+    Decodes a single STRUCT_DTYPE record.
+
+    Returns:
+        dict: The bar keyed by the standardized field names.
+    """
+    record = np.frombuffer(value, dtype=STRUCT_DTYPE, count=1)[0]
+    return {field: record[field].item() for field in STRUCT_DTYPE.names}
+
+
+def encode_batch(ohlcv, start=0, stop=None):
+    """
+    Encodes a slice of bars as a single columnar message.
+
+    Returns:
+        bytes: The header followed by the timestamp, open, high, low, close and volume columns.
+    """
+    timestamps = ohlcv.timestamps[start:stop]
+    parts = [
+        BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, len(timestamps)),
+        timestamps.astype('<i8', copy=False).tobytes(),
+    ]
+    for column in (ohlcv.open, ohlcv.high, ohlcv.low, ohlcv.close, ohlcv.volume):
+        parts.append(column[start:stop].astype('<f8', copy=False).tobytes())
+    return b''.join(parts)
+
+
+def decode_batch(value):
+    """
+    Decodes a message produced by encode_batch.
+
+    Returns:
+        OhclvData: The decoded bars.
+    """
+    magic, version, count = BATCH_HEADER.unpack_from(value)
+    if magic != BATCH_MAGIC or version != BATCH_VERSION:
+        raise ValueError(f'Unsupported batch message (magic={magic!r}, version={version}).')
+
+    offset = BATCH_HEADER.size
+    timestamps = np.frombuffer(value, dtype='<i8', count=count, offset=offset)
+    offset += 8 * count
+    columns = {hbc.OHLCV_TIMESTAMP: timestamps}
+    for field in (hbc.OHLCV_OPEN, hbc.OHLCV_HIGH, hbc.OHLCV_LOW, hbc.OHLCV_CLOSE, hbc.OHLCV_VOLUME):
+        columns[field] = np.frombuffer(value, dtype='<f8', count=count, offset=offset)
+        offset += 8 * count
+    return OhclvData(columns)
+
+
+def encode_bar(data, encoding=ENCODING_JSON):
+    """
+    Encodes a single bar dict, e.g. a live WebSocket update.
+
+    ENCODING_BATCH and ENCODING_COMPRESSED produce a one-bar message of their format so
+    a topic keeps a single format.
+
+    Returns:
+        tuple: The (key, value) bytes of the message.
+    """
+    key = str(data.get(hbc.OHLCV_TIMESTAMP)).encode('utf-8')
+    if encoding == ENCODING_JSON:
+        return key, json.dumps(data).encode('utf-8')
+
+    record = np.zeros(1, dtype=STRUCT_DTYPE)
+    for field in STRUCT_DTYPE.names:
+        record[field] = data[field]
+    if encoding == ENCODING_STRUCT:
+        return key, record.tobytes()
+    if encoding == ENCODING_COMPRESSED:
+        return key, encode_block(OhclvData({field: record[field] for field in STRUCT_DTYPE.names}))
+    columns = [record[field] for field in STRUCT_DTYPE.names]
+    return key, BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, 1) + b''.join(column.tobytes() for column in columns)
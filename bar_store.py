@@ -0,0 +1,282 @@
+import fcntl
+import json
+import os
+import threading
+import numpy as np
+from .ohclv_data import OhclvData, COLUMNS
+from . import hist_bar_const as hbc
+
+META_FILE = 'meta.json'
+LOCK_FILE = '.lock'
+INDEX_FIELD = 'index'
+DEFAULT_INDEX_STRIDE = 4096  # rows between sparse index entries
+
+
+class BarStore:
+    """
+    A columnar, memory-mapped on-disk store of bars for one exchange.
+
+    Every (symbol, interval) partition holds one raw little-endian file per OHLCV field,
+    a sparse index with the timestamp of every `index_stride`-th row, and a meta file
+    with the committed row count and file generation. Readers map only committed rows,
+    so a load returns zero-copy views and never sees a torn append.
+
+    Appends write past the committed rows, fsync, then atomically replace the meta file;
+    anything written after the last commit is discarded by the next append. Rewrites go
+    to a new file generation that becomes visible with the same atomic meta replace.
+    """
+    def __init__(self, root_dir, exchange, index_stride=DEFAULT_INDEX_STRIDE):
+        self.root_dir = root_dir
+        self.exchange = exchange
+        self.index_stride = index_stride
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def partition_dir(self, symbol, interval):
+        safe_symbol = symbol.replace('/', '_').replace(os.sep, '_')
+        return os.path.join(self.root_dir, self.exchange, safe_symbol, interval)
+
+    def rows(self, symbol, interval):
+        return self._read_meta(self.partition_dir(symbol, interval))['rows']
+
+    def last_timestamp(self, symbol, interval):
+        """
+        Returns:
+            int: The newest stored timestamp, or None if the partition is empty.
+        """
+        partition = self.partition_dir(symbol, interval)
+        meta = self._read_meta(partition)
+        if meta['rows'] == 0:
+            return None
+        return int(np.fromfile(self._field_path(partition, hbc.OHLCV_TIMESTAMP, meta['generation']), dtype='<i8',
+                               count=1, offset=8 * (meta['rows'] - 1))[0])
+
+    def load(self, symbol, interval, start_time=None, end_time=None) -> OhclvData:
+        """
+        Loads the bars with start_time <= timestamp <= end_time.
+
+        The range is located with a binary search over the sparse index and then within a
+        single index block, so only the touched pages of the files are read.
+
+        Returns:
+            OhclvData: Read-only views over the memory-mapped files.
+        """
+        partition = self.partition_dir(symbol, interval)
+        for attempt in range(3):
+            try:
+                return self._load(partition, start_time, end_time)
+            except FileNotFoundError:
+                # A concurrent rewrite removed the generation we read the meta of
+                if attempt == 2:
+                    raise
+
+    def _load(self, partition, start_time, end_time):
+        meta = self._read_meta(partition)
+        rows = meta['rows']
+        if rows == 0:
+            return OhclvData({})
+
+        columns = [np.memmap(self._field_path(partition, field, meta['generation']), dtype=np.dtype(dtype).newbyteorder('<'),
+                             mode='r', shape=(rows,))
+                   for field, dtype in COLUMNS]
+        index = np.fromfile(self._field_path(partition, INDEX_FIELD, meta['generation']), dtype='<i8',
+                            count=self._index_entries(rows))
+        lo = 0 if start_time is None else self._search(columns[0], index, rows, start_time, 'left')
+        hi = rows if end_time is None else self._search(columns[0], index, rows, end_time, 'right')
+        return OhclvData.from_arrays(*(column[lo:max(lo, hi)] for column in columns))
+
+    def append(self, symbol, interval, ohlcv) -> int:
+        """
+        Appends bars newer than the last stored bar.
+
+        Bars at or before the stored tail are skipped; use `write` to change history.
+
+        Args:
+            ohlcv (OhclvData): Bars in ascending timestamp order.
+
+        Returns:
+            int: The number of bars appended.
+        """
+        partition = self.partition_dir(symbol, interval)
+        with self._partition_lock(partition):
+            meta = self._read_meta(partition)
+            rows, generation = meta['rows'], meta['generation']
+            if rows:
+                last = np.fromfile(self._field_path(partition, hbc.OHLCV_TIMESTAMP, generation), dtype='<i8',
+                                   count=1, offset=8 * (rows - 1))[0]
+                ohlcv = ohlcv.between(start_time=int(last) + 1)
+            if len(ohlcv) == 0:
+                return 0
+
+            arrays = self._arrays(ohlcv)
+            for (field, dtype), array in zip(COLUMNS, arrays):
+                self._write_at(self._field_path(partition, field, generation), rows * 8, array)
+            # Index entries for the rows whose position is a multiple of the stride
+            first = -rows % self.index_stride
+            self._write_at(self._field_path(partition, INDEX_FIELD, generation), self._index_entries(rows) * 8,
+                           arrays[0][first::self.index_stride])
+
+            self._write_meta(partition, rows + len(ohlcv), generation)
+            return len(ohlcv)
+
+    def replace_tail(self, symbol, interval, ohlcv) -> int:
+        """
+        Replaces the stored bars from the first timestamp of `ohlcv` on with `ohlcv`.
+
+        A revision of the last stored bar, typically a refresh starting at the forming
+        bar, is written in place after it is uncommitted, so it costs the same as an
+        append and a crash never exposes a half-written row. Replacing any earlier row
+        writes a new file generation like `write`, so views from earlier loads keep
+        the bars they were loaded with.
+
+        Args:
+            ohlcv (OhclvData): Bars in ascending timestamp order.
+
+        Returns:
+            int: The number of bars written.
+        """
+        if len(ohlcv) == 0:
+            return 0
+        partition = self.partition_dir(symbol, interval)
+        with self._partition_lock(partition):
+            meta = self._read_meta(partition)
+            rows, generation = meta['rows'], meta['generation']
+            keep = rows
+            if rows:
+                timestamps = np.memmap(self._field_path(partition, hbc.OHLCV_TIMESTAMP, generation), dtype='<i8',
+                                       mode='r', shape=(rows,))
+                index = np.fromfile(self._field_path(partition, INDEX_FIELD, generation), dtype='<i8',
+                                    count=self._index_entries(rows))
+                keep = self._search(timestamps, index, rows, int(ohlcv.timestamps[0]), 'left')
+                del timestamps
+            if keep < rows - 1:
+                kept = self._load(partition, None, None).slice(0, keep)
+                self._write_generation(partition, generation, [np.concatenate((old, new))
+                                                               for old, new in zip(self._arrays(kept), self._arrays(ohlcv))])
+                return len(ohlcv)
+            if keep < rows:
+                self._write_meta(partition, keep, generation)
+
+            arrays = self._arrays(ohlcv)
+            for (field, dtype), array in zip(COLUMNS, arrays):
+                self._overwrite_at(self._field_path(partition, field, generation), keep * 8, array)
+            first = -keep % self.index_stride
+            self._overwrite_at(self._field_path(partition, INDEX_FIELD, generation), self._index_entries(keep) * 8,
+                               arrays[0][first::self.index_stride])
+
+            self._write_meta(partition, keep + len(ohlcv), generation)
+            return len(ohlcv)
+
+    def write(self, symbol, interval, ohlcv):
+        """
+        Replaces the partition's contents with `ohlcv`.
+
+        Args:
+            ohlcv (OhclvData): Bars in ascending timestamp order.
+        """
+        partition = self.partition_dir(symbol, interval)
+        with self._partition_lock(partition):
+            self._write_generation(partition, self._read_meta(partition)['generation'], self._arrays(ohlcv))
+
+    def _write_generation(self, partition, old_generation, arrays):
+        generation = old_generation + 1
+        for (field, dtype), array in zip(COLUMNS, arrays):
+            self._write_at(self._field_path(partition, field, generation), 0, array)
+        self._write_at(self._field_path(partition, INDEX_FIELD, generation), 0, arrays[0][::self.index_stride])
+
+        self._write_meta(partition, len(arrays[0]), generation)
+        # Readers that mapped the old generation keep their views until they drop them
+        for field in [field for field, _ in COLUMNS] + [INDEX_FIELD]:
+            try:
+                os.remove(self._field_path(partition, field, old_generation))
+            except FileNotFoundError:
+                pass
+
+    def _search(self, timestamps, index, rows, value, side):
+        block = max(int(np.searchsorted(index, value, side=side)) - 1, 0)
+        lo = block * self.index_stride
+        hi = min(lo + self.index_stride + 1, rows)
+        return lo + int(np.searchsorted(timestamps[lo:hi], value, side=side))
+
+    def _index_entries(self, rows):
+        return -(-rows // self.index_stride)
+
+    def _partition_lock(self, partition):
+        with self._locks_guard:
+            lock = self._locks.setdefault(partition, threading.Lock())
+        return _PartitionLock(lock, partition)
+
+    @staticmethod
+    def _arrays(ohlcv):
+        return [np.asarray(array, dtype=np.dtype(dtype).newbyteorder('<'))
+                for array, (_, dtype) in zip((ohlcv.timestamps, ohlcv.open, ohlcv.high, ohlcv.low, ohlcv.close, ohlcv.volume), COLUMNS)]
+
+    @staticmethod
+    def _field_path(partition, field, generation):
+        return os.path.join(partition, f'{field}.{generation}.bin')
+
+    @staticmethod
+    def _read_meta(partition):
+        try:
+            with open(os.path.join(partition, META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'rows': 0, 'generation': 0}
+
+    @staticmethod
+    def _write_meta(partition, rows, generation):
+        path = os.path.join(partition, META_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'rows': rows, 'generation': generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        dir_fd = os.open(partition, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    @staticmethod
+    def _write_at(path, offset, array):
+        """ Writes `array` at byte `offset`, dropping anything after it, and fsyncs. """
+        with open(path, 'ab') as f:
+            f.truncate(offset)
+            f.write(array.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _overwrite_at(path, offset, array):
+        """ Writes `array` at byte `offset` without truncating, so mapped pages stay valid, and fsyncs. """
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, array.tobytes(), offset)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class _PartitionLock:
+    """ Serializes writers to a partition across threads and processes. """
+    def __init__(self, thread_lock, partition):
+        self.thread_lock = thread_lock
+        self.partition = partition
+        self._file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            os.makedirs(self.partition, exist_ok=True)
+            self._file = open(os.path.join(self.partition, LOCK_FILE), 'w')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        except BaseException:
+            self.thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self.thread_lock.release()
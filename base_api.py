@@ -1,16 +1,49 @@
+import asyncio
+import functools
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
 class BaseApi(ABC):
     """
     Abstract base class for historical data APIs.
     """
+    # Maximum number of bars the exchange returns for a single request.
+    page_limit = None
+    # Worker threads used to run blocking calls for aget_hist_bars.
+    executor_workers = 4
+
     def __init__(self, exchange):
         self.exchange = exchange
+        self._executor = None
 
     @abstractmethod
-    def get_hist_bars(self, symbol, interval):
+    def get_hist_bars(self, symbol, interval, start_time=None, end_time=None):
         pass
 
+    async def aget_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        """
+        Awaitable version of get_hist_bars.
+
+        The default runs the blocking call on a managed executor so it never blocks the
+        event loop. Exchanges with a native async client override this.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.get_hist_bars, symbol, interval, start_time, end_time)
+        return await loop.run_in_executor(self._get_executor(), call)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def aclose(self):
+        self.close()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.executor_workers, thread_name_prefix=f'{self.exchange}-api')
+        return self._executor
+
     @abstractmethod
     def _standardize_symbol(self, symbol):
         pass
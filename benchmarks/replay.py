@@ -0,0 +1,399 @@
+"""
+Replays kline streams through a real DataService at an accelerated pace to find where
+the live pipeline saturates, using local stand-ins for the exchange and the broker.
+
+Usage:
+    python -m hist_market_data.benchmarks.replay --symbols 2000 --bars 30 --speed 100
+    python -m hist_market_data.benchmarks.replay --symbols 5000 --speed max --backpressure drop_oldest
+    python -m hist_market_data.benchmarks.replay --recorded bars.parquet --history 100 --speed 60
+    python -m hist_market_data.benchmarks.replay --recorded /data/bars --exchange binance --speed max
+
+The report gives the achieved replay speed next to the requested one, the sustained
+rate of broker-acknowledged live messages, the latency from each WebSocket update to
+the acknowledgement of the message carrying it, and the updates that were dropped.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+from .. import hist_bar_const as hbc
+from ..bar_store import BarStore
+from ..kafka_publisher import POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COALESCE
+from ..metrics import Histogram
+from ..ohclv_data import OhclvData, COLUMNS
+from ..ws.ws_api import BaseWsApi
+from . import synthetic
+
+REPLAY_EXCHANGE = 'replay'
+SYMBOL_COLUMN = 'symbol'
+DEFAULT_SYMBOLS = 1000
+DEFAULT_BARS = 30
+DEFAULT_HISTORY = 100
+DEFAULT_UPDATES_PER_BAR = 4
+DRAIN_TIMEOUT = 60.0  # seconds to wait for queued messages after the replay ends
+
+
+def parse_speed(text):
+    """ Parses a speed multiple such as '100' or '100x'; 'max' replays as fast as possible. """
+    text = text.strip().lower()
+    if text in ('max', 'inf'):
+        return None
+    speed = float(text.removesuffix('x'))
+    return speed if speed > 0 else None
+
+
+def rebase(bars_by_symbol, start):
+    """
+    Shifts recorded bars in time so the earliest one starts at `start`.
+
+    Live bars are closed by wall-clock time, so recorded data should be rebased close to
+    now before it is replayed.
+
+    Returns:
+        dict: Shifted copies of the OhclvData per symbol.
+    """
+    first = min(int(ohlcv.timestamps[0]) for ohlcv in bars_by_symbol.values() if len(ohlcv))
+    shift = start - first
+    return {symbol: OhclvData.from_arrays(ohlcv.timestamps + shift, ohlcv.open, ohlcv.high, ohlcv.low,
+                                          ohlcv.close, ohlcv.volume)
+            for symbol, ohlcv in bars_by_symbol.items()}
+
+
+def load_recorded(path, interval, exchange=None):
+    """
+    Loads recorded bars per symbol from a BarStore directory or a CSV or Parquet file.
+
+    Args:
+        path (str): The BarStore root directory, or a file with a column per OHLCV field,
+            timestamps in epoch milliseconds, and an optional symbol column. Without a
+            symbol column the file name is used as the symbol.
+        interval (str): The interval of the bars, which selects the BarStore partitions.
+        exchange (str): The exchange the BarStore holds the bars under.
+
+    Returns:
+        dict: OhclvData per symbol in ascending timestamp order.
+    """
+    if os.path.isdir(path):
+        if exchange is None:
+            raise ValueError('Loading bars from a BarStore needs the exchange they were stored under.')
+        store = BarStore(path, exchange)
+        symbols = sorted(os.listdir(os.path.join(path, exchange)))
+        return {symbol: store.load(symbol, interval) for symbol in symbols
+                if os.path.isdir(store.partition_dir(symbol, interval))}
+
+    df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    if SYMBOL_COLUMN not in df:
+        df[SYMBOL_COLUMN] = os.path.splitext(os.path.basename(path))[0]
+    # Sorted and without duplicate timestamps, as recordings are not always
+    return {symbol: OhclvData.merge(OhclvData({field: rows[field].to_numpy() for field, _ in COLUMNS}))
+            for symbol, rows in df.groupby(SYMBOL_COLUMN)}
+
+
+class ReplayWsApi(BaseWsApi):
+    """
+    A WebSocket API that replays bars to subscribers instead of connecting anywhere.
+
+    Every bar is delivered as `updates_per_bar` updates of the forming bar, the last of
+    which carries its final values, like an exchange pushing every change. Updates of all
+    symbols are interleaved in timestamp order and paced at `speed` times real time.
+
+    Args:
+        bars_by_symbol (dict): OhclvData to replay per symbol, in ascending timestamp order.
+        interval (str): The interval of the bars.
+        updates_per_bar (int): The number of updates each bar is delivered in.
+        speed (float): Multiple of real time; None replays as fast as possible.
+    """
+    def __init__(self, bars_by_symbol, interval=hbc.INTERVAL_1MINUTE, updates_per_bar=DEFAULT_UPDATES_PER_BAR,
+                 speed=None, exchange_name=REPLAY_EXCHANGE):
+        super().__init__(exchange_name)
+        self.bars = bars_by_symbol
+        self.interval = interval
+        self.updates_per_bar = updates_per_bar
+        self.speed = speed
+        self.ohlcv_callbacks = {}
+        # (symbol, bar timestamp) -> perf_counter() of the latest update delivered
+        self.emitted_at = {}
+        self.updates = 0
+        self.market_ms = 0
+        self.connected = True
+
+    def subscribe_ohlcv(self, symbol, interval, callback):
+        if interval != self.interval:
+            raise ValueError(f'Replay source only has {self.interval} bars, not {interval}.')
+        self.ohlcv_callbacks[symbol] = callback
+
+    def subscribe_trades(self, symbol, callback):
+        raise NotImplementedError("Replay source only streams klines")
+
+    def subscribe_depth(self, symbol, callback):
+        raise NotImplementedError("Replay source only streams klines")
+
+    def replay(self, stop_event=None):
+        """
+        Delivers every bar of the subscribed symbols on the calling thread.
+
+        Returns:
+            int: The number of updates delivered.
+        """
+        symbols = [symbol for symbol in self.bars if symbol in self.ohlcv_callbacks]
+        if not symbols:
+            return 0
+        timestamps = np.concatenate([self.bars[symbol].timestamps for symbol in symbols])
+        owners = np.repeat(np.arange(len(symbols)), [len(self.bars[symbol]) for symbol in symbols])
+        rows = np.concatenate([np.arange(len(self.bars[symbol])) for symbol in symbols])
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, owners, rows = timestamps[order], owners[order], rows[order]
+        group_starts = np.flatnonzero(np.concatenate(([True], timestamps[1:] != timestamps[:-1])))
+        group_stops = np.append(group_starts[1:], len(timestamps))
+
+        interval_ms = hbc.INTERVAL_MS[self.interval]
+        first_time = int(timestamps[0]) if len(timestamps) else 0
+        started = time.perf_counter()
+        for lo, hi in zip(group_starts.tolist(), group_stops.tolist()):
+            timestamp = int(timestamps[lo])
+            group = [(symbols[owner], self.ohlcv_callbacks[symbols[owner]], self.bars[symbols[owner]][row])
+                     for owner, row in zip(owners[lo:hi].tolist(), rows[lo:hi].tolist())]
+            for update in range(self.updates_per_bar):
+                if stop_event is not None and stop_event.is_set():
+                    return self.updates
+                fraction = (update + 1) / self.updates_per_bar
+                market_time = timestamp + update * interval_ms / self.updates_per_bar
+                if self.speed is not None:
+                    delay = started + (market_time - first_time) / 1000 / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                for symbol, callback, bar in group:
+                    self.emitted_at[(symbol, timestamp)] = time.perf_counter()
+                    callback(_partial(bar, fraction))
+                self.updates += len(group)
+                self.market_ms = market_time - first_time
+        return self.updates
+
+
+def _partial(bar, fraction):
+    """ The forming bar after `fraction` of its interval, ending with its final values. """
+    if fraction >= 1:
+        return bar
+    open_ = bar[hbc.OHLCV_OPEN]
+    close = open_ + (bar[hbc.OHLCV_CLOSE] - open_) * fraction
+    return {
+        hbc.OHLCV_TIMESTAMP: bar[hbc.OHLCV_TIMESTAMP],
+        hbc.OHLCV_OPEN: open_,
+        hbc.OHLCV_HIGH: max(open_, close),
+        hbc.OHLCV_LOW: min(open_, close),
+        hbc.OHLCV_CLOSE: close,
+        hbc.OHLCV_VOLUME: bar[hbc.OHLCV_VOLUME] * fraction,
+    }
+
+
+class ReplayHistApi:
+    """
+    Stands in for HistApi, serving history and gap repairs from bars held in memory.
+
+    Args:
+        bars_by_symbol (dict): OhclvData of the history per symbol.
+    """
+    def __init__(self, bars_by_symbol):
+        self.bars = bars_by_symbol
+        self.requests = 0
+
+    def get_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        self.requests += 1
+        return self.bars.get(symbol, OhclvData({})).between(start_time, end_time)
+
+    async def aget_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        return self.get_hist_bars(symbol, interval, start_time, end_time)
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class ReplayHarness:
+    """
+    Wires replay stand-ins into a real DataService and measures its live pipeline.
+
+    The service runs unmodified apart from its exchange and broker: history comes from
+    a ReplayHistApi, the ReplayWsApi is registered through WsApi.register_api and the
+    producer is a StubProducer that acknowledges on every poll.
+
+    Args:
+        history (dict): OhclvData per symbol published before the replay starts.
+        live (dict): OhclvData per symbol to replay, following on from `history`.
+        interval (str): The interval of the bars.
+        speed (float): Multiple of real time; None replays as fast as possible.
+        updates_per_bar (int): Updates each live bar is delivered in.
+        producer_queue_limit (int): Messages the stub producer holds before it raises
+            BufferError, like a full librdkafka queue.
+        service_kwargs: Passed to DataService, e.g. backpressure or live_queue_size.
+    """
+    def __init__(self, history, live, interval=hbc.INTERVAL_1MINUTE, speed=None,
+                 updates_per_bar=DEFAULT_UPDATES_PER_BAR, producer_queue_limit=None, **service_kwargs):
+        self.interval = interval
+        self.hist_api = ReplayHistApi(history)
+        self.ws_api = ReplayWsApi(live, interval, updates_per_bar, speed)
+        self.producer = synthetic.StubProducer(queue_limit=producer_queue_limit)
+        self.service_kwargs = service_kwargs
+        self.latency = Histogram()
+        self.acked = 0
+        self.failed = 0
+        self._topics = {}
+
+    @classmethod
+    def synthetic(cls, num_symbols=DEFAULT_SYMBOLS, bars=DEFAULT_BARS, history=DEFAULT_HISTORY,
+                  interval=hbc.INTERVAL_1MINUTE, **kwargs) -> 'ReplayHarness':
+        """ Builds a harness over random-walk bars whose live part starts at the current bar. """
+        interval_ms = hbc.INTERVAL_MS[interval]
+        now_bar = int(time.time() * 1000) // interval_ms * interval_ms
+        history_bars, live_bars = {}, {}
+        for i in range(num_symbols):
+            ohlcv = synthetic.synthetic_bars(history + bars, seed=i, start=now_bar - history * interval_ms, interval=interval)
+            history_bars[f'SYM{i:05d}'] = ohlcv.slice(0, history)
+            live_bars[f'SYM{i:05d}'] = ohlcv.slice(history)
+        return cls(history_bars, live_bars, interval, **kwargs)
+
+    @classmethod
+    def recorded(cls, bars_by_symbol, history=DEFAULT_HISTORY, bars=None, interval=hbc.INTERVAL_1MINUTE,
+                 **kwargs) -> 'ReplayHarness':
+        """
+        Builds a harness over recorded bars, rebased so the live part starts at the current bar.
+
+        The first `history` bars of the earliest recording are published as history; every
+        symbol's bars from the same point in time on are replayed.
+
+        Args:
+            bars_by_symbol (dict): OhclvData per symbol, e.g. from load_recorded.
+            bars (int): Replays at most this many live bars per symbol; all by default.
+        """
+        interval_ms = hbc.INTERVAL_MS[interval]
+        now_bar = int(time.time() * 1000) // interval_ms * interval_ms
+        recorded = rebase({symbol: ohlcv for symbol, ohlcv in bars_by_symbol.items() if len(ohlcv)},
+                          now_bar - history * interval_ms)
+        history_bars, live_bars = {}, {}
+        for symbol, ohlcv in recorded.items():
+            live = ohlcv.between(now_bar).slice(0, bars)
+            if len(live):
+                history_bars[symbol] = ohlcv.between(end_time=now_bar - 1)
+                live_bars[symbol] = live
+        return cls(history_bars, live_bars, interval, **kwargs)
+
+    def _on_ack(self, err, msg):
+        # Runs on the publisher thread, which polls the stub producer
+        if err is not None:
+            self.failed += 1
+            return
+        self.acked += 1
+        emitted_at = self.ws_api.emitted_at.get((self._topics.get(msg.topic()), int(msg.key())))
+        if emitted_at is not None:
+            self.latency.record(time.perf_counter() - emitted_at)
+
+    async def run(self, quiet=True):
+        """
+        Subscribes every symbol, replays the live bars and waits for the queue to drain.
+
+        Returns:
+            dict: The load test report.
+        """
+        from ..main import DataService
+        output = io.StringIO() if quiet else sys.stdout
+        service = DataService(REPLAY_EXCHANGE, None, None, producer=self.producer,
+                              admin_client=synthetic.StubAdminClient(), hist_api=self.hist_api, **self.service_kwargs)
+        try:
+            service.ws_api_manager.register_api(REPLAY_EXCHANGE, self.ws_api)
+            service.publisher.delivery_callback = self._on_ack
+            with contextlib.redirect_stdout(output):
+                for symbol in self.ws_api.bars:
+                    topic = f'{REPLAY_EXCHANGE}.{symbol}.{self.interval}'
+                    self._topics[topic] = symbol
+                    await service.subscribe_ohlcv(symbol, self.interval, topic)
+                # Count only live messages, not the history published while subscribing
+                await asyncio.to_thread(self.producer.flush)
+                self.acked = 0
+                self.latency.reset()
+
+                stop_event = threading.Event()
+                started = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self.ws_api.replay, stop_event)
+                finally:
+                    stop_event.set()
+                replayed = time.perf_counter() - started
+                deadline = time.monotonic() + DRAIN_TIMEOUT
+                while (len(service.publish_queue) or len(self.producer)) and time.monotonic() < deadline:
+                    await asyncio.sleep(0.01)
+                elapsed = time.perf_counter() - started
+                return self._report(service, replayed, elapsed)
+        finally:
+            with contextlib.redirect_stdout(output):
+                await service.aclose()
+
+    def _report(self, service, replayed, elapsed):
+        queue_stats = service.publish_queue.stats()
+        ws_api = self.ws_api
+        return {
+            'symbols': len(ws_api.ohlcv_callbacks),
+            'updates': ws_api.updates,
+            'requested_speed': ws_api.speed,
+            'achieved_speed': ws_api.market_ms / 1000 / replayed if replayed else None,
+            'updates_per_s': ws_api.updates / replayed if replayed else None,
+            'acked': self.acked,
+            'msgs_per_s': self.acked / elapsed if elapsed else None,
+            'latency_ms': {f'p{q * 100:g}': self.latency.quantile(q) * 1e3 for q in (0.5, 0.9, 0.99, 0.999)},
+            'dropped': queue_stats['dropped'],
+            'coalesced': queue_stats['coalesced'],
+            'failed': self.failed,
+            'max_queue_depth': queue_stats['max_depth'],
+            'replay_s': replayed,
+            'elapsed_s': elapsed,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recorded', help='Replay recorded bars from a BarStore directory or a CSV or Parquet file '
+                                           'instead of synthetic ones.')
+    parser.add_argument('--exchange', help='The exchange of the recorded bars in a BarStore directory.')
+    parser.add_argument('--symbols', type=int, default=DEFAULT_SYMBOLS, help='Synthetic symbols to replay.')
+    parser.add_argument('--bars', type=int, help=f'Live bars replayed per symbol; {DEFAULT_BARS} synthetic ones '
+                                                 f'or all recorded ones by default.')
+    parser.add_argument('--history', type=int, default=DEFAULT_HISTORY, help='History bars published per symbol first.')
+    parser.add_argument('--interval', default=hbc.INTERVAL_1MINUTE)
+    parser.add_argument('--speed', type=parse_speed, default=None, help="Multiple of real time, e.g. 1, 100x or 'max'.")
+    parser.add_argument('--updates-per-bar', type=int, default=DEFAULT_UPDATES_PER_BAR)
+    parser.add_argument('--backpressure', choices=(POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COALESCE), default=POLICY_BLOCK)
+    parser.add_argument('--queue-size', type=int, help='Live publish queue size.')
+    parser.add_argument('--emit', help="Live bar emit mode, 'closed' or 'throttled'.")
+    parser.add_argument('--producer-queue-limit', type=int, help='Messages the stub broker buffers before rejecting.')
+    parser.add_argument('--verbose', action='store_true', help="Show the service's own output.")
+    args = parser.parse_args(argv)
+
+    service_kwargs = {'backpressure': args.backpressure}
+    if args.queue_size:
+        service_kwargs['live_queue_size'] = args.queue_size
+    if args.emit:
+        service_kwargs['live_emit'] = args.emit
+    service_kwargs.update(speed=args.speed, updates_per_bar=args.updates_per_bar,
+                          producer_queue_limit=args.producer_queue_limit)
+    if args.recorded:
+        recorded = load_recorded(args.recorded, args.interval, args.exchange)
+        harness = ReplayHarness.recorded(recorded, args.history, args.bars, args.interval, **service_kwargs)
+    else:
+        harness = ReplayHarness.synthetic(args.symbols, args.bars or DEFAULT_BARS, args.history, args.interval,
+                                          **service_kwargs)
+    report = asyncio.run(harness.run(quiet=not args.verbose))
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Micro-benchmarks of the ingest and publish paths against offline exchange stand-ins.
+
+Usage:
+    python -m hist_market_data.benchmarks.run --sizes 1e3,1e5 --output bench.json
+    python -m hist_market_data.benchmarks.run --baseline bench.json
+
+Every benchmark is timed over several repeats and run once more under tracemalloc
+for its peak allocation. With --baseline, the run exits with status 1 if any
+benchmark got slower or allocates more than the tolerances allow.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from .. import hist_bar_const as hbc
+from . import synthetic
+
+DEFAULT_SIZES = '1e3,1e4,1e5'
+DEFAULT_REPEAT = 5
+DEFAULT_TIME_TOLERANCE = 0.25  # relative slowdown of the median
+DEFAULT_MEMORY_TOLERANCE = 0.10  # relative growth of the peak allocation
+NOISE_FLOOR = 0.0005  # seconds; smaller slowdowns are never reported
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark.
+
+    The decorated function receives the row count and returns a zero-argument callable
+    that performs the measured work. Setup done before returning is not measured.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@benchmark('ohlcv.init.lists')
+def bench_init_lists(n):
+    parsed = {field: values.tolist() for field, values in synthetic.synthetic_columns(n).items()}
+    return lambda: synthetic.OhclvData(parsed)
+
+
+@benchmark('ohlcv.init.arrays')
+def bench_init_arrays(n):
+    parsed = synthetic.synthetic_columns(n)
+    return lambda: synthetic.OhclvData(parsed, copy=True)
+
+
+@benchmark('ohlcv.to_df')
+def bench_to_df(n):
+    ohlcv = synthetic.synthetic_bars(n)
+    return ohlcv.to_df
+
+
+@benchmark('ohlcv.merge')
+def bench_merge(n):
+    ohlcv = synthetic.synthetic_bars(n)
+    # Ten pages that overlap their neighbours by one bar, as paginated fetches return them
+    step = max(n // 10, 1)
+    pages = [ohlcv[max(start - 1, 0):start + step] for start in range(0, n, step)]
+    return lambda: synthetic.OhclvData.merge(*pages)
+
+
+@benchmark('codec.encode')
+def bench_codec_encode(n):
+    from ..bar_codec import encode_block
+    ohlcv = synthetic.synthetic_bars(n)
+    return lambda: encode_block(ohlcv)
+
+
+@benchmark('codec.decode')
+def bench_codec_decode(n):
+    from ..bar_codec import decode_block, encode_block
+    block = encode_block(synthetic.synthetic_bars(n))
+    return lambda: decode_block(block)
+
+
+@benchmark('ohlcv.refreq.15m')
+def bench_refreq_15m(n):
+    ohlcv = synthetic.synthetic_bars(n)
+    return lambda: ohlcv.refreq(hbc.INTERVAL_15MINUTE)
+
+
+@benchmark('ohlcv.refreq.1d')
+def bench_refreq_1d(n):
+    ohlcv = synthetic.synthetic_bars(n)
+    return lambda: ohlcv.refreq(hbc.INTERVAL_1DAY)
+
+
+@benchmark('timeframes.derive')
+def bench_derive_timeframes(n):
+    from ..timeframes import derive_timeframes
+    ohlcv = synthetic.synthetic_bars(n)
+    intervals = [hbc.INTERVAL_1MINUTE, hbc.INTERVAL_5MINUTE, hbc.INTERVAL_15MINUTE,
+                 hbc.INTERVAL_1HOUR, hbc.INTERVAL_4HOUR, hbc.INTERVAL_1DAY]
+    return lambda: derive_timeframes(ohlcv, intervals)
+
+
+@benchmark('indicators.compute')
+def bench_indicators(n):
+    from ..indicators import ATR, EMA, SMA, VWAP, IndicatorEngine, RollingHigh, Returns
+    ohlcv = synthetic.synthetic_bars(n)
+    engine = IndicatorEngine({'sma': SMA(20), 'ema': EMA(20), 'atr': ATR(14), 'vwap': VWAP(),
+                              'high': RollingHigh(50), 'returns': Returns()})
+    return lambda: engine.compute(ohlcv)
+
+
+@benchmark('parse.binance')
+def bench_parse_binance(n):
+    from ..REST_api.binance_api import BinanceApi
+    api = BinanceApi(transport=synthetic.FakeHttpTransport(0))
+    content = synthetic.binance_payload(synthetic.synthetic_columns(n))
+    return lambda: synthetic.OhclvData(api._parse_content(content))
+
+
+@benchmark('parse.tiger')
+def bench_parse_tiger(n):
+    from ..REST_api.tiger_api import TigerApi
+    api = _offline_tiger_api(n)
+    frame = api.client.get_bars([])
+    return lambda: synthetic.OhclvData(TigerApi._parse_data(api, frame))
+
+
+@benchmark('hist_api.get_hist_bars.binance')
+def bench_hist_binance(n):
+    hist_api, start_time, end_time = _offline_hist_api(n)
+    return lambda: hist_api.get_hist_bars('BTC-USDT', hbc.INTERVAL_1MINUTE, start_time, end_time)
+
+
+@benchmark('hist_api.aget_hist_bars.binance')
+def bench_ahist_binance(n):
+    hist_api, start_time, end_time = _offline_hist_api(n)
+    return lambda: asyncio.run(hist_api.aget_hist_bars('BTC-USDT', hbc.INTERVAL_1MINUTE, start_time, end_time))
+
+
+@benchmark('hist_api.get_hist_bars.tiger')
+def bench_hist_tiger(n):
+    api = _offline_tiger_api(n)
+    end_time = synthetic.DEFAULT_START + (n - 1) * hbc.INTERVAL_MS[hbc.INTERVAL_1MINUTE]
+    return lambda: api.get_hist_bars('AAPL', hbc.INTERVAL_1MINUTE, synthetic.DEFAULT_START, end_time)
+
+
+def _publish_benchmark(encoding):
+    def setup(n):
+        service, producer = _offline_data_service(encoding)
+        ohlcv = synthetic.synthetic_bars(n)
+
+        def run():
+            service.publish_bars('bench', ohlcv)
+            producer.flush()
+        return run
+    return setup
+
+
+for _encoding in ('json', 'struct', 'batch', 'compressed'):
+    benchmark(f'publish.{_encoding}')(_publish_benchmark(_encoding))
+
+
+@benchmark('live.push_to_encode')
+def bench_live(n):
+    from ..bar_encoding import encode_bar
+    from ..ws.bar_builder import LiveBarBuilder, EMIT_CLOSED
+    columns = synthetic.synthetic_columns(n)
+    push_client = synthetic.FakePushClient()
+
+    def run():
+        builder = LiveBarBuilder(EMIT_CLOSED)
+
+        def on_kline(kline):
+            data = {
+                hbc.OHLCV_TIMESTAMP: kline.time,
+                hbc.OHLCV_OPEN: kline.open,
+                hbc.OHLCV_HIGH: kline.high,
+                hbc.OHLCV_LOW: kline.low,
+                hbc.OHLCV_CLOSE: kline.close,
+                hbc.OHLCV_VOLUME: kline.volume,
+            }
+            for bar in builder.on_bar(kline.symbol, hbc.INTERVAL_1MINUTE, data):
+                encode_bar(bar)
+        push_client.kline_changed = on_kline
+        push_client.replay('AAPL', columns)
+    return run
+
+
+def _offline_hist_api(n):
+    from ..hist_api import HistApi
+    hist_api = HistApi('binance')
+    hist_api.api.transport = synthetic.FakeHttpTransport(n)
+    start_time = synthetic.DEFAULT_START
+    end_time = start_time + (n - 1) * hbc.INTERVAL_MS[hbc.INTERVAL_1MINUTE]
+    return hist_api, start_time, end_time
+
+
+def _offline_tiger_api(n):
+    from ..base_api import BaseApi
+    from ..REST_api.tiger_api import TigerApi
+    # Skip TigerApi.__init__, which would build a real QuoteClient
+    api = TigerApi.__new__(TigerApi)
+    BaseApi.__init__(api, 'tiger')
+    api.client = synthetic.FakeQuoteClient(n)
+    return api
+
+
+def _offline_data_service(encoding):
+    from ..main import DataService
+    from .replay import ReplayHistApi
+    service = DataService('bench', None, None, encoding=encoding, batch_size=1000, producer=synthetic.StubProducer(),
+                          admin_client=synthetic.StubAdminClient(), hist_api=ReplayHistApi({}))
+    return service, service.producer
+
+
+def measure(run, repeat):
+    """
+    Returns:
+        dict: The min and median wall time in seconds and the peak traced allocation in bytes.
+    """
+    run()  # warm up caches and lazily created pools
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'min_s': min(times), 'median_s': statistics.median(times), 'peak_bytes': peak}
+
+
+def run_benchmarks(sizes, repeat=DEFAULT_REPEAT, names=None):
+    """
+    Runs the selected benchmarks at every size.
+
+    Benchmarks whose dependencies cannot be imported are reported as skipped.
+
+    Returns:
+        list: One result dict per (benchmark, size).
+    """
+    results = []
+    for name, setup in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        for n in sizes:
+            result = {'name': name, 'rows': n}
+            try:
+                run = setup(n)
+            except ImportError as e:
+                result['skipped'] = str(e)
+                results.append(result)
+                print(f'{name:<36} {n:>11,}  skipped: {e}', file=sys.stderr)
+                break
+            result.update(measure(run, repeat))
+            result['rows_per_s'] = n / result['median_s'] if result['median_s'] else None
+            results.append(result)
+            print(f"{name:<36} {n:>11,}  {result['median_s'] * 1e3:10.3f} ms  "
+                  f"{result['peak_bytes'] / 2 ** 20:9.2f} MiB", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, time_tolerance=DEFAULT_TIME_TOLERANCE, memory_tolerance=DEFAULT_MEMORY_TOLERANCE):
+    """
+    Compares results against a baseline run.
+
+    Returns:
+        list: Human-readable descriptions of the regressions, empty if there are none.
+    """
+    previous = {(r['name'], r['rows']): r for r in baseline['results'] if 'skipped' not in r}
+    regressions = []
+    for result in results:
+        base = previous.get((result['name'], result['rows']))
+        if base is None or 'skipped' in result:
+            continue
+        label = f"{result['name']} @ {result['rows']:,} rows"
+        slowdown = result['median_s'] - base['median_s']
+        if result['median_s'] > base['median_s'] * (1 + time_tolerance) and slowdown > NOISE_FLOOR:
+            regressions.append(f"{label}: median {base['median_s'] * 1e3:.3f} ms -> {result['median_s'] * 1e3:.3f} ms")
+        if result['peak_bytes'] > base['peak_bytes'] * (1 + memory_tolerance) and result['peak_bytes'] - base['peak_bytes'] > 2 ** 16:
+            regressions.append(f"{label}: peak {base['peak_bytes']:,} B -> {result['peak_bytes']:,} B")
+    return regressions
+
+
+def parse_sizes(text):
+    return [int(float(size)) for size in text.split(',') if size.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma separated row counts, e.g. 1e3,1e6,1e8.')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed runs per benchmark and size.')
+    parser.add_argument('--filter', action='append', help='Only run benchmarks whose name contains this text.')
+    parser.add_argument('--output', help='Write the results as JSON to this path.')
+    parser.add_argument('--baseline', help='A previous --output file to compare against.')
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(parse_sizes(args.sizes), args.repeat, args.filter)
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.time_tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
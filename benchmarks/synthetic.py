@@ -0,0 +1,225 @@
+import json
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from ..ohclv_data import OhclvData
+from .. import hist_bar_const as hbc
+
+DEFAULT_START = 1672531200000  # 2023-01-01 00:00:00 UTC
+
+
+def synthetic_columns(n, seed=0, start=DEFAULT_START, interval=hbc.INTERVAL_1MINUTE):
+    """
+    Generates a deterministic random-walk bar series.
+
+    Returns:
+        dict: Arrays keyed by the standardized field names.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 1e-3, size=n)))
+    open_ = np.concatenate(([100.0], close[:-1]))[:n]
+    spread = np.abs(rng.normal(0, 5e-4, size=n)) * close
+    return {
+        hbc.OHLCV_TIMESTAMP: start + np.arange(n, dtype=np.int64) * hbc.INTERVAL_MS[interval],
+        hbc.OHLCV_OPEN: open_,
+        hbc.OHLCV_HIGH: np.maximum(open_, close) + spread,
+        hbc.OHLCV_LOW: np.minimum(open_, close) - spread,
+        hbc.OHLCV_CLOSE: close,
+        hbc.OHLCV_VOLUME: rng.gamma(2.0, 50.0, size=n).round(3),
+    }
+
+
+def synthetic_bars(n, seed=0, start=DEFAULT_START, interval=hbc.INTERVAL_1MINUTE):
+    return OhclvData(synthetic_columns(n, seed, start, interval))
+
+
+def binance_payload(columns):
+    """ Encodes columns as a raw Binance /api/v3/klines response body. """
+    rows = [
+        [ts, f'{o:.8f}', f'{h:.8f}', f'{l:.8f}', f'{c:.8f}', f'{v:.8f}', ts + 59999, '0', 0, '0', '0', '0']
+        for ts, o, h, l, c, v in zip(*(columns[field].tolist() for field in (
+            hbc.OHLCV_TIMESTAMP, hbc.OHLCV_OPEN, hbc.OHLCV_HIGH, hbc.OHLCV_LOW, hbc.OHLCV_CLOSE, hbc.OHLCV_VOLUME)))
+    ]
+    return json.dumps(rows, separators=(',', ':')).encode('utf-8')
+
+
+class FakeQuoteClient:
+    """ Stands in for tigeropen's QuoteClient, serving a synthetic series from memory. """
+    def __init__(self, n, seed=0):
+        columns = synthetic_columns(n, seed)
+        self._frame = pd.DataFrame({
+            'time': columns[hbc.OHLCV_TIMESTAMP],
+            'open': columns[hbc.OHLCV_OPEN],
+            'high': columns[hbc.OHLCV_HIGH],
+            'low': columns[hbc.OHLCV_LOW],
+            'close': columns[hbc.OHLCV_CLOSE],
+            'volume': columns[hbc.OHLCV_VOLUME],
+        })
+
+    def get_bars(self, symbols, period=None, begin_time=-1, end_time=-1, **kwargs):
+        frame = self._frame
+        if begin_time not in (None, -1):
+            frame = frame[frame['time'] >= begin_time]
+        if end_time not in (None, -1):
+            frame = frame[frame['time'] <= end_time]
+        return frame
+
+
+class FakeKline:
+    """ Mimics the kline object tigeropen's PushClient hands to kline_changed. """
+    __slots__ = ('symbol', 'time', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, symbol, time, open, high, low, close, volume):
+        self.symbol = symbol
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+
+class FakePushClient:
+    """ Stands in for tigeropen's PushClient and replays synthetic klines on demand. """
+    def __init__(self, *args, **kwargs):
+        self.kline_changed = None
+        self.connect_callback = None
+        self.disconnect_callback = None
+        self.error_callback = None
+        self.subscribed = set()
+
+    def connect(self, *args, **kwargs):
+        if self.connect_callback:
+            self.connect_callback(None)
+
+    def disconnect(self):
+        if self.disconnect_callback:
+            self.disconnect_callback()
+
+    def subscribe_kline(self, symbols):
+        self.subscribed.update(symbols)
+
+    def unsubscribe_kline(self, symbols):
+        self.subscribed.difference_update(symbols)
+
+    def replay(self, symbol, columns):
+        for ts, o, h, l, c, v in zip(*(columns[field].tolist() for field in (
+                hbc.OHLCV_TIMESTAMP, hbc.OHLCV_OPEN, hbc.OHLCV_HIGH, hbc.OHLCV_LOW, hbc.OHLCV_CLOSE, hbc.OHLCV_VOLUME))):
+            self.kline_changed(FakeKline(symbol, ts, o, h, l, c, v))
+
+
+class FakeHttpTransport:
+    """
+    Stands in for HttpTransport, answering Binance kline requests from a synthetic series.
+
+    Response bodies are built once per distinct request and replayed afterwards, so
+    repeated runs time the client side only.
+    """
+    def __init__(self, n, seed=0):
+        self.columns = synthetic_columns(n, seed)
+        self.requests = 0
+        self._bodies = {}
+
+    def _slice(self, params):
+        timestamps = self.columns[hbc.OHLCV_TIMESTAMP]
+        lo = np.searchsorted(timestamps, params.get('startTime', timestamps[0]), side='left')
+        hi = np.searchsorted(timestamps, params.get('endTime', timestamps[-1]), side='right')
+        hi = min(hi, lo + params.get('limit', hbc.BINANCE_PAGE_LIMIT))
+        return {field: values[lo:hi] for field, values in self.columns.items()}
+
+    def get_content(self, exchange, url, params=None, weight=1):
+        params = params or {}
+        key = tuple(sorted(params.items()))
+        self.requests += 1
+        body = self._bodies.get(key)
+        if body is None:
+            body = self._bodies[key] = binance_payload(self._slice(params))
+        return body
+
+    async def aget_content(self, exchange, url, params=None, weight=1):
+        return self.get_content(exchange, url, params, weight)
+
+
+class _StubMessage:
+    __slots__ = ('_topic', '_key', '_value')
+
+    def __init__(self, topic, key, value):
+        self._topic = topic
+        self._key = key
+        self._value = value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return 0
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def latency(self):
+        return 0.0
+
+
+class StubProducer:
+    """
+    A local stand-in for confluent_kafka.Producer.
+
+    Messages are acknowledged on the next poll or flush, like a broker that never
+    fails; counters record messages and bytes out. With `queue_limit`, produce raises
+    BufferError while that many messages await acknowledgement, like a full local queue.
+    Like the real producer it can be shared between threads, e.g. a publisher thread
+    that polls it while history is produced.
+    """
+    def __init__(self, config=None, queue_limit=None):
+        self.messages = 0
+        self.bytes_out = 0
+        self.queue_limit = queue_limit
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def produce(self, topic, value=None, key=None, headers=None, on_delivery=None, callback=None, **kwargs):
+        with self._lock:
+            if self.queue_limit is not None and len(self._pending) >= self.queue_limit:
+                raise BufferError('Local: Queue full')
+            self.messages += 1
+            self.bytes_out += len(value or b'') + len(key or b'')
+            on_delivery = on_delivery or callback
+            if on_delivery is not None:
+                self._pending.append((on_delivery, topic, key, value))
+
+    def poll(self, timeout=None):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for on_delivery, topic, key, value in pending:
+            on_delivery(None, _StubMessage(topic, key, value))
+        return len(pending)
+
+    def flush(self, timeout=None):
+        self.poll(0)
+        return 0
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class StubAdminClient:
+    """ A local stand-in for confluent_kafka.admin.AdminClient that tracks topic names. """
+    def __init__(self, config=None):
+        self.topics = {}
+
+    def list_topics(self, timeout=None):
+        return SimpleNamespace(topics=dict(self.topics))
+
+    def create_topics(self, new_topics, **kwargs):
+        futures = {}
+        for new_topic in new_topics:
+            self.topics[new_topic.topic] = new_topic
+            futures[new_topic.topic] = Future()
+            futures[new_topic.topic].set_result(None)
+        return futures
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds between checkpoint file writes
+
+
+class CheckpointStore:
+    """
+    Durable per-(topic, symbol, interval) checkpoints of the last acknowledged bar.
+
+    Checkpoints are advanced from Kafka delivery callbacks and only ever move forward.
+    Once a message fails, the checkpoint of its key is held below that bar for the rest
+    of the process, so a restart republishes it instead of skipping over it. The file is
+    rewritten atomically at most every `flush_interval` seconds and on flush().
+
+    Args:
+        path (str): The JSON file holding the checkpoints.
+        flush_interval (float): Minimum seconds between writes; 0 writes on every advance.
+    """
+    def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._checkpoints = self._read()
+        self._holds = {}
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def get(self, topic, symbol, interval):
+        """
+        Returns:
+            int: The timestamp of the last acknowledged bar, or None if there is none.
+        """
+        with self._lock:
+            return self._checkpoints.get(self._key(topic, symbol, interval))
+
+    def advance(self, topic, symbol, interval, timestamp):
+        """ Records that the bar at `timestamp` was acknowledged by the broker. """
+        key = self._key(topic, symbol, interval)
+        with self._lock:
+            hold = self._holds.get(key)
+            if hold is not None and timestamp >= hold:
+                return
+            if timestamp <= self._checkpoints.get(key, timestamp - 1):
+                return
+            self._checkpoints[key] = timestamp
+            self._dirty = True
+            if time.monotonic() - self._last_flush < self.flush_interval:
+                return
+            self._write()
+
+    def hold(self, topic, symbol, interval, timestamp):
+        """ Keeps the checkpoint below the bar at `timestamp`, whose delivery failed. """
+        key = self._key(topic, symbol, interval)
+        with self._lock:
+            self._holds[key] = min(self._holds.get(key, timestamp), timestamp)
+
+    def flush(self):
+        """ Writes pending checkpoints to disk. """
+        with self._lock:
+            if self._dirty:
+                self._write()
+
+    @staticmethod
+    def _key(topic, symbol, interval):
+        return f'{topic}|{symbol}|{interval}'
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return {key: int(timestamp) for key, timestamp in json.load(f).items()}
+
+    def _write(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._checkpoints, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._last_flush = time.monotonic()
@@ -1,25 +1,207 @@
-from .REST_api.binance_api import BinanceApi
-from .REST_api.okx_api import OkxApi
-from .REST_api.xt_api import XtApi
-from .REST_api.tiger_api import TigerApi
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .memory_cache import SingleFlight, merge_bars
 from .ohclv_data import OhclvData
+from .registry import REST_ADAPTERS
+from . import hist_bar_const as hbc
+
+DEFAULT_MAX_WORKERS = 8
 
 class HistApi:
     """
     A manager class to call different REST APIs to get historic data.
+
+    The exchange adapter comes from the REST_ADAPTERS registry, so only the selected
+    exchange's module (and SDK) is imported.
+
+    Args:
+        exchange (str): The exchange to fetch from.
+        max_workers (int): The number of pages fetched concurrently.
+        cache (BarCache): Optional on-disk cache of fetched ranges.
+        memory_cache (MemoryBarCache): Optional in-memory cache in front of `cache`.
+        single_flight (SingleFlight | bool): Merges concurrent identical requests. True gives
+            this instance its own; pass one to share it only between instances with the same
+            adapter and caches. False or None disables it.
     """
-    def __init__(self, exchange):
-        if exchange == 'binance':
-            self.api = BinanceApi()
-        elif exchange == 'okx':
-            self.api = OkxApi()
-        elif exchange == 'xt':
-            self.api = XtApi()
-        elif exchange == 'tiger':
-            self.api = TigerApi()
+    def __init__(self, exchange, max_workers=DEFAULT_MAX_WORKERS, cache=None, memory_cache=None,
+                 single_flight=True):
+        self.api = REST_ADAPTERS.create(exchange)
+
+        self.max_workers = max_workers
+        self.cache = cache
+        self.memory_cache = memory_cache
+        if single_flight is True:
+            single_flight = SingleFlight()
+        self.single_flight = single_flight or None
+        self._executor = None
+
+    def get_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        """
+        Fetches historical bars, paginating over [start_time, end_time] when a range is given.
+
+        The range is split into chunks of at most `page_limit` bars for the exchange,
+        the chunks are fetched concurrently on a bounded worker pool, and the pages are
+        stitched into a single sorted OhclvData without duplicate timestamps. With a
+        cache configured, only the ranges missing from the cache are fetched.
+
+        Concurrent calls with the same arguments share a single fetch, and with a memory
+        cache, recent-window requests only fetch the bars after the cached ones. With
+        single flight, every caller gets its own read-only view of the shared bars, so
+        copy them before writing.
+
+        Args:
+            symbol (str): The symbol to fetch.
+            interval (str): A standardized interval from hist_bar_const.
+            start_time (int): Inclusive range start in epoch milliseconds. If omitted,
+                the exchange's most recent page is returned.
+            end_time (int): Inclusive range end in epoch milliseconds. Defaults to now.
+
+        Returns:
+            OhclvData: The historical bars in ascending timestamp order.
+        """
+        if self.single_flight is None:
+            return self._get_hist_bars(symbol, interval, start_time, end_time)
+        key = (self.api.exchange, symbol, interval, start_time, end_time)
+        return self.single_flight.do(key, self._get_hist_bars, symbol, interval, start_time, end_time).read_only()
+
+    async def aget_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        """
+        Awaitable version of get_hist_bars.
+
+        Chunks are awaited concurrently through the exchange's aget_hist_bars, bounded by
+        `max_workers` in flight, and cache file I/O runs off the event loop.
+        """
+        if self.single_flight is None:
+            return await self._aget_hist_bars(symbol, interval, start_time, end_time)
+        key = (self.api.exchange, symbol, interval, start_time, end_time)
+        bars = await self.single_flight.ado(key, self._aget_hist_bars, symbol, interval, start_time, end_time)
+        return bars.read_only()
+
+    def _get_hist_bars(self, symbol, interval, start_time, end_time):
+        if start_time is None:
+            return self.api.get_hist_bars(symbol, interval, end_time=end_time)
+        if end_time is None:
+            end_time = int(time.time() * 1000)
+
+        if self.memory_cache is None:
+            return self._load_ranges(symbol, interval, [(start_time, end_time)])
+
+        exchange = self.api.exchange
+        cached, missing = self.memory_cache.lookup(exchange, symbol, interval, start_time, end_time)
+        if not missing:
+            return cached
+        fetched = self._load_ranges(symbol, interval, missing)
+        self.memory_cache.store(exchange, symbol, interval, fetched, missing)
+        return merge_bars(cached, fetched, missing)
+
+    async def _aget_hist_bars(self, symbol, interval, start_time, end_time):
+        if start_time is None:
+            return await self.api.aget_hist_bars(symbol, interval, end_time=end_time)
+        if end_time is None:
+            end_time = int(time.time() * 1000)
+
+        if self.memory_cache is None:
+            return await self._aload_ranges(symbol, interval, [(start_time, end_time)])
+
+        exchange = self.api.exchange
+        cached, missing = self.memory_cache.lookup(exchange, symbol, interval, start_time, end_time)
+        if not missing:
+            return cached
+        fetched = await self._aload_ranges(symbol, interval, missing)
+        self.memory_cache.store(exchange, symbol, interval, fetched, missing)
+        return merge_bars(cached, fetched, missing)
+
+    def _load_ranges(self, symbol, interval, ranges):
+        """ Reads `ranges` from the disk cache, fetching and storing what it lacks. """
+        if self.cache is None:
+            return self._fetch_ranges(symbol, interval, ranges)
+
+        exchange = self.api.exchange
+        pages = []
+        for start_time, end_time in ranges:
+            missing = self.cache.missing_ranges(exchange, symbol, interval, start_time, end_time)
+            if missing:
+                fetched = self._fetch_ranges(symbol, interval, missing)
+                self.cache.store(exchange, symbol, interval, fetched, missing)
+            pages.append(self.cache.load(exchange, symbol, interval, start_time, end_time))
+        return pages[0] if len(pages) == 1 else self._stitch(pages, ranges)
+
+    async def _aload_ranges(self, symbol, interval, ranges):
+        if self.cache is None:
+            return await self._afetch_ranges(symbol, interval, ranges)
+
+        exchange = self.api.exchange
+        pages = []
+        for start_time, end_time in ranges:
+            missing = await asyncio.to_thread(self.cache.missing_ranges, exchange, symbol, interval, start_time, end_time)
+            if missing:
+                fetched = await self._afetch_ranges(symbol, interval, missing)
+                await asyncio.to_thread(self.cache.store, exchange, symbol, interval, fetched, missing)
+            pages.append(await asyncio.to_thread(self.cache.load, exchange, symbol, interval, start_time, end_time))
+        return pages[0] if len(pages) == 1 else self._stitch(pages, ranges)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.api.close()
+
+    async def aclose(self):
+        await self.api.aclose()
+        self.close()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f'hist-{self.api.exchange}')
+        return self._executor
+
+    def _fetch_ranges(self, symbol, interval, ranges):
+        chunks = self._split_ranges(interval, ranges)
+        if len(chunks) == 1:
+            pages = [self.api.get_hist_bars(symbol, interval, *chunks[0])]
         else:
-            raise ValueError(f'Exchange {exchange} is not supported.')
+            executor = self._get_executor()
+            # Run each chunk in a copy of the caller's context so settings such as the
+            # request priority reach the worker threads
+            futures = [executor.submit(contextvars.copy_context().run, self.api.get_hist_bars,
+                                       symbol, interval, chunk_start, chunk_end)
+                       for chunk_start, chunk_end in chunks]
+            pages = [future.result() for future in futures]
+        return self._stitch(pages, ranges)
+
+    async def _afetch_ranges(self, symbol, interval, ranges):
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch(chunk_start, chunk_end):
+            async with semaphore:
+                return await self.api.aget_hist_bars(symbol, interval, chunk_start, chunk_end)
+
+        pages = await asyncio.gather(*(fetch(*chunk) for chunk in self._split_ranges(interval, ranges)))
+        return self._stitch(pages, ranges)
+
+    def _split_ranges(self, interval, ranges):
+        return [chunk for start_time, end_time in ranges
+                for chunk in self._split_range(interval, start_time, end_time)]
+
+    def _split_range(self, interval, start_time, end_time):
+        if interval not in hbc.INTERVAL_MS:
+            raise ValueError(f'Interval {interval} is not supported for range requests.')
+        if start_time > end_time:
+            raise ValueError('start_time must not be after end_time.')
+
+        span = hbc.INTERVAL_MS[interval] * self.api.page_limit
+        return [(chunk_start, min(chunk_start + span - 1, end_time))
+                for chunk_start in range(start_time, end_time + 1, span)]
 
-    def get_hist_bars(self, symbol, interval):
-        raw_data = self.api.get_hist_bars(symbol, interval)
-        return OhclvData(raw_data)
+    @staticmethod
+    def _stitch(pages, ranges):
+        # Later pages win over earlier ones with the same timestamp
+        merged = OhclvData.merge(*pages)
+        timestamps = merged.timestamps
+        in_range = np.zeros(len(timestamps), dtype=bool)
+        for start_time, end_time in ranges:
+            in_range |= (timestamps >= start_time) & (timestamps <= end_time)
+        return merged if in_range.all() else merged.filter(in_range)
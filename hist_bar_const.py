@@ -7,6 +7,17 @@ INTERVAL_1HOUR = '1h'
 INTERVAL_4HOUR = '4h'
 INTERVAL_1DAY = '1d'
 
+# Interval lengths in milliseconds
+INTERVAL_MS = {
+    INTERVAL_1MINUTE: 60 * 1000,
+    INTERVAL_5MINUTE: 5 * 60 * 1000,
+    INTERVAL_15MINUTE: 15 * 60 * 1000,
+    INTERVAL_30MINUTE: 30 * 60 * 1000,
+    INTERVAL_1HOUR: 60 * 60 * 1000,
+    INTERVAL_4HOUR: 4 * 60 * 60 * 1000,
+    INTERVAL_1DAY: 24 * 60 * 60 * 1000,
+}
+
 # Standardized field names for historical bars
 OHLCV_OPEN = 'open'
 OHLCV_HIGH = 'high'
@@ -15,14 +26,42 @@ OHLCV_CLOSE = 'close'
 OHLCV_VOLUME = 'volume'
 OHLCV_TIMESTAMP = 'timestamp'
 
+# HTTP transport settings
+HTTP_TIMEOUT = 10  # seconds
+HTTP_POOL_SIZE = 32  # keep-alive connections per host
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_BASE = 0.5  # seconds, doubled on every retry
+HTTP_RETRY_STATUSES = (418, 429, 500, 502, 503, 504)
+
+# Request priorities, lower is served first
+PRIORITY_LIVE = 0  # gap repair for live subscriptions
+PRIORITY_BACKFILL = 10  # bulk history downloads
+
+# Per-exchange rate limits as (bucket capacity, refill per second) in request weight
+RATE_LIMITS = {
+    'binance': (6000, 100.0),  # 6000 weight per minute
+    'okx': (20, 10.0),  # 20 requests per 2 seconds
+    'xt': (10, 10.0),  # 10 requests per second
+}
+
 # Binance specific constants
 BINANCE_API_URL = 'https://api.binance.com'
+BINANCE_KLINES_PATH = '/api/v3/klines'
+BINANCE_PAGE_LIMIT = 1000
+BINANCE_KLINES_WEIGHT = 2
+BINANCE_KLINE_WIDTH = 12  # values per kline array
 
 # OKX specific constants
 OKX_API_URL = 'https://www.okx.com'
+OKX_KLINES_PATH = '/api/v5/market/history-candles'
+OKX_PAGE_LIMIT = 100
+OKX_KLINE_WIDTH = 9  # values per candle array
 
 # XT specific constants
 XT_API_URL = 'https://api.xt.com'
+XT_KLINES_PATH = '/v4/public/kline'
+XT_PAGE_LIMIT = 1000
 
 # Tiger specific constants
 TIGER_API_URL = 'https://openapi.itiger.com/gateway'
+TIGER_PAGE_LIMIT = 251  # QuoteClient.get_bars default limit
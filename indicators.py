@@ -0,0 +1,356 @@
+import collections
+import math
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+from . import hist_bar_const as hbc
+from .resample import bucket_starts
+
+# Bar fields an indicator can be computed over
+_FIELD_COLUMNS = {
+    hbc.OHLCV_OPEN: 'open',
+    hbc.OHLCV_HIGH: 'high',
+    hbc.OHLCV_LOW: 'low',
+    hbc.OHLCV_CLOSE: 'close',
+    hbc.OHLCV_VOLUME: 'volume',
+}
+# Spans of history exponentially smoothed indicators are warmed up over, which leaves
+# a weight of about e^-20 on the seed of an EMA and e^-10 on that of an ATR
+EXP_WARM_UP_SPANS = 10
+
+
+class Indicator(ABC):
+    """
+    Base class for indicators that are computed in batch and then updated per bar.
+
+    `compute` returns the indicator over a whole OhclvData with vectorized NumPy and
+    leaves the indicator ready for live updates. Live state is kept as of the last
+    committed bar: `value_with` returns the value a new or updated bar would have
+    without changing that state, and `commit` folds a final bar in. Both are O(1), so
+    repeated updates of a forming bar cost the same as a new bar.
+
+    `warm_up_bars` is the number of bars up to and including the current one that the
+    current value depends on, and `warm_up_start` the earliest time it depends on, so
+    computing over those bars gives the same value as computing over the whole history.
+    """
+    warm_up_bars = 1
+
+    def warm_up_start(self, timestamp) -> int:
+        """
+        Returns:
+            int: The earliest open time the value at `timestamp` depends on, apart from
+                its `warm_up_bars` most recent bars.
+        """
+        return timestamp
+
+    @abstractmethod
+    def compute(self, ohlcv) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def value_with(self, bar) -> float:
+        pass
+
+    @abstractmethod
+    def commit(self, bar):
+        pass
+
+
+class SMA(Indicator):
+    """ Simple moving average of `field` over `window` bars. """
+    def __init__(self, window, field=hbc.OHLCV_CLOSE):
+        self.window = window
+        self.field = field
+        self.warm_up_bars = window
+        self._values = collections.deque(maxlen=window - 1)
+        self._sum = 0.0
+
+    def compute(self, ohlcv):
+        values = getattr(ohlcv, _FIELD_COLUMNS[self.field])
+        result = np.full(len(values), np.nan)
+        if len(values) >= self.window:
+            sums = np.cumsum(np.concatenate(([0.0], values)))
+            result[self.window - 1:] = (sums[self.window:] - sums[:-self.window]) / self.window
+        # Live state: the window - 1 values before the last bar
+        self._values.clear()
+        self._values.extend(values[:-1][-(self.window - 1):].tolist() if self.window > 1 else [])
+        self._sum = float(sum(self._values))
+        return result
+
+    def value_with(self, bar):
+        if len(self._values) < self.window - 1:
+            return math.nan
+        return (self._sum + bar[self.field]) / self.window
+
+    def commit(self, bar):
+        if self.window == 1:
+            return
+        if len(self._values) == self._values.maxlen:
+            self._sum -= self._values[0]
+        self._values.append(bar[self.field])
+        self._sum += bar[self.field]
+
+
+class EMA(Indicator):
+    """ Exponential moving average of `field` with smoothing 2 / (span + 1), seeded with the first value. """
+    def __init__(self, span, field=hbc.OHLCV_CLOSE):
+        self.alpha = 2.0 / (span + 1)
+        self.field = field
+        self.warm_up_bars = EXP_WARM_UP_SPANS * span
+        self._ema = None
+
+    def compute(self, ohlcv):
+        values = getattr(ohlcv, _FIELD_COLUMNS[self.field])
+        result = pd.Series(values).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        self._ema = float(result[-2]) if len(result) > 1 else None
+        return result
+
+    def value_with(self, bar):
+        if self._ema is None:
+            return float(bar[self.field])
+        return self.alpha * bar[self.field] + (1 - self.alpha) * self._ema
+
+    def commit(self, bar):
+        self._ema = self.value_with(bar)
+
+
+class ATR(Indicator):
+    """ Average true range with Wilder's smoothing over `window` bars. """
+    def __init__(self, window=14):
+        self.window = window
+        self.alpha = 1.0 / window
+        self.warm_up_bars = EXP_WARM_UP_SPANS * window
+        self._atr = None
+        self._prev_close = None
+
+    def compute(self, ohlcv):
+        high, low, close = ohlcv.high, ohlcv.low, ohlcv.close
+        true_range = high - low
+        if len(close) > 1:
+            prev_close = close[:-1]
+            true_range[1:] = np.maximum(true_range[1:], np.maximum(np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)))
+        result = pd.Series(true_range).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        self._atr = float(result[-2]) if len(result) > 1 else None
+        self._prev_close = float(close[-2]) if len(close) > 1 else None
+        return result
+
+    def value_with(self, bar):
+        true_range = bar[hbc.OHLCV_HIGH] - bar[hbc.OHLCV_LOW]
+        if self._prev_close is not None:
+            true_range = max(true_range, abs(bar[hbc.OHLCV_HIGH] - self._prev_close), abs(bar[hbc.OHLCV_LOW] - self._prev_close))
+        if self._atr is None:
+            return true_range
+        return self.alpha * true_range + (1 - self.alpha) * self._atr
+
+    def commit(self, bar):
+        self._atr = self.value_with(bar)
+        self._prev_close = bar[hbc.OHLCV_CLOSE]
+
+
+class VWAP(Indicator):
+    """
+    Volume-weighted average of the typical price (high + low + close) / 3, reset at the
+    start of every `session_ms` session aligned to `offset` milliseconds past the epoch.
+    """
+    def __init__(self, session_ms=hbc.INTERVAL_MS[hbc.INTERVAL_1DAY], offset=0):
+        self.session_ms = session_ms
+        self.offset = offset
+        self._session = None
+        self._pv = 0.0
+        self._volume = 0.0
+
+    def compute(self, ohlcv):
+        typical = (ohlcv.high + ohlcv.low + ohlcv.close) / 3
+        volume = ohlcv.volume
+        sessions = bucket_starts(ohlcv.timestamps, self.session_ms, self.offset)
+        cum_pv = np.cumsum(typical * volume)
+        cum_volume = np.cumsum(volume)
+        # Subtract the running totals as of the start of each bar's session
+        new_session = np.ones(len(sessions), dtype=bool)
+        new_session[1:] = sessions[1:] != sessions[:-1]
+        session_ids = np.cumsum(new_session) - 1
+        starts = np.flatnonzero(new_session)
+        base_pv = np.concatenate(([0.0], cum_pv))[starts][session_ids]
+        base_volume = np.concatenate(([0.0], cum_volume))[starts][session_ids]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = (cum_pv - base_pv) / (cum_volume - base_volume)
+
+        self._session, self._pv, self._volume = None, 0.0, 0.0
+        if len(sessions) > 1:
+            self._session = int(sessions[-2])
+            self._pv = float(cum_pv[-2] - base_pv[-2])
+            self._volume = float(cum_volume[-2] - base_volume[-2])
+        return result
+
+    def warm_up_start(self, timestamp):
+        # Every bar of the current session counts
+        return (timestamp - self.offset) // self.session_ms * self.session_ms + self.offset
+
+    def value_with(self, bar):
+        pv, volume = self._totals_with(bar)
+        return pv / volume if volume else math.nan
+
+    def commit(self, bar):
+        self._pv, self._volume = self._totals_with(bar)
+        self._session = self._session_of(bar)
+
+    def _session_of(self, bar):
+        return (bar[hbc.OHLCV_TIMESTAMP] - self.offset) // self.session_ms * self.session_ms + self.offset
+
+    def _totals_with(self, bar):
+        typical = (bar[hbc.OHLCV_HIGH] + bar[hbc.OHLCV_LOW] + bar[hbc.OHLCV_CLOSE]) / 3
+        pv = typical * bar[hbc.OHLCV_VOLUME]
+        if self._session_of(bar) != self._session:
+            return pv, bar[hbc.OHLCV_VOLUME]
+        return self._pv + pv, self._volume + bar[hbc.OHLCV_VOLUME]
+
+
+class _RollingExtreme(Indicator):
+    """ Rolling maximum or minimum of `field` over `window` bars, kept in a monotonic deque. """
+    def __init__(self, window, field, is_max):
+        self.window = window
+        self.field = field
+        self.is_max = is_max
+        self.warm_up_bars = window
+        self._candidates = collections.deque()  # (position, value), monotonic
+        self._count = 0
+
+    def compute(self, ohlcv):
+        values = getattr(ohlcv, _FIELD_COLUMNS[self.field])
+        rolling = pd.Series(values).rolling(self.window)
+        result = (rolling.max() if self.is_max else rolling.min()).to_numpy()
+
+        self._candidates.clear()
+        committed = values[:-1]
+        tail_start = max(len(committed) - (self.window - 1), 0)
+        self._count = tail_start
+        for value in committed[tail_start:].tolist():
+            self._push(value)
+        return result
+
+    def value_with(self, bar):
+        if self._count + 1 < self.window:
+            return math.nan
+        value = bar[self.field]
+        if not self._candidates:
+            return value
+        best = self._candidates[0][1]
+        return max(best, value) if self.is_max else min(best, value)
+
+    def commit(self, bar):
+        self._push(bar[self.field])
+
+    def _push(self, value):
+        candidates = self._candidates
+        while candidates and (candidates[-1][1] <= value if self.is_max else candidates[-1][1] >= value):
+            candidates.pop()
+        candidates.append((self._count, value))
+        self._count += 1
+        # Keep the window - 1 most recent positions; the next bar completes the window
+        while candidates[0][0] <= self._count - self.window:
+            candidates.popleft()
+
+
+class RollingHigh(_RollingExtreme):
+    """ Highest `field` (the high by default) over the last `window` bars. """
+    def __init__(self, window, field=hbc.OHLCV_HIGH):
+        super().__init__(window, field, is_max=True)
+
+
+class RollingLow(_RollingExtreme):
+    """ Lowest `field` (the low by default) over the last `window` bars. """
+    def __init__(self, window, field=hbc.OHLCV_LOW):
+        super().__init__(window, field, is_max=False)
+
+
+class Returns(Indicator):
+    """ Bar-over-bar return of `field`, simple or logarithmic. """
+    def __init__(self, field=hbc.OHLCV_CLOSE, log=False):
+        self.field = field
+        self.log = log
+        self.warm_up_bars = 2
+        self._prev = None
+
+    def compute(self, ohlcv):
+        values = getattr(ohlcv, _FIELD_COLUMNS[self.field])
+        result = np.full(len(values), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[1:] = np.log(values[1:] / values[:-1]) if self.log else values[1:] / values[:-1] - 1
+        self._prev = float(values[-2]) if len(values) > 1 else None
+        return result
+
+    def value_with(self, bar):
+        if not self._prev:
+            return math.nan
+        ratio = bar[self.field] / self._prev
+        return math.log(ratio) if self.log else ratio - 1
+
+    def commit(self, bar):
+        self._prev = bar[self.field]
+
+
+class IndicatorEngine:
+    """
+    Computes a set of named indicators over history and keeps them current per live bar.
+
+    Example:
+        engine = IndicatorEngine({'sma_20': SMA(20), 'atr_14': ATR(14), 'vwap': VWAP()})
+        history = engine.compute(ohlcv)             # arrays, vectorized
+        values = engine.update(live_bar)            # floats, O(1) per bar
+
+    `update` treats a bar with the same timestamp as the previous one as a revision of
+    the forming bar and a newer timestamp as the close of the previous bar. Calls are
+    serialized, since live bars arrive from both the WebSocket thread and the event loop.
+    """
+    def __init__(self, indicators):
+        self.indicators = dict(indicators)
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def compute(self, ohlcv) -> dict:
+        """
+        Returns:
+            dict: An array per indicator name, aligned with the bars of `ohlcv`.
+        """
+        with self._lock:
+            results = {name: indicator.compute(ohlcv) for name, indicator in self.indicators.items()}
+            # The last bar may still be forming, so it stays pending until a newer bar arrives
+            self._pending = ohlcv[len(ohlcv) - 1] if len(ohlcv) else None
+            return results
+
+    @property
+    def warm_up_bars(self) -> int:
+        """ The number of bars up to and including the current one that any indicator needs. """
+        return max((indicator.warm_up_bars for indicator in self.indicators.values()), default=1)
+
+    def warm_up_start(self, timestamp) -> int:
+        """
+        Returns:
+            int: The earliest open time any indicator needs for its value at `timestamp`,
+                apart from the `warm_up_bars` most recent bars.
+        """
+        return min((indicator.warm_up_start(timestamp) for indicator in self.indicators.values()), default=timestamp)
+
+    def update(self, bar) -> dict:
+        """
+        Applies a live bar.
+
+        Returns:
+            dict: The value of every indicator for `bar`, with None where it is undefined.
+                Empty for bars older than the last one.
+        """
+        with self._lock:
+            if self._pending is not None:
+                pending_timestamp = self._pending[hbc.OHLCV_TIMESTAMP]
+                if bar[hbc.OHLCV_TIMESTAMP] < pending_timestamp:
+                    return {}
+                if bar[hbc.OHLCV_TIMESTAMP] > pending_timestamp:
+                    for indicator in self.indicators.values():
+                        indicator.commit(self._pending)
+            self._pending = bar
+            values = {}
+            for name, indicator in self.indicators.items():
+                value = indicator.value_with(bar)
+                values[name] = None if value != value else value
+            return values
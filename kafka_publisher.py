@@ -0,0 +1,313 @@
+import collections
+import threading
+import time
+from . import hist_bar_const as hbc
+from .metrics import REGISTRY, PROFILER
+
+POLICY_BLOCK = 'block'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_COALESCE = 'coalesce'
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MICRO_BATCH = 500
+DEFAULT_LINGER = 0.005  # seconds
+DEFAULT_PRODUCE_TIMEOUT = 30.0  # seconds to wait for room in a full producer queue
+
+
+class DeliveryStats:
+    """ Aggregated delivery accounting for a bulk publish. """
+    def __init__(self):
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        self.last_error = None
+
+    def on_delivery(self, err, msg):
+        if err is not None:
+            self.failed += 1
+            self.last_error = err
+        else:
+            self.delivered += 1
+
+    @property
+    def pending(self):
+        return self.produced - self.delivered - self.failed
+
+
+def produce_with_retry(producer, topic, key, value, headers, callback, timeout=DEFAULT_PRODUCE_TIMEOUT):
+    """
+    Produces one message, serving delivery reports while the local queue is full.
+
+    Raises:
+        BufferError: If the queue is still full after `timeout` seconds, e.g. because
+            the broker stalled.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            producer.produce(topic, key=key, value=value, headers=headers, on_delivery=callback)
+            return
+        except BufferError:
+            if time.monotonic() >= deadline:
+                raise
+            producer.poll(0.1)
+
+
+class PublishQueue:
+    """
+    A bounded queue between WebSocket callbacks and the Kafka publisher.
+
+    `put` is called from exchange push threads and never waits on Kafka. When the queue
+    is full the policy decides what happens:
+
+    - POLICY_BLOCK: the caller waits for space, up to `block_timeout` seconds, after
+      which the new message is dropped.
+    - POLICY_DROP_OLDEST: the oldest queued message is dropped.
+    - POLICY_COALESCE: a message for a (topic, timestamp) that is already queued
+      replaces it in place, so updates to a forming bar collapse into the latest one.
+      If the queue is still full the oldest message is dropped.
+
+    Every entry remembers when it was first queued, see `get_timed_batch`.
+    """
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, policy=POLICY_BLOCK, block_timeout=None):
+        if policy not in (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COALESCE):
+            raise ValueError(f'Backpressure policy {policy} is not supported.')
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        # Each entry is a mutable [topic, data, enqueued_at] slot so coalescing can update it in place
+        self._entries = collections.deque()
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._consumer_waiting = False
+        self._closed = False
+
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, topic, data):
+        """
+        Queues a bar for publication.
+
+        Returns:
+            bool: False if the message was dropped.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            if self.policy == POLICY_COALESCE:
+                slot = self._slots.get((topic, data.get(hbc.OHLCV_TIMESTAMP)))
+                if slot is not None:
+                    slot[1] = data
+                    self.coalesced += 1
+                    return True
+
+            if len(self._entries) >= self.maxsize:
+                if self.policy == POLICY_BLOCK:
+                    deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+                    while len(self._entries) >= self.maxsize and not self._closed:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self.dropped += 1
+                            return False
+                        self._not_full.wait(remaining)
+                    if self._closed:
+                        return False
+                else:
+                    self._discard(self._entries.popleft())
+                    self.dropped += 1
+
+            slot = [topic, data, time.perf_counter()]
+            self._entries.append(slot)
+            if self.policy == POLICY_COALESCE:
+                self._slots[(topic, data.get(hbc.OHLCV_TIMESTAMP))] = slot
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._entries))
+            # Only pay for a notify when the publisher is actually idle
+            if self._consumer_waiting:
+                self._not_empty.notify()
+            return True
+
+    def get_batch(self, max_items=DEFAULT_MICRO_BATCH, timeout=None):
+        """
+        Removes up to `max_items` messages, waiting up to `timeout` seconds for the first one.
+
+        Returns:
+            list: (topic, data) tuples in arrival order; empty on timeout or once closed and drained.
+        """
+        return [(topic, data) for topic, data, _ in self.get_timed_batch(max_items, timeout)]
+
+    def get_timed_batch(self, max_items=DEFAULT_MICRO_BATCH, timeout=None):
+        """
+        Like get_batch, but also returns when each message was queued.
+
+        Returns:
+            list: (topic, data, enqueued_at) tuples, with `enqueued_at` from time.perf_counter().
+        """
+        with self._lock:
+            if not self._entries and not self._closed:
+                self._consumer_waiting = True
+                try:
+                    self._not_empty.wait(timeout)
+                finally:
+                    self._consumer_waiting = False
+
+            batch = []
+            while self._entries and len(batch) < max_items:
+                slot = self._entries.popleft()
+                self._discard(slot)
+                batch.append((slot[0], slot[1], slot[2]))
+            self.dequeued += len(batch)
+            if batch and self.policy == POLICY_BLOCK:
+                self._not_full.notify_all()
+            return batch
+
+    def close(self):
+        """ Rejects new messages and wakes up any waiting threads. """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def stats(self):
+        """
+        Returns:
+            dict: Queue depth and counters.
+        """
+        return {
+            'depth': len(self._entries),
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'dequeued': self.dequeued,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+        }
+
+    def _discard(self, slot):
+        if self._slots:
+            self._slots.pop((slot[0], slot[1].get(hbc.OHLCV_TIMESTAMP)), None)
+
+
+class KafkaPublisher(threading.Thread):
+    """
+    Drains a PublishQueue in micro-batches on its own thread and produces to Kafka.
+
+    Args:
+        producer: A confluent_kafka Producer.
+        queue (PublishQueue): The queue to drain.
+        encode (callable): Maps a bar dict to (key, value, headers).
+        batch_size (int): The maximum number of messages per micro-batch.
+        linger (float): Seconds to wait for messages when the queue is empty.
+        registry (MetricsRegistry): Receives per-topic queue wait, broker ack and
+            end-to-end latency histograms and bytes out. The end-to-end latency runs
+            from the bar's close, its open timestamp read from the message key plus the
+            topic's interval, to the ack.
+        profiler (SamplingProfiler): Samples micro-batches when its rate is above zero.
+        delivery_callback (callable): Also called as delivery_callback(err, msg) for every
+            delivery report, e.g. to checkpoint acknowledged bars.
+        interval_ms (dict): Bar interval in milliseconds per topic, for the end-to-end
+            latency. Topics without one are measured from the bar's open timestamp.
+    """
+    def __init__(self, producer, queue, encode, batch_size=DEFAULT_MICRO_BATCH, linger=DEFAULT_LINGER,
+                 registry=REGISTRY, profiler=PROFILER, delivery_callback=None, interval_ms=None):
+        super().__init__(name='kafka-publisher', daemon=True)
+        self.producer = producer
+        self.queue = queue
+        self.encode = encode
+        self.batch_size = batch_size
+        self.linger = linger
+        self.registry = registry
+        self.profiler = profiler
+        self.delivery_callback = delivery_callback
+        self.interval_ms = interval_ms if interval_ms is not None else {}
+        # Seconds a message waits for room in the producer queue before it counts as failed
+        self.produce_timeout = DEFAULT_PRODUCE_TIMEOUT
+        self.stats = DeliveryStats()
+        self._topic_metrics = {}
+
+    def run(self):
+        while True:
+            batch = self.queue.get_timed_batch(self.batch_size, self.linger)
+            if not batch:
+                if self.queue.closed:
+                    return
+                self._poll()
+                continue
+            with self.profiler.sample():
+                now = time.perf_counter()
+                for topic, data, enqueued_at in batch:
+                    # One bad bar or producer error must not stop the thread and every live feed with it
+                    try:
+                        key, value, headers = self.encode(data)
+                        queue_seconds, bytes_out, _, _ = self._metrics(topic)
+                        queue_seconds.record(now - enqueued_at)
+                        bytes_out.inc(len(value))
+                        produce_with_retry(self.producer, topic, key, value, headers, self._on_delivery,
+                                           self.produce_timeout)
+                    except Exception as e:
+                        self.stats.failed += 1
+                        self.stats.last_error = e
+                        print(f"Failed to publish live bar {data.get(hbc.OHLCV_TIMESTAMP)} to {topic}: {e!r}")
+                        if isinstance(e, BufferError) and self.queue.closed:
+                            # The broker stalled while stopping: fail the rest fast so stop returns
+                            self.produce_timeout = 0
+                self.stats.produced += len(batch)
+                self._poll()
+
+    def stop(self, timeout=None):
+        """ Publishes what is already queued, then stops the thread. """
+        self.queue.close()
+        self.join(timeout)
+
+    def _poll(self):
+        # Exceptions raised in delivery callbacks are raised again from poll
+        try:
+            self.producer.poll(0)
+        except Exception as e:
+            print(f"Kafka delivery callback failed: {e!r}")
+
+    def _on_delivery(self, err, msg):
+        self.stats.on_delivery(err, msg)
+        if self.delivery_callback is not None:
+            try:
+                self.delivery_callback(err, msg)
+            except Exception as e:
+                print(f"Delivery callback failed for topic {msg.topic()}: {e!r}")
+        if err is not None:
+            return
+        _, _, ack_seconds, end_to_end_seconds = self._metrics(msg.topic())
+        latency = msg.latency()
+        if latency is not None:
+            ack_seconds.record(latency)
+        try:
+            closed_at = int(msg.key()) + self.interval_ms.get(msg.topic(), 0)
+        except (TypeError, ValueError):
+            return
+        latency = time.time() - closed_at / 1000
+        # Updates of a forming bar are acknowledged before it closes and say nothing about lag
+        if latency >= 0:
+            end_to_end_seconds.record(latency)
+
+    def _metrics(self, topic):
+        metrics = self._topic_metrics.get(topic)
+        if metrics is None:
+            metrics = self._topic_metrics[topic] = (
+                self.registry.histogram('publish_queue_seconds', 'Time live bars wait in the publish queue.', topic=topic),
+                self.registry.counter('kafka_bytes_out_total', 'Message bytes handed to the Kafka producer.', topic=topic),
+                self.registry.histogram('kafka_ack_seconds', 'Time from produce to broker acknowledgement.', topic=topic),
+                self.registry.histogram('live_bar_end_to_end_seconds', 'Time from the bar close to broker acknowledgement, for bars acknowledged after they closed.', topic=topic),
+            )
+        return metrics
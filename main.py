@@ -1,25 +1,68 @@
 import asyncio
-import json
+import threading
+import time
+import numpy as np
 from confluent_kafka import Producer
 from confluent_kafka.admin import AdminClient, NewTopic
 from hist_market_data.hist_api import HistApi
-from hist_market_data.ws.ws_api import WsApi
-from hist_market_data.hist_bar_const import (
-    OHLCV_TIMESTAMP,
-    OHLCV_OPEN,
-    OHLCV_HIGH,
-    OHLCV_LOW,
-    OHLCV_CLOSE,
-    OHLCV_VOLUME,
+from hist_market_data.bar_cache import BarCache
+from hist_market_data.bar_codec import encode_block
+from hist_market_data.REST_api.http_transport import aclose_shared_transport, request_priority
+from hist_market_data.bar_encoding import (
+    ENCODING_JSON,
+    ENCODING_STRUCT,
+    ENCODING_BATCH,
+    ENCODING_COMPRESSED,
+    encode_json_records,
+    encode_struct_records,
+    encode_batch,
+    encode_bar,
+)
+from hist_market_data.kafka_publisher import (
+    DeliveryStats,
+    KafkaPublisher,
+    PublishQueue,
+    POLICY_BLOCK,
+    DEFAULT_QUEUE_SIZE,
+    produce_with_retry,
 )
+from hist_market_data.ws.ws_api import WsApi
+from hist_market_data.registry import WS_ADAPTERS
+from hist_market_data.ws.bar_builder import LiveBarBuilder, EMIT_THROTTLED, DEFAULT_THROTTLE
+from hist_market_data.metrics import REGISTRY, PROFILER, PrometheusExporter
+from hist_market_data.timeframes import TimeframeRollup, derive_timeframes, plan_timeframes
+from hist_market_data.resample import interval_to_ms
+from hist_market_data.indicators import IndicatorEngine
+from hist_market_data.ohclv_data import OhclvData
+from hist_market_data.checkpoint import CheckpointStore
+from hist_market_data.shared_bars import SharedBarWriter
+from hist_market_data import hist_bar_const as hbc
+
+DEFAULT_PUBLISH_BATCH_SIZE = 1000
+DEFAULT_SHARED_MEMORY_CAPACITY = 1 << 20  # bars per shared-memory segment
+MAX_WARM_UP_PAGES = 8  # history requests to find the bars indicators need before a checkpoint
 
 class DataService:
-    def __init__(self, exchange, api_key, api_secret, kafka_config=None):
+    def __init__(self, exchange, api_key, api_secret, kafka_config=None, cache_dir=None,
+                 encoding=ENCODING_JSON, batch_size=DEFAULT_PUBLISH_BATCH_SIZE,
+                 live_queue_size=DEFAULT_QUEUE_SIZE, backpressure=POLICY_BLOCK,
+                 live_emit=EMIT_THROTTLED, live_throttle=DEFAULT_THROTTLE, metrics_port=None,
+                 warm_up=False, checkpoint_path=None, idempotent=False, shared_memory_prefix=None,
+                 shared_memory_capacity=DEFAULT_SHARED_MEMORY_CAPACITY, producer=None, admin_client=None,
+                 hist_api=None, memory_cache=None):
+        if encoding not in (ENCODING_JSON, ENCODING_STRUCT, ENCODING_BATCH, ENCODING_COMPRESSED):
+            raise ValueError(f'Encoding {encoding} is not supported.')
         self.exchange = exchange
+        self.encoding = encoding
+        self.batch_size = batch_size
         self.api_key = api_key
         self.api_secret = api_secret
-        self.hist_api = HistApi(exchange)
-        self.ws_api_manager = WsApi()
+        # Persist fetched history so restarts only download missing ranges
+        if hist_api is None:
+            hist_api = HistApi(exchange, cache=BarCache(cache_dir) if cache_dir else None, memory_cache=memory_cache)
+        self.hist_api = hist_api
+        # WebSocket adapters are built on the first subscription unless warmed up here
+        self.ws_api_manager = WsApi(warm_up=[exchange] if warm_up and exchange in WS_ADAPTERS else ())
 
         # Initialize Kafka Producer
         self.kafka_config = {
@@ -28,17 +71,78 @@ class DataService:
             'ssl.ca.location': '/Users/jinshidiannao/Documents/asset_management/kafka_utils/certs/ca-cert.pem',  # Path to CA certificate
             'ssl.certificate.location': '/Users/jinshidiannao/Documents/asset_management/kafka_utils/certs/client-cert.pem', # Path to client certificate
             'ssl.key.location': '/Users/jinshidiannao/Documents/asset_management/kafka_utils/certs/client-key.pem',   # Path to client key
+            # Broker-side deduplication of producer retries
+            ** ({'enable.idempotence': True} if idempotent else {}),
             ** (kafka_config if kafka_config else {})
         }
-        self.producer = Producer(self.kafka_config)
-        self.admin_client = AdminClient(self.kafka_config)
+        # Compacted topics keep one message per bar key, so republished bars replace the old ones
+        self.topic_config = {'cleanup.policy': 'compact'} if idempotent else None
+        # A producer and admin client can be passed in, e.g. local stand-ins for load tests
+        self.producer = producer if producer is not None else Producer(self.kafka_config)
+        self.admin_client = admin_client if admin_client is not None else AdminClient(self.kafka_config)
+
+        # Live bars are handed from the WebSocket threads to a dedicated publisher
+        self.publish_queue = PublishQueue(live_queue_size, backpressure)
+        # Last acknowledged bar per (topic, symbol, interval), so restarts resume after it
+        self.checkpoints = CheckpointStore(checkpoint_path) if checkpoint_path else None
+        self._checkpoint_keys = {}
+        self.publisher = KafkaPublisher(self.producer, self.publish_queue, self._encode_live_bar,
+                                        delivery_callback=self._checkpoint_delivery if self.checkpoints else None)
+        self.publisher.start()
+
+        # Repeated updates of a forming bar are coalesced before they reach the queue
+        self.bar_builder = LiveBarBuilder(live_emit, live_throttle)
+        self._live_topics = {}
+        self._live_callbacks = {}
+        # Streamed (symbol, base interval) -> TimeframeRollup for multi-timeframe subscriptions
+        self._rollups = {}
+        # (symbol, interval) -> IndicatorEngine whose values are published with each bar
+        self._indicators = {}
+        # Per symbol: serializes building, indicator updates and enqueuing of its live bars,
+        # which happen on the push thread and the event loop, so they stay in order
+        self._live_locks = {}
+        # (symbol, interval) -> SharedBarWriter mirroring the published bars for local readers
+        self.shared_memory_prefix = shared_memory_prefix
+        self.shared_memory_capacity = shared_memory_capacity
+        self._shared_bars = {}
+        self._poll_task = None
+        self._loop = None
+
+        # Live updates that arrive while a subscription's gap is being repaired, by (symbol, interval)
+        self._repairing = {}
+        self._repair_lock = threading.Lock()
+        self._listening = False
+        self._disconnected = False
+
+        # Gauge name -> (gauge, function), removed again on close so closed services are not kept alive
+        self._gauges = {}
+        self._register_gauge('publish_queue_depth', 'Live bars waiting for the publisher.', lambda: len(self.publish_queue))
+        self._register_gauge('publish_queue_dropped', 'Live bars dropped by the backpressure policy.', lambda: self.publish_queue.dropped)
+        self._register_gauge('kafka_producer_queue_depth', 'Messages waiting in the producer for delivery.', lambda: len(self.producer))
+        self.metrics_exporter = None
+        if metrics_port is not None:
+            # Serves /metrics and the runtime-switchable /profile endpoint
+            self.metrics_exporter = PrometheusExporter(REGISTRY, metrics_port, profiler=PROFILER)
+            self.metrics_exporter.start()
+            print(f"Serving metrics on http://{self.metrics_exporter.host}:{self.metrics_exporter.port}/metrics")
+
+    def _register_gauge(self, name, help, function):
+        self._gauges[name] = (REGISTRY.gauge(name, help, function=function), function)
+
+    def _unregister_gauges(self):
+        for name, (gauge, function) in self._gauges.items():
+            # A service created later reports through the same gauge; leave it to that one
+            if gauge.function is function:
+                REGISTRY.remove(name)
+        self._gauges = {}
 
     def _create_topic_if_not_exists(self, topic_name, num_partitions=1, replication_factor=1):
         """ Creates a Kafka topic if it does not already exist. """
         topic_metadata = self.admin_client.list_topics(timeout=5).topics
         if topic_name not in topic_metadata:
             print(f"Topic '{topic_name}' does not exist. Creating it...")
-            new_topic = NewTopic(topic_name, num_partitions=num_partitions, replication_factor=replication_factor)
+            new_topic = NewTopic(topic_name, num_partitions=num_partitions, replication_factor=replication_factor,
+                                 config=self.topic_config or {})
             futures = self.admin_client.create_topics([new_topic])
 
             for topic, future in futures.items():
@@ -50,58 +154,466 @@ class DataService:
         else:
             print(f"Topic '{topic_name}' already exists.")
 
-    def _delivery_report(self, err, msg):
-        """ Called once for each message produced to indicate delivery result. """
-        if err is not None:
-            print(f'Message delivery failed: {err}')
-        else:
-            print(f'Message delivered to {msg.topic()} [{msg.partition()}]')
+    def publish_bars(self, topic, ohlcv, encoding=None, batch_size=None, indicators=None):
+        """
+        Publishes bars to Kafka in bulk.
+
+        Bars are encoded a column slice at a time, handed to the producer in batches of
+        `batch_size` and counted by a single aggregated delivery callback instead of one
+        report per message.
+
+        Args:
+            topic (str): The Kafka topic.
+            ohlcv (OhclvData): The bars to publish.
+            encoding (str): ENCODING_JSON, ENCODING_STRUCT (one fixed-size record per bar),
+                ENCODING_BATCH (one columnar message per batch) or ENCODING_COMPRESSED (one
+                bar_codec block per batch). Defaults to the service encoding.
+            batch_size (int): The number of bars encoded and produced per batch.
+            indicators (dict): Arrays aligned with the bars, e.g. from IndicatorEngine.compute,
+                added to every bar. Only supported with ENCODING_JSON.
+
+        Returns:
+            DeliveryStats: The delivery accounting, updated as the producer is polled.
+        """
+        encoding = encoding or self.encoding
+        batch_size = batch_size or self.batch_size
+        if indicators and encoding != ENCODING_JSON:
+            raise ValueError(f'Indicators cannot be published with {encoding} encoding.')
+        headers = [('encoding', encoding.encode('utf-8'))]
+        stats = DeliveryStats()
+        bytes_out = REGISTRY.counter('kafka_bytes_out_total', 'Message bytes handed to the Kafka producer.', topic=topic)
+        batch_seconds = REGISTRY.histogram('publish_batch_seconds', 'Time to encode and produce one batch of historical bars.', encoding=encoding)
+
+        checkpointing = self.checkpoints is not None and topic in self._checkpoint_keys
+
+        for start in range(0, len(ohlcv), batch_size):
+            batch_started = time.perf_counter()
+            stop = min(start + batch_size, len(ohlcv))
+            callback = stats.on_delivery
+            if checkpointing:
+                # A batch message is keyed by its first bar but acknowledges all of them
+                last_timestamp = int(ohlcv.timestamps[stop - 1]) if encoding in (ENCODING_BATCH, ENCODING_COMPRESSED) else None
+                callback = self._checkpoint_callback(stats.on_delivery, last_timestamp)
+            if encoding == ENCODING_BATCH:
+                keys = [str(ohlcv.timestamps[start]).encode('utf-8')]
+                values = [encode_batch(ohlcv, start, stop)]
+            elif encoding == ENCODING_COMPRESSED:
+                keys = [str(ohlcv.timestamps[start]).encode('utf-8')]
+                values = [encode_block(ohlcv, start, stop)]
+            elif encoding == ENCODING_STRUCT:
+                keys, values = encode_struct_records(ohlcv, start, stop)
+            else:
+                keys, values = encode_json_records(ohlcv, start, stop, indicators)
 
-    def _produce_to_kafka(self, topic, data):
+            with PROFILER.sample():
+                for key, value in zip(keys, values):
+                    produce_with_retry(self.producer, topic, key, value, headers, callback)
+            stats.produced += len(values)
+            bytes_out.inc(sum(map(len, values)))
+            self.producer.poll(0)
+            batch_seconds.record(time.perf_counter() - batch_started)
+        return stats
+
+    def _checkpoint_callback(self, callback, last_timestamp=None):
+        def on_delivery(err, msg):
+            callback(err, msg)
+            self._checkpoint_delivery(err, msg, last_timestamp)
+        return on_delivery
+
+    def _checkpoint_delivery(self, err, msg, last_timestamp=None):
+        """ Advances the checkpoint of an acknowledged bar, or holds it below a failed one. """
+        key = self._checkpoint_keys.get(msg.topic())
+        if key is None:
+            return
+        # Runs inside producer.poll, where an exception would abort the remaining reports
         try:
-            self.producer.produce(topic, key=str(data.get(OHLCV_TIMESTAMP)).encode('utf-8'), value=json.dumps(data).encode('utf-8'), callback=self._delivery_report)
-            self.producer.poll(0) # Non-blocking poll
+            timestamp = int(msg.key())
+            if err is not None:
+                self.checkpoints.hold(msg.topic(), *key, timestamp)
+            else:
+                self.checkpoints.advance(msg.topic(), *key, last_timestamp or timestamp)
         except Exception as e:
-            print(f"Failed to produce message to Kafka: {e}")
+            print(f"Failed to checkpoint delivery on topic {msg.topic()}: {e!r}")
+
+    def _resume_time(self, topic, symbol, interval, start_time):
+        """
+        Registers a topic for checkpointing and returns where its history should start.
+
+        The checkpointed bar itself is fetched again, since it may have been published
+        while still forming; bars before it are skipped.
+        """
+        if self.checkpoints is None:
+            return start_time
+        self._checkpoint_keys[topic] = (symbol, interval)
+        checkpoint = self.checkpoints.get(topic, symbol, interval)
+        if checkpoint is None or (start_time is not None and start_time >= checkpoint):
+            return start_time
+        print(f"Resuming {symbol} ({interval}) on topic {topic} from checkpoint {checkpoint}")
+        return checkpoint
+
+    async def _warm_up_history(self, symbol, interval, engine, resume_time):
+        """
+        Fetches the bars before `resume_time` that the indicators of `engine` depend on.
+
+        Bars are counted rather than assumed from the interval, so windows that span
+        market closures page further back, up to MAX_WARM_UP_PAGES requests.
+
+        Returns:
+            OhclvData: The warm-up bars in ascending timestamp order.
+        """
+        needed = engine.warm_up_bars - 1
+        start_time = engine.warm_up_start(resume_time)
+        end_time = resume_time - 1
+        start = min(start_time, resume_time - max(needed, 1) * interval_to_ms(interval))
+        end = end_time
+        pages = []
+        for _ in range(MAX_WARM_UP_PAGES):
+            pages.append(await self.hist_api.aget_hist_bars(symbol, interval, start, end))
+            if sum(map(len, pages)) >= needed:
+                break
+            # Every further page reaches three times as far back as the bars so far
+            start, end = start - 2 * (end_time - start + 1), start - 1
+        warm_up = OhclvData.merge(*pages)
+        first = min(max(len(warm_up) - needed, 0), int(np.searchsorted(warm_up.timestamps, start_time)))
+        return warm_up.slice(first)
+
+    def _encode_live_bar(self, data):
+        key, value = encode_bar(data, self.encoding)
+        return key, value, [('encoding', self.encoding.encode('utf-8'))]
 
-    async def subscribe_ohlcv(self, symbol, interval, topic):
+    async def subscribe_ohlcv(self, symbol, interval, topic, start_time=None, end_time=None, indicators=None):
+        """
+        Publishes the history of a symbol and then streams its live bars to `topic`.
+
+        With a checkpoint_path, history resumes at the last bar the broker acknowledged
+        for (topic, symbol, interval) in a previous run instead of at `start_time`.
+
+        Args:
+            symbol (str): The symbol to subscribe to.
+            interval (str): A hist_bar_const interval.
+            topic (str): The Kafka topic.
+            start_time (int): Inclusive history start in epoch milliseconds.
+            end_time (int): Inclusive history end in epoch milliseconds.
+            indicators (dict): Indicator per name, e.g. {'sma_20': SMA(20), 'atr_14': ATR(14)}.
+                Their values are computed over the history in one vectorized pass, updated
+                per live bar and published as extra fields of every bar. Requires JSON encoding.
+                When resuming from a checkpoint, the earlier bars they depend on are fetched
+                as well but not published again.
+        """
+        if indicators and self.encoding != ENCODING_JSON:
+            raise ValueError(f'Indicators cannot be published with {self.encoding} encoding.')
         print(f"Subscribing to OHLCV for {symbol} ({interval}) on {self.exchange}")
 
-        # Ensure topic exists
-        self._create_topic_if_not_exists(topic))
+        # Ensure topic exists; the admin call blocks, so keep it off the event loop
+        await asyncio.to_thread(self._create_topic_if_not_exists, topic)
 
-        # 1. Fetch historical data
+        # 1. Fetch historical data, after the last bar a previous run got acknowledged
+        resume_time = self._resume_time(topic, symbol, interval, start_time)
+        engine = IndicatorEngine(indicators) if indicators else None
         print(f"Fetching historical OHLCV data for {symbol} ({interval})...")
-        hist_data = self.hist_api.get_hist_bars(symbol, interval)
-        if hist_data.data:
-            for i in range(len(hist_data.data[OHLCV_TIMESTAMP])):
-                ohlcv_entry = {
-                    OHLCV_TIMESTAMP: hist_data.data[OHLCV_TIMESTAMP][i],
-                    OHLCV_OPEN: hist_data.data[OHLCV_OPEN][i],
-                    OHLCV_HIGH: hist_data.data[OHLCV_HIGH][i],
-                    OHLCV_LOW: hist_data.data[OHLCV_LOW][i],
-                    OHLCV_CLOSE: hist_data.data[OHLCV_CLOSE][i],
-                    OHLCV_VOLUME: hist_data.data[OHLCV_VOLUME][i],
-                }
-                self._produce_to_kafka(topic, ohlcv_entry)
-            print(f"Produced {len(hist_data.data[OHLCV_TIMESTAMP])} historical OHLCV entries to Kafka topic {topic}")
+        hist_data = await self.hist_api.aget_hist_bars(symbol, interval, resume_time, end_time)
+        if engine is not None and resume_time is not None and resume_time != start_time:
+            # Indicators are computed over enough bars before the checkpoint to match the
+            # values the previous run published; only bars from the checkpoint on are sent
+            warm_up = await self._warm_up_history(symbol, interval, engine, resume_time)
+            values = engine.compute(OhclvData.merge(warm_up, hist_data))
+            values = {name: column[len(warm_up):] for name, column in values.items()}
+        else:
+            # Computed even without history, to leave the engine ready for live bars
+            values = engine.compute(hist_data) if engine is not None else None
+        start_time = resume_time
+        if len(hist_data):
+            stats = await asyncio.to_thread(self.publish_bars, topic, hist_data, indicators=values)
+            print(f"Produced {stats.produced} historical OHLCV entries to Kafka topic {topic} ({stats.delivered} delivered, {stats.failed} failed so far)")
         else:
             print(f"No historical data found for {symbol} ({interval})")
+        resume_from = int(hist_data.timestamps[-1]) if len(hist_data) else start_time
+        if len(hist_data):
+            # Seed the builder with the published last bar, so the gap repair only
+            # republishes it if it was still forming and has changed since
+            self.bar_builder.backfill(symbol, interval, hist_data.slice(len(hist_data) - 1))
+
+        if self.shared_memory_prefix is not None:
+            self._share_bars(symbol, interval, hist_data)
 
         # 2. Subscribe to real-time updates
+        self._live_topics[(symbol, interval)] = topic
+        self.publisher.interval_ms[topic] = interval_to_ms(interval)
+        if engine is not None:
+            self._indicators[(symbol, interval)] = engine
+        else:
+            self._indicators.pop((symbol, interval), None)
+        await self._start_live(symbol, interval, resume_from)
+        print(f"Subscribed to real-time OHLCV for {symbol} ({interval})")
+
+    async def subscribe_timeframes(self, symbol, topics, start_time=None, end_time=None):
+        """
+        Publishes several timeframes of a symbol from a single base-interval feed.
+
+        History is fetched once at the finest requested interval and every coarser
+        timeframe is derived from it in one cascaded pass. Live base bars are rolled up
+        incrementally, and each timeframe is published to its own topic.
+
+        Args:
+            symbol (str): The symbol to subscribe to.
+            topics (dict): Kafka topic per hist_bar_const interval, e.g.
+                {'1m': 'AAPL.1m', '1h': 'AAPL.1h', '1d': 'AAPL.1d'}.
+            start_time (int): Inclusive history start in epoch milliseconds.
+            end_time (int): Inclusive history end in epoch milliseconds.
+        """
+        intervals = list(topics)
+        base_interval, _ = plan_timeframes(intervals)
+        print(f"Subscribing to OHLCV for {symbol} ({', '.join(intervals)}) on {self.exchange}")
+        await asyncio.gather(*(asyncio.to_thread(self._create_topic_if_not_exists, topic) for topic in topics.values()))
+
+        # Resume from the oldest checkpoint, aligned so its coarsest bar is rebuilt in full
+        resume_times = {interval: self._resume_time(topic, symbol, interval, start_time) for interval, topic in topics.items()}
+        if self.checkpoints is not None and None not in resume_times.values():
+            coarsest_ms = max(interval_to_ms(interval) for interval in intervals)
+            start_time = min(resume_times.values()) // coarsest_ms * coarsest_ms
+
+        print(f"Fetching historical OHLCV data for {symbol} ({base_interval})...")
+        hist_data = await self.hist_api.aget_hist_bars(symbol, base_interval, start_time, end_time)
+        for interval, ohlcv in derive_timeframes(hist_data, intervals, base_interval).items():
+            if resume_times[interval] is not None:
+                ohlcv = ohlcv.between(start_time=resume_times[interval])
+            if len(ohlcv):
+                stats = await asyncio.to_thread(self.publish_bars, topics[interval], ohlcv)
+                print(f"Produced {stats.produced} historical OHLCV entries to Kafka topic {topics[interval]}")
+        resume_from = int(hist_data.timestamps[-1]) if len(hist_data) else start_time
+
+        rollup = TimeframeRollup(base_interval, intervals)
+        rollup.seed(hist_data)
+        for interval, topic in topics.items():
+            self._live_topics[(symbol, interval)] = topic
+            self.publisher.interval_ms[topic] = interval_to_ms(interval)
+        self._rollups[(symbol, base_interval)] = rollup
+        await self._start_live(symbol, base_interval, resume_from)
+        print(f"Subscribed to real-time OHLCV for {symbol} ({', '.join(intervals)})")
+
+    async def _start_live(self, symbol, interval, resume_from):
+        """ Streams live bars of (symbol, interval) after repairing the gap since `resume_from`. """
+        callback_lag = REGISTRY.histogram('ws_callback_lag_seconds', 'Time from the bar close to the WebSocket callback, for updates received after the bar closed.', symbol=symbol)
+        interval_ms = interval_to_ms(interval)
+        updates = REGISTRY.counter('ws_updates_total', 'Kline updates received over the WebSocket.', symbol=symbol)
+
         def ws_ohlcv_callback(data):
-            print(f"Received real-time OHLCV data for {symbol}: {data}")
-            self._produce_to_kafka(topic, data)
+            # Runs on the push thread: only enqueue, the publisher thread produces
+            if self._live_callbacks.get((symbol, interval)) is not ws_ohlcv_callback:
+                return  # Unsubscribed or replaced by a newer subscription
+            # Updates of a forming bar arrive before its close, so only later ones measure feed lag
+            lag = time.time() - (data[hbc.OHLCV_TIMESTAMP] + interval_ms) / 1000
+            if lag >= 0:
+                callback_lag.record(lag)
+            updates.inc()
+            with self._repair_lock:
+                pending = self._repairing.get((symbol, interval))
+                if pending is not None:
+                    pending.append(data)
+                    return
+            self._route_live(symbol, interval, data)
+
+        self._loop = asyncio.get_running_loop()
+        if not self._listening:
+            self.ws_api_manager.add_connection_listener(self.exchange, self._on_ws_connected, self._on_ws_disconnected)
+            self._listening = True
+        self._live_callbacks[(symbol, interval)] = ws_ohlcv_callback
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll_live_bars())
 
+        # Hold live updates until the bars between the history and the stream are filled in
+        self._begin_repair(symbol, interval)
         self.ws_api_manager.subscribe_ohlcv(self.exchange, symbol, interval, ws_ohlcv_callback)
-        print(f"Subscribed to real-time OHLCV for {symbol} ({interval})")
+        await self._repair_gap(symbol, interval, resume_from)
+
+    def _live_lock(self, symbol):
+        lock = self._live_locks.get(symbol)
+        if lock is None:
+            lock = self._live_locks.setdefault(symbol, threading.RLock())
+        return lock
+
+    def _route_live(self, symbol, interval, data):
+        """ Passes a live update through the rollup, if any, and the bar builder to the queue. """
+        with self._live_lock(symbol):
+            rollup = self._rollups.get((symbol, interval))
+            for bar_interval, data in (rollup.update(data) if rollup is not None else [(interval, data)]):
+                topic = self._live_topics.get((symbol, bar_interval))
+                if topic is None:
+                    continue
+                for bar in self.bar_builder.on_bar(symbol, bar_interval, data):
+                    self._publish_live_bar(symbol, bar_interval, topic, bar)
+
+    def _publish_live_bar(self, symbol, interval, topic, bar):
+        engine = self._indicators.get((symbol, interval))
+        if engine is not None:
+            bar = {**bar, **engine.update(bar)}
+        writer = self._shared_bars.get((symbol, interval))
+        if writer is not None:
+            writer.on_bar(bar)
+        self.publish_queue.put(topic, bar)
+
+    def shared_memory_name(self, symbol, interval):
+        """
+        Returns:
+            str: The shared-memory segment local processes attach to with
+                SharedBarReader to read the bars of a subscription.
+        """
+        safe_symbol = symbol.replace('/', '_')
+        return f'{self.shared_memory_prefix}.{self.exchange}.{safe_symbol}.{interval}'
+
+    def _share_bars(self, symbol, interval, ohlcv):
+        """ Mirrors the bars of a subscription into its shared-memory segment. """
+        writer = self._shared_bars.get((symbol, interval))
+        if writer is None:
+            name = self.shared_memory_name(symbol, interval)
+            writer = self._shared_bars[(symbol, interval)] = SharedBarWriter(name, self.shared_memory_capacity)
+            print(f"Sharing {symbol} ({interval}) bars in shared memory segment {name}")
+        writer.write(ohlcv)
+
+    def _close_shared_bars(self):
+        for writer in self._shared_bars.values():
+            writer.close()
+            writer.unlink()
+        self._shared_bars.clear()
+
+    def _on_ws_disconnected(self, exchange):
+        print(f"WebSocket connection to {exchange} lost")
+        self._disconnected = True
+
+    def _on_ws_connected(self, exchange):
+        if not self._disconnected:
+            return
+        self._disconnected = False
+        print(f"WebSocket connection to {exchange} restored, repairing gaps")
+        for symbol, interval in list(self._live_callbacks):
+            # Mark before the resubscribed stream delivers anything, then repair on the loop
+            self._begin_repair(symbol, interval)
+            asyncio.run_coroutine_threadsafe(self._repair_gap(symbol, interval), self._loop)
+
+    def _begin_repair(self, symbol, interval):
+        with self._repair_lock:
+            self._repairing.setdefault((symbol, interval), [])
+
+    async def _repair_gap(self, symbol, interval, resume_from=None):
+        """
+        Publishes the bars missed while a subscription was not streaming, then resumes it.
+
+        Closed bars from the newest known bar (or `resume_from`) up to now are fetched
+        with live priority and merged into the bar builder, which drops the ones already
+        published. The live updates held back meanwhile are replayed after them, so the
+        topic stays in timestamp order without duplicates.
+        """
+        key = (symbol, interval)
+        topic = self._live_topics.get(key)
+        rollup = self._rollups.get(key)
+        try:
+            if rollup is not None:
+                start_time = rollup.last_timestamp
+            else:
+                start_time = self.bar_builder.last_timestamp(symbol, interval)
+            if start_time is None:
+                start_time = resume_from
+            interval_ms = interval_to_ms(interval)
+            if start_time is not None and topic is not None:
+                end_time = int(time.time() * 1000) - interval_ms  # start of the newest closed bar
+                if end_time >= start_time:
+                    with request_priority(hbc.PRIORITY_LIVE):
+                        missed = await self.hist_api.aget_hist_bars(symbol, interval, start_time, end_time)
+                    with self._live_lock(symbol):
+                        if rollup is not None:
+                            # Derived timeframes are rebuilt by rolling the missed base bars up
+                            missed = missed.between(start_time=rollup.last_timestamp)
+                            for row in range(len(missed)):
+                                self._route_live(symbol, interval, missed[row])
+                            repaired = len(missed)
+                        else:
+                            bars = self.bar_builder.backfill(symbol, interval, missed)
+                            for bar in bars:
+                                self._publish_live_bar(symbol, interval, topic, bar)
+                            repaired = len(bars)
+                    if repaired:
+                        print(f"Repaired {repaired} OHLCV bars for {symbol} ({interval})")
+        except Exception as e:
+            print(f"Gap repair for {symbol} ({interval}) failed: {e}")
+        finally:
+            # Replay held updates in batches taken under the lock but published outside it, so
+            # the push thread is never blocked on the queue; newer updates keep queuing up
+            # behind them until a batch comes back empty
+            while True:
+                with self._repair_lock:
+                    pending = self._repairing.get(key)
+                    if not pending:
+                        self._repairing.pop(key, None)
+                        break
+                    self._repairing[key] = []
+                if self._live_topics.get(key) is not None:
+                    for data in pending:
+                        self._route_live(symbol, interval, data)
+
+    async def _poll_live_bars(self):
+        """ Publishes bars that ended without a newer update and due throttled updates. """
+        while True:
+            await asyncio.sleep(min(self.bar_builder.throttle, 1.0))
+            self._publish_due_bars()
+
+    def _publish_due_bars(self, now_ms=None):
+        keys_by_symbol = {}
+        for key in list(self._live_topics):
+            keys_by_symbol.setdefault(key[0], []).append(key)
+        for symbol, keys in keys_by_symbol.items():
+            # Polled under the symbol's lock, so a newer push update cannot overtake the closed bar
+            with self._live_lock(symbol):
+                for _, interval, bar in self.bar_builder.poll(now_ms, keys):
+                    topic = self._live_topics.get((symbol, interval))
+                    if topic is not None:
+                        self._publish_live_bar(symbol, interval, topic, bar)
+
+    def unsubscribe_ohlcv(self, symbol, interval):
+        """
+        Stops publishing live bars for a subscription.
+
+        The exchange stream stays open, since the WebSocket APIs cannot unsubscribe, but
+        its updates are ignored; subscribing again replaces the old callback.
+        """
+        self._live_callbacks.pop((symbol, interval), None)
+        self._indicators.pop((symbol, interval), None)
+        rollup = self._rollups.pop((symbol, interval), None)
+        for derived_interval in (rollup.intervals if rollup is not None else ()):
+            self._live_topics.pop((symbol, derived_interval), None)
+        if self._live_topics.pop((symbol, interval), None) is not None:
+            print(f"Unsubscribed from real-time OHLCV for {symbol} ({interval})")
 
     # Add methods for other data types (trades, depth) as needed
 
     def close(self):
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+        self._unregister_gauges()
+        self.publisher.stop()
         print("Flushing remaining Kafka messages...")
         self.producer.flush(30) # Flush messages with a 30-second timeout
         print("Kafka producer closed.")
+        if self.checkpoints is not None:
+            self.checkpoints.flush()
+        self._close_shared_bars()
+        self.hist_api.close()
+
+    async def aclose(self):
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self.metrics_exporter is not None:
+            await asyncio.to_thread(self.metrics_exporter.stop)
+        self._unregister_gauges()
+        await asyncio.to_thread(self.publisher.stop)
+        print("Flushing remaining Kafka messages...")
+        await asyncio.to_thread(self.producer.flush, 30)
+        print("Kafka producer closed.")
+        if self.checkpoints is not None:
+            await asyncio.to_thread(self.checkpoints.flush)
+        self._close_shared_bars()
+        await self.hist_api.aclose()
+        await aclose_shared_transport()
 
 async def main():
     # Example Usage:
@@ -129,7 +641,7 @@ async def main():
     except KeyboardInterrupt:
         print("Exiting...")
     finally:
-        data_service.close()
+        await data_service.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
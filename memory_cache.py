@@ -0,0 +1,220 @@
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from .ohclv_data import OhclvData, COLUMNS
+from . import hist_bar_const as hbc
+
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+DEFAULT_TTL = 300.0  # seconds an entry is served after it was last written
+BAR_BYTES = 8 * len(COLUMNS)
+
+
+def merge_bars(cached, fetched, ranges):
+    """
+    Replaces the cached bars inside the fetched `ranges` with the fetched ones.
+
+    Args:
+        cached (OhclvData): Bars in ascending timestamp order.
+        fetched (OhclvData): Bars fetched for `ranges`. They also win over cached bars
+            with the same timestamp outside the ranges, e.g. a newer forming bar.
+        ranges (list): The inclusive (start, end) ranges `fetched` covers.
+
+    Returns:
+        OhclvData: The merged bars in ascending timestamp order without duplicates.
+    """
+    keep = np.ones(len(cached), dtype=bool)
+    for start_time, end_time in ranges:
+        keep &= (cached.timestamps < start_time) | (cached.timestamps > end_time)
+    return OhclvData.merge(cached.filter(keep), fetched)
+
+
+class SingleFlight:
+    """
+    Merges concurrent identical calls into one.
+
+    The first caller of a key runs the call; callers that arrive while it is in flight
+    wait for and share its result or exception. Nothing is remembered once it finishes.
+    Blocking (`do`) and awaitable (`ado`) calls are coalesced separately, the latter
+    per event loop.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.coalesced = 0
+
+    def do(self, key, function, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key, function, *args):
+        """ Awaitable version of `do` for coroutine functions. """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = self._tasks[task_key] = loop.create_task(function(*args))
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        else:
+            self.coalesced += 1
+        # A cancelled caller must not cancel the fetch the others are waiting for
+        return await asyncio.shield(task)
+
+
+class _Entry:
+    __slots__ = ('ohlcv', 'start', 'end', 'expires_at')
+
+    def __init__(self, ohlcv, start, end, expires_at):
+        self.ohlcv = ohlcv
+        self.start = start
+        self.end = end
+        self.expires_at = expires_at
+
+
+class MemoryBarCache:
+    """
+    An in-memory LRU of recently fetched bars keyed by (exchange, symbol, interval).
+
+    Each entry holds one contiguous run of bars and the inclusive range it covers.
+    Requests that extend past it, typically recent-window requests whose start is
+    cached, only fetch the missing head or tail. Coverage stops at the last closed bar,
+    so the forming bar is always fetched again. Entries expire `ttl` seconds after they
+    were last written, and the least recently used are evicted once the cached bars
+    take more than `max_bytes`.
+
+    The methods mirror BarCache, so HistApi can layer this cache in front of it.
+    Returned bars are views shared with the cache and other callers; copy them before
+    modifying them in place.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def missing_ranges(self, exchange, symbol, interval, start_time, end_time):
+        """
+        Returns:
+            list: The inclusive (start, end) ranges of the request that are not cached,
+                at most a head and a tail.
+        """
+        with self._lock:
+            entry = self._get((exchange, symbol, interval))
+            if entry is None or end_time < entry.start - 1 or start_time > entry.end + 1:
+                self.misses += 1
+                return [(start_time, end_time)]
+            missing = []
+            if start_time < entry.start:
+                missing.append((start_time, entry.start - 1))
+            if end_time > entry.end:
+                missing.append((entry.end + 1, end_time))
+            if missing:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return missing
+
+    def lookup(self, exchange, symbol, interval, start_time, end_time):
+        """
+        Combines `missing_ranges` and `load` under one lock, so both see the same entry.
+
+        Returns:
+            tuple: (OhclvData of the cached bars in the request, list of missing ranges).
+        """
+        with self._lock:
+            missing = self.missing_ranges(exchange, symbol, interval, start_time, end_time)
+            return self.load(exchange, symbol, interval, start_time, end_time), missing
+
+    def load(self, exchange, symbol, interval, start_time=None, end_time=None):
+        """
+        Returns:
+            OhclvData: The cached bars with start_time <= timestamp <= end_time.
+        """
+        with self._lock:
+            entry = self._get((exchange, symbol, interval))
+            if entry is None:
+                return OhclvData({})
+            return entry.ohlcv.between(start_time, end_time)
+
+    def store(self, exchange, symbol, interval, ohlcv, ranges):
+        """
+        Adds freshly fetched bars covering `ranges`.
+
+        Ranges adjacent to the cached run extend it; otherwise the entry is replaced.
+        """
+        if not ranges:
+            return
+        key = (exchange, symbol, interval)
+        start = min(range_start for range_start, _ in ranges)
+        end = min(max(range_end for _, range_end in ranges), self._last_closed_end(interval))
+        with self._lock:
+            entry = self._get(key)
+            if entry is not None and start <= entry.end + 1 and end >= entry.start - 1:
+                ohlcv = merge_bars(entry.ohlcv, ohlcv, ranges)
+                start, end = min(start, entry.start), max(end, entry.end)
+            elif start > end:
+                return  # Nothing closed was fetched; keep the entry as it is
+            if entry is not None:
+                self._remove(key)
+            if len(ohlcv) * BAR_BYTES > self.max_bytes:
+                return
+            self._entries[key] = _Entry(ohlcv, start, end, self.clock() + self.ttl)
+            self.bytes += len(ohlcv) * BAR_BYTES
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.clock() >= entry.expires_at:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= len(entry.ohlcv) * BAR_BYTES
+
+    @staticmethod
+    def _last_closed_end(interval):
+        interval_ms = hbc.INTERVAL_MS[interval]
+        now = int(time.time() * 1000)
+        return now // interval_ms * interval_ms - 1
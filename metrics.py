@@ -0,0 +1,389 @@
+import cProfile
+import contextlib
+import io
+import math
+import pstats
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_SIGNIFICANT_BITS = 5  # ~3% relative bucket width
+DEFAULT_MAX_SECONDS = 3600.0
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+DEFAULT_METRICS_PORT = 9464
+
+
+class Counter:
+    """ A monotonically increasing value. """
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """ A value that is set directly or read from `function` at export time. """
+    kind = 'gauge'
+
+    def __init__(self, function=None):
+        self.function = function
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self.function() if self.function is not None else self._value
+
+
+class Histogram:
+    """
+    A log-linear latency histogram in the style of HdrHistogram.
+
+    Values are recorded in microseconds into buckets whose width is a fixed fraction of
+    their magnitude (`significant_bits` bits of precision), so recording is O(1), the
+    memory is fixed and quantiles keep the same relative error from microseconds to
+    `max_seconds`.
+    """
+    kind = 'summary'
+
+    def __init__(self, significant_bits=DEFAULT_SIGNIFICANT_BITS, max_seconds=DEFAULT_MAX_SECONDS):
+        self.significant_bits = significant_bits
+        self.max_value = int(max_seconds * 1e6)
+        self._sub_buckets = 1 << significant_bits
+        self._half = self._sub_buckets >> 1
+        self._counts = [0] * (self._index(self.max_value) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """ Records a duration; negative values, e.g. from clock skew, count as zero. """
+        value = min(max(int(seconds * 1e6), 0), self.max_value)
+        index = self._index(value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += max(seconds, 0.0)
+
+    @contextlib.contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - started)
+
+    def quantile(self, q):
+        """
+        Returns:
+            float: The upper bound in seconds of the bucket holding the `q` quantile, or NaN if empty.
+        """
+        with self._lock:
+            if self.count == 0:
+                return math.nan
+            rank = max(math.ceil(q * self.count), 1)
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    return self._upper_bound(index) / 1e6
+        return self.max_value / 1e6
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self.count = 0
+            self.sum = 0.0
+
+    def _index(self, value):
+        if value < self._sub_buckets:
+            return value
+        shift = value.bit_length() - self.significant_bits
+        return self._sub_buckets + (shift - 1) * self._half + (value >> shift) - self._half
+
+    def _upper_bound(self, index):
+        if index < self._sub_buckets:
+            return index
+        shift, offset = divmod(index - self._sub_buckets, self._half)
+        shift += 1
+        return ((offset + self._half + 1) << shift) - 1
+
+
+class MetricsRegistry:
+    """
+    Holds named metrics, each optionally split by labels.
+
+    Looking up a metric takes the registry lock, so hot paths should look their metrics
+    up once and keep the returned object.
+
+    Example:
+        ack_latency = REGISTRY.histogram('kafka_ack_seconds', 'Produce to broker ack.', topic=topic)
+        ack_latency.record(msg.latency())
+    """
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help='', **labels) -> Counter:
+        return self._get(name, help, Counter, labels)
+
+    def gauge(self, name, help='', function=None, **labels) -> Gauge:
+        gauge = self._get(name, help, Gauge, labels)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help='', **labels) -> Histogram:
+        return self._get(name, help, Histogram, labels)
+
+    def remove(self, name, **labels):
+        """ Removes the metric with these labels, and its family once no metric is left. """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                return
+            family[2].pop(key, None)
+            if not family[2]:
+                del self._families[name]
+
+    def collect(self):
+        """
+        Returns:
+            list: (name, help, kind, [(labels, metric), ...]) for every registered family.
+        """
+        with self._lock:
+            return [(name, help, kind, list(children.items()))
+                    for name, (help, kind, children) in sorted(self._families.items())]
+
+    def snapshot(self):
+        """
+        Returns a picklable copy of every metric's current value, e.g. to ship from a
+        worker process to a supervisor.
+
+        Returns:
+            list: (name, help, kind, labels, value) tuples. Histogram values are
+                (bucket counts, count, sum).
+        """
+        entries = []
+        for name, help, kind, children in self.collect():
+            for labels, metric in children:
+                if kind == 'summary':
+                    with metric._lock:
+                        value = (list(metric._counts), metric.count, metric.sum)
+                else:
+                    value = metric.value
+                entries.append((name, help, kind, labels, value))
+        return entries
+
+    def load_snapshot(self, snapshot, **labels):
+        """
+        Replaces metric values with those of a snapshot, adding `labels` to each metric.
+        """
+        factories = {Counter.kind: Counter, Gauge.kind: Gauge, Histogram.kind: Histogram}
+        for name, help, kind, metric_labels, value in snapshot:
+            metric = self._get(name, help, factories[kind], dict(metric_labels, **labels))
+            if kind == 'summary':
+                counts, count, total = value
+                with metric._lock:
+                    metric._counts[:len(counts)] = counts
+                    metric.count = count
+                    metric.sum = total
+            elif kind == 'gauge':
+                metric.set(value)
+            else:
+                metric.value = value
+
+    def _get(self, name, help, factory, labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = [help, factory.kind, {}]
+            elif family[1] != factory.kind:
+                raise ValueError(f'Metric {name} is already registered as a {family[1]}.')
+            elif help and not family[0]:
+                family[0] = help
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+
+def render_prometheus(registry, quantiles=DEFAULT_QUANTILES):
+    """
+    Renders the registry in the Prometheus text exposition format.
+
+    Histograms are exported as summaries with the given quantiles.
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    for name, help, kind, children in registry.collect():
+        if help:
+            lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, metric in children:
+            if kind == 'summary':
+                for q in quantiles:
+                    lines.append(f'{name}{_labels(labels + (("quantile", q),))} {_number(metric.quantile(q))}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(metric.sum)}')
+                lines.append(f'{name}_count{_labels(labels)} {metric.count}')
+            else:
+                lines.append(f'{name}{_labels(labels)} {_number(metric.value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and math.isnan(value):
+        return 'NaN'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class SamplingProfiler:
+    """
+    Profiles a random sample of code sections with cProfile.
+
+    Sampling is off until `sample_rate` is raised, which may happen at any time, e.g.
+    through the exporter's /profile endpoint. Samples accumulate until `report` resets them.
+    """
+    def __init__(self, sample_rate=0.0):
+        self.sample_rate = sample_rate
+        self._stats = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def sample(self):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate or getattr(self._local, 'active', False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running on this thread
+            yield
+            return
+        self._local.active = True
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._local.active = False
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+
+    def report(self, limit=30, reset=True):
+        """
+        Returns:
+            str: The sampled functions sorted by cumulative time.
+        """
+        with self._lock:
+            stats, self._stats = self._stats, (None if reset else self._stats)
+        if stats is None:
+            return 'No samples collected.\n'
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+
+class Exporter(ABC):
+    """ Base class for exporters that publish a MetricsRegistry. """
+    def __init__(self, registry):
+        self.registry = registry
+
+    @abstractmethod
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class PrometheusExporter(Exporter):
+    """
+    Serves the registry on a local HTTP endpoint from a background thread.
+
+    - GET /metrics returns the Prometheus text format.
+    - GET /profile returns the sampled profile; /profile?rate=0.01 changes the
+      sampling rate of `profiler` at runtime.
+    """
+    def __init__(self, registry, port=DEFAULT_METRICS_PORT, host='127.0.0.1', profiler=None):
+        super().__init__(registry)
+        self.host = host
+        self.port = port
+        self.profiler = profiler
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/metrics':
+                    self._reply(200, render_prometheus(exporter.registry), 'text/plain; version=0.0.4')
+                elif url.path == '/profile' and exporter.profiler is not None:
+                    rate = parse_qs(url.query).get('rate')
+                    if rate:
+                        try:
+                            exporter.profiler.sample_rate = float(rate[0])
+                        except ValueError:
+                            self._reply(400, f'Invalid rate {rate[0]}.\n')
+                            return
+                        self._reply(200, f'Sampling rate set to {exporter.profiler.sample_rate}.\n')
+                    else:
+                        self._reply(200, exporter.profiler.report())
+                else:
+                    self._reply(404, 'Not found.\n')
+
+            def _reply(self, status, body, content_type='text/plain'):
+                payload = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-exporter', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Process-wide registry and profiler used by the library's instrumentation
+REGISTRY = MetricsRegistry()
+PROFILER = SamplingProfiler()
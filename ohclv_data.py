@@ -1,29 +1,330 @@
 import numpy as np
 import pandas as pd
 from . import hist_bar_const as hbc
+from .resample import interval_to_ms, resample
+
+# Column order and dtypes of the underlying buffers
+COLUMNS = (
+    (hbc.OHLCV_TIMESTAMP, np.int64),
+    (hbc.OHLCV_OPEN, np.float64),
+    (hbc.OHLCV_HIGH, np.float64),
+    (hbc.OHLCV_LOW, np.float64),
+    (hbc.OHLCV_CLOSE, np.float64),
+    (hbc.OHLCV_VOLUME, np.float64),
+)
+MIN_CAPACITY = 16
+KEEP_LAST = 'last'
+KEEP_FIRST = 'first'
 
 class OhclvData:
     """
     A class to hold and process OHLCV data.
+
+    Columns live in buffers that may be larger than the data; `timestamps`, `open`,
+    etc. are views of the filled part. Appending grows the buffers by doubling, and
+    slicing returns views that share memory with this object.
+
+    Whether the timestamps are sorted without duplicates is checked once and cached, so
+    `to_df`, `refreq` and `merge` skip sorting sorted data. Appending keeps the flag up
+    to date; writing timestamps directly into the arrays does not.
     """
-    def __init__(self, parsed_data):
+    def __init__(self, parsed_data, capacity=None, copy=False):
+        """
+        Args:
+            parsed_data (dict): Columns keyed by the standardized field names, as lists or arrays.
+            capacity (int): Optional number of bars to preallocate room for.
+            copy (bool): Whether to always copy. By default contiguous arrays that already
+                have the int64/float64 dtypes are adopted as-is and only lists or arrays of
+                other dtypes are converted.
+        """
         if not isinstance(parsed_data, dict):
             raise TypeError("parsed_data must be a dictionary.")
 
-        self.timestamps = np.array(parsed_data.get(hbc.OHLCV_TIMESTAMP, []), dtype=np.int64)
-        self.open = np.array(parsed_data.get(hbc.OHLCV_OPEN, []), dtype=np.float64)
-        self.high = np.array(parsed_data.get(hbc.OHLCV_HIGH, []), dtype=np.float64)
-        self.low = np.array(parsed_data.get(hbc.OHLCV_LOW, []), dtype=np.float64)
-        self.close = np.array(parsed_data.get(hbc.OHLCV_CLOSE, []), dtype=np.float64)
-        self.volume = np.array(parsed_data.get(hbc.OHLCV_VOLUME, []), dtype=np.float64)
+        convert = np.array if copy else np.ascontiguousarray
+        self._set_columns([convert(parsed_data.get(field, []), dtype=dtype) for field, dtype in COLUMNS])
+        if capacity is not None:
+            self.reserve(capacity)
+
+    @classmethod
+    def from_arrays(cls, timestamps, open_, high, low, close, volume) -> 'OhclvData':
+        """
+        Creates an OhclvData that adopts existing arrays without copying them.
+
+        Arrays that already have the int64/float64 dtypes are used as-is, so the result
+        is a view that reflects later writes to them.
+
+        Returns:
+            OhclvData: The wrapping OhclvData object.
+        """
+        ohlcv = cls.__new__(cls)
+        arrays = (timestamps, open_, high, low, close, volume)
+        ohlcv._set_columns([np.asarray(array, dtype=dtype) for array, (_, dtype) in zip(arrays, COLUMNS)])
+        return ohlcv
+
+    @classmethod
+    def merge(cls, *ohlcvs, keep=KEEP_LAST) -> 'OhclvData':
+        """
+        Merges any number of OhclvData objects into one sorted series without duplicates.
+
+        Sorted inputs that share at most their boundary bars, like consecutive pages
+        fetched with an overlapping bar, are concatenated and deduplicated in O(n).
+        Otherwise the bars are ordered with a stable sort, which merges sorted inputs as
+        runs in O(n log k) for k inputs.
+
+        Args:
+            ohlcvs (OhclvData): The bars to merge, in any order.
+            keep (str): Which bar to keep of those sharing a timestamp: KEEP_LAST keeps
+                the one from the latest input, KEEP_FIRST the one from the earliest.
+
+        Returns:
+            OhclvData: A new OhclvData object with the merged bars.
+        """
+        if keep not in (KEEP_LAST, KEEP_FIRST):
+            raise ValueError(f'keep must be {KEEP_LAST!r} or {KEEP_FIRST!r}, not {keep!r}.')
+        ohlcvs = [ohlcv for ohlcv in ohlcvs if len(ohlcv)]
+        if not ohlcvs:
+            return cls({})
+
+        # Input positions by first and last timestamp
+        runs = sorted(range(len(ohlcvs)), key=lambda index: (ohlcvs[index].timestamps[0], ohlcvs[index].timestamps[-1]))
+        if all(ohlcv.is_sorted for ohlcv in ohlcvs) and all(
+                ohlcvs[previous].timestamps[-1] <= ohlcvs[following].timestamps[0]
+                for previous, following in zip(runs, runs[1:])):
+            # Only bars at the run boundaries can share a timestamp
+            shared = {}
+            for previous, following in zip(runs, runs[1:]):
+                timestamp = ohlcvs[previous].timestamps[-1]
+                if ohlcvs[following].timestamps[0] == timestamp:
+                    shared.setdefault(timestamp, set()).update((previous, following))
+            bounds = [[0, len(ohlcv)] for ohlcv in ohlcvs]
+            pick = max if keep == KEEP_LAST else min
+            for timestamp, indices in shared.items():
+                for index in indices - {pick(indices)}:
+                    if ohlcvs[index].timestamps[0] == timestamp:
+                        bounds[index][0] += 1
+                    else:
+                        bounds[index][1] -= 1
+            merged = cls.from_arrays(*(np.concatenate(arrays) for arrays in zip(
+                *([array[bounds[index][0]:bounds[index][1]] for array in ohlcvs[index]._arrays()] for index in runs))))
+            merged._sorted = True
+            return merged
 
+        columns = [np.concatenate(arrays) for arrays in zip(*(ohlcv._arrays() for ohlcv in ohlcvs))]
+        # A stable sort keeps the input order among bars with the same timestamp
+        order = np.argsort(columns[0], kind='stable')
+        timestamps = columns[0][order]
+        unique = np.ones(len(order), dtype=bool)
+        if keep == KEEP_LAST:
+            unique[:-1] = timestamps[1:] != timestamps[:-1]
+        else:
+            unique[1:] = timestamps[1:] != timestamps[:-1]
+        order = order[unique]
+        merged = cls.from_arrays(*(column[order] for column in columns))
+        merged._sorted = True
+        return merged
+
+    def _set_columns(self, columns):
+        self._columns = columns
+        self._size = len(columns[0])
+        self._sorted = None
         self._validate_data()
 
+    def _arrays(self):
+        return tuple(column[:self._size] for column in self._columns)
+
     def _validate_data(self):
-        lengths = [len(self.timestamps), len(self.open), len(self.high), len(self.low), len(self.close), len(self.volume)]
+        lengths = [len(column) for column in self._columns]
         if len(set(lengths)) > 1:
             raise ValueError("All OHLCV arrays must have the same length.")
 
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._columns[0][:self._size]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._columns[1][:self._size]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._columns[2][:self._size]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._columns[3][:self._size]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._columns[4][:self._size]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._columns[5][:self._size]
+
+    @property
+    def is_sorted(self) -> bool:
+        """ Whether the timestamps are strictly ascending, i.e. sorted without duplicates. """
+        if self._sorted is None:
+            timestamps = self.timestamps
+            self._sorted = bool(np.all(timestamps[1:] > timestamps[:-1]))
+        return self._sorted
+
+    @property
+    def capacity(self) -> int:
+        return len(self._columns[0])
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                raise ValueError("Only contiguous slices are supported.")
+            return self.slice(key.start, key.stop)
+        index = range(self._size)[key]
+        return {field: column[index].item() for (field, _), column in zip(COLUMNS, self._columns)}
+
+    def reserve(self, capacity: int):
+        """
+        Grows the buffers to hold at least `capacity` bars.
+
+        Args:
+            capacity (int): The minimum number of bars the buffers must hold.
+        """
+        if capacity <= self.capacity:
+            return
+        columns = []
+        for column in self._columns:
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            columns.append(grown)
+        self._columns = columns
+
+    def append(self, bar: dict):
+        """
+        Appends a single bar in amortized O(1).
+
+        Args:
+            bar (dict): The bar keyed by the standardized field names.
+        """
+        if self._sorted and self._size and bar[hbc.OHLCV_TIMESTAMP] <= self._columns[0][self._size - 1]:
+            self._sorted = False
+        if self._size == self.capacity:
+            self.reserve(max(2 * self.capacity, MIN_CAPACITY))
+        for (field, _), column in zip(COLUMNS, self._columns):
+            column[self._size] = bar[field]
+        self._size += 1
+
+    def extend(self, other):
+        """
+        Appends many bars at once.
+
+        Args:
+            other (OhclvData | dict): The bars to append, as an OhclvData or a dictionary
+                of arrays keyed by the standardized field names.
+        """
+        if isinstance(other, OhclvData):
+            arrays = list(other._arrays())
+        else:
+            arrays = [np.asarray(other[field]) for field, _ in COLUMNS]
+        n = len(arrays[0])
+        if any(len(array) != n for array in arrays):
+            raise ValueError("All OHLCV arrays must have the same length.")
+
+        if self._sorted and n:
+            follows = self._size == 0 or arrays[0][0] > self._columns[0][self._size - 1]
+            self._sorted = (other.is_sorted if isinstance(other, OhclvData) else None) if follows else False
+        if self._size + n > self.capacity:
+            self.reserve(max(2 * self.capacity, self._size + n, MIN_CAPACITY))
+        for column, array in zip(self._columns, arrays):
+            column[self._size:self._size + n] = array
+        self._size += n
+
+    def slice(self, start=None, stop=None) -> 'OhclvData':
+        """
+        Returns bars [start, stop) by index as a view sharing memory with this object.
+
+        Appending to the view copies it first, so it never writes into this object.
+        """
+        start, stop, _ = slice(start, stop).indices(self._size)
+        stop = max(start, stop)
+        view = OhclvData.from_arrays(*(column[start:stop] for column in self._columns))
+        if self._sorted:
+            view._sorted = True
+        return view
+
+    def read_only(self) -> 'OhclvData':
+        """
+        Returns a view of all bars whose columns cannot be written, e.g. to hand the same
+        bars to several owners. Writes to the view raise ValueError; appending copies it.
+        """
+        view = self.slice()
+        for column in view._columns:
+            column.flags.writeable = False
+        return view
+
+    def filter(self, mask) -> 'OhclvData':
+        """
+        Returns the bars where `mask` is True as a new OhclvData.
+
+        Args:
+            mask (np.ndarray): A boolean array with one element per bar.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        if len(mask) != self._size:
+            raise ValueError("The mask must have one element per bar.")
+        filtered = OhclvData.from_arrays(*(array[mask] for array in self._arrays()))
+        if self._sorted:
+            filtered._sorted = True
+        return filtered
+
+    def between(self, start_time=None, end_time=None) -> 'OhclvData':
+        """
+        Returns the bars with start_time <= timestamp <= end_time as a view.
+
+        Uses a binary search, so the timestamps must be in ascending order.
+
+        Args:
+            start_time (int): Inclusive start in epoch milliseconds, unbounded if None.
+            end_time (int): Inclusive end in epoch milliseconds, unbounded if None.
+        """
+        timestamps = self.timestamps
+        start = 0 if start_time is None else int(np.searchsorted(timestamps, start_time, side='left'))
+        stop = self._size if end_time is None else int(np.searchsorted(timestamps, end_time, side='right'))
+        return self.slice(start, stop)
+
+    def to_shared_memory(self, name, capacity=None):
+        """
+        Publishes the bars into a named shared-memory segment that other processes on
+        the host can read without copying, see shared_bars.SharedBarReader.
+
+        Args:
+            name (str): The segment name.
+            capacity (int): The number of bars the segment holds. Defaults to twice the
+                number of bars, leaving room to append.
+
+        Returns:
+            SharedBarWriter: The writer, which owns the segment until it is unlinked.
+        """
+        from .shared_bars import SharedBarWriter
+        return SharedBarWriter.from_ohlcv(name, self, capacity)
+
+    def to_dict(self) -> dict:
+        """
+        Converts the OHLCV data to a dictionary of lists.
+
+        Returns:
+            dict: The OHLCV data keyed by the standardized field names.
+        """
+        return {
+            hbc.OHLCV_TIMESTAMP: self.timestamps.tolist(),
+            hbc.OHLCV_OPEN: self.open.tolist(),
+            hbc.OHLCV_HIGH: self.high.tolist(),
+            hbc.OHLCV_LOW: self.low.tolist(),
+            hbc.OHLCV_CLOSE: self.close.tolist(),
+            hbc.OHLCV_VOLUME: self.volume.tolist(),
+        }
+
     def to_df(self, ascending: bool = True) -> pd.DataFrame:
         """
         Converts the OHLCV data to a pandas DataFrame.
@@ -44,38 +345,33 @@ class OhclvData:
         })
         df[hbc.OHLCV_TIMESTAMP] = pd.to_datetime(df[hbc.OHLCV_TIMESTAMP], unit='ms')
         df = df.set_index(hbc.OHLCV_TIMESTAMP)
-        df = df.sort_index(ascending=ascending)
+        if not self.is_sorted:
+            df = df.sort_index(ascending=ascending)
+        elif not ascending:
+            df = df.iloc[::-1]
         return df
 
-    def refreq(self, new_interval: str) -> 'OhclvData':
+    def refreq(self, new_interval: str, offset: int = 0, boundaries=None) -> 'OhclvData':
         """
         Resamples the OHLCV data to a new interval.
 
         Args:
-            new_interval (str): The new interval to resample to (e.g., '15T', '1H').
+            new_interval (str): The new interval to resample to, either a hist_bar_const
+                interval (e.g. '15m', '1h') or a pandas timedelta string (e.g. '15min').
+            offset (int): Alignment of the new bars in milliseconds past the epoch.
+            boundaries (np.ndarray): Optional ascending session start timestamps in
+                milliseconds. When given, bars are grouped by session instead of by
+                `new_interval`.
 
         Returns:
             OhclvData: A new OhclvData object with the resampled data.
         """
-        df = self.to_df()
-        
-        resampling_rules = {
-            hbc.OHLCV_OPEN: 'first',
-            hbc.OHLCV_HIGH: 'max',
-            hbc.OHLCV_LOW: 'min',
-            hbc.OHLCV_CLOSE: 'last',
-            hbc.OHLCV_VOLUME: 'sum'
-        }
+        interval_ms = None if boundaries is not None else interval_to_ms(new_interval)
 
-        resampled_df = df.resample(new_interval).agg(resampling_rules).dropna()
-
-        resampled_data = {
-            hbc.OHLCV_TIMESTAMP: resampled_df.index.astype(np.int64) // 10**6,
-            hbc.OHLCV_OPEN: resampled_df[hbc.OHLCV_OPEN].values,
-            hbc.OHLCV_HIGH: resampled_df[hbc.OHLCV_HIGH].values,
-            hbc.OHLCV_LOW: resampled_df[hbc.OHLCV_LOW].values,
-            hbc.OHLCV_CLOSE: resampled_df[hbc.OHLCV_CLOSE].values,
-            hbc.OHLCV_VOLUME: resampled_df[hbc.OHLCV_VOLUME].values
-        }
+        timestamps, open_, high, low, close, volume = self._arrays()
+        if not self.is_sorted and np.any(timestamps[1:] < timestamps[:-1]):
+            order = np.argsort(timestamps, kind='stable')
+            timestamps, open_, high, low, close, volume = (
+                a[order] for a in (timestamps, open_, high, low, close, volume))
 
-        return OhclvData(resampled_data)
+        return OhclvData(resample(timestamps, open_, high, low, close, volume, interval_ms, offset, boundaries))
@@ -0,0 +1,126 @@
+import importlib
+import threading
+from importlib.metadata import entry_points
+
+# Entry point groups third-party packages use to contribute exchange adapters, e.g. in pyproject.toml:
+#   [project.entry-points."hist_market_data.rest_api"]
+#   kraken = "my_package.kraken:KrakenApi"
+REST_ENTRY_POINT_GROUP = 'hist_market_data.rest_api'
+WS_ENTRY_POINT_GROUP = 'hist_market_data.ws_api'
+
+
+class AdapterRegistry:
+    """
+    Maps exchange names to adapter classes that are imported on first use.
+
+    Adapters are registered as 'module:attribute' strings, so registering one costs
+    nothing and an exchange's SDK is only imported when that exchange is requested.
+    Modules starting with a dot are resolved relative to this package. Adapters
+    published under `entry_point_group` by installed distributions are discovered the
+    first time a name is not found among the registered ones.
+    """
+    def __init__(self, entry_point_group):
+        self.entry_point_group = entry_point_group
+        self._targets = {}
+        self._loaded = {}
+        self._entry_points_scanned = False
+        self._lock = threading.RLock()
+
+    def register(self, name, target):
+        """
+        Registers an adapter.
+
+        Args:
+            name (str): The exchange name, e.g. 'binance'.
+            target: A 'module:attribute' string to import lazily, or the adapter class
+                (or any factory) itself.
+        """
+        with self._lock:
+            self._targets[name] = target
+            self._loaded.pop(name, None)
+
+    def names(self):
+        """
+        Returns:
+            list: The names of all registered and discoverable adapters.
+        """
+        with self._lock:
+            self._scan_entry_points()
+            return sorted(self._targets)
+
+    def __contains__(self, name):
+        with self._lock:
+            if name not in self._targets:
+                self._scan_entry_points()
+            return name in self._targets
+
+    def load(self, name):
+        """
+        Imports and returns the adapter registered under `name`.
+
+        Raises:
+            ValueError: If no adapter is registered under `name`.
+        """
+        with self._lock:
+            adapter = self._loaded.get(name)
+            if adapter is not None:
+                return adapter
+            if name not in self:
+                raise ValueError(f'Exchange {name} is not supported.')
+            target = self._targets[name]
+            if isinstance(target, str):
+                module_name, _, attribute = target.partition(':')
+                module = importlib.import_module(module_name, __package__)
+                adapter = getattr(module, attribute)
+            elif hasattr(target, 'load') and hasattr(target, 'group'):
+                adapter = target.load()
+            else:
+                adapter = target
+            self._loaded[name] = adapter
+            return adapter
+
+    def create(self, name, *args, **kwargs):
+        """ Imports the adapter registered under `name` if needed and constructs it. """
+        return self.load(name)(*args, **kwargs)
+
+    def warm_up(self, names=None, background=False):
+        """
+        Imports adapters ahead of their first use, e.g. for long-running services that
+        would rather pay the SDK import cost at startup than on the first request.
+
+        Args:
+            names (list): The adapters to import. Defaults to all of them.
+            background (bool): Whether to import on a daemon thread instead of blocking.
+
+        Returns:
+            threading.Thread: The warm-up thread if `background`, else None.
+        """
+        names = self.names() if names is None else list(names)
+        if background:
+            thread = threading.Thread(target=self._warm_up, args=(names,), name='adapter-warm-up', daemon=True)
+            thread.start()
+            return thread
+        self._warm_up(names)
+        return None
+
+    def _warm_up(self, names):
+        for name in names:
+            self.load(name)
+
+    def _scan_entry_points(self):
+        if self._entry_points_scanned:
+            return
+        self._entry_points_scanned = True
+        for entry_point in entry_points(group=self.entry_point_group):
+            # Built-in and explicitly registered adapters take precedence
+            self._targets.setdefault(entry_point.name, entry_point)
+
+
+REST_ADAPTERS = AdapterRegistry(REST_ENTRY_POINT_GROUP)
+REST_ADAPTERS.register('binance', '.REST_api.binance_api:BinanceApi')
+REST_ADAPTERS.register('okx', '.REST_api.okx_api:OkxApi')
+REST_ADAPTERS.register('xt', '.REST_api.xt_api:XtApi')
+REST_ADAPTERS.register('tiger', '.REST_api.tiger_api:TigerApi')
+
+WS_ADAPTERS = AdapterRegistry(WS_ENTRY_POINT_GROUP)
+WS_ADAPTERS.register('tiger', '.ws.tiger_ws_api:TigerWsApi')
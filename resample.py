@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from . import hist_bar_const as hbc
+
+
+def interval_to_ms(interval) -> int:
+    """
+    Converts an interval to milliseconds.
+
+    Args:
+        interval (str): A standardized interval from hist_bar_const, or any
+            pandas timedelta string (e.g. '15min', '2h').
+
+    Returns:
+        int: The interval length in milliseconds.
+    """
+    if interval in hbc.INTERVAL_MS:
+        return hbc.INTERVAL_MS[interval]
+    try:
+        interval_ms = int(pd.Timedelta(interval) // pd.Timedelta(1, unit='ms'))
+    except ValueError:
+        raise ValueError(f'Interval {interval} is not supported.')
+    if interval_ms <= 0:
+        raise ValueError(f'Interval {interval} must be positive.')
+    return interval_ms
+
+
+def bucket_starts(timestamps, interval_ms=None, offset=0, boundaries=None):
+    """
+    Assigns each bar to a bucket and returns the label of every bar's bucket.
+
+    Buckets are either fixed-width intervals aligned to `offset` milliseconds past
+    the epoch, or the spans between consecutive exchange session `boundaries`.
+
+    Args:
+        timestamps (np.ndarray): Bar timestamps in epoch milliseconds, ascending.
+        interval_ms (int): The bucket width in milliseconds.
+        offset (int): Alignment of the fixed-width buckets in milliseconds.
+        boundaries (np.ndarray): Ascending bucket start timestamps. Bars before the
+            first boundary get a label of -1.
+
+    Returns:
+        np.ndarray: The bucket start timestamp of every bar.
+    """
+    if boundaries is not None:
+        boundaries = np.asarray(boundaries, dtype=np.int64)
+        ids = np.searchsorted(boundaries, timestamps, side='right') - 1
+        labels = boundaries[np.maximum(ids, 0)]
+        labels[ids < 0] = -1
+        return labels
+    return (timestamps - offset) // interval_ms * interval_ms + offset
+
+
+def resample(timestamps, open_, high, low, close, volume, interval_ms=None, offset=0, boundaries=None):
+    """
+    Aggregates ascending bars into coarser buckets using segmented reductions.
+
+    Empty buckets produce no output bar, matching a pandas resample followed by dropna.
+
+    Returns:
+        dict: The resampled arrays keyed by the standardized field names.
+    """
+    labels = bucket_starts(timestamps, interval_ms, offset, boundaries)
+    if boundaries is not None:
+        valid = labels >= 0
+        if not valid.all():
+            timestamps, open_, high, low, close, volume, labels = (
+                a[valid] for a in (timestamps, open_, high, low, close, volume, labels))
+
+    n = len(labels)
+    if n == 0:
+        return {
+            hbc.OHLCV_TIMESTAMP: np.empty(0, dtype=np.int64),
+            hbc.OHLCV_OPEN: np.empty(0, dtype=np.float64),
+            hbc.OHLCV_HIGH: np.empty(0, dtype=np.float64),
+            hbc.OHLCV_LOW: np.empty(0, dtype=np.float64),
+            hbc.OHLCV_CLOSE: np.empty(0, dtype=np.float64),
+            hbc.OHLCV_VOLUME: np.empty(0, dtype=np.float64),
+        }
+
+    starts = np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+    ends = np.append(starts[1:], n) - 1
+
+    return {
+        hbc.OHLCV_TIMESTAMP: labels[starts],
+        hbc.OHLCV_OPEN: open_[starts],
+        hbc.OHLCV_HIGH: np.maximum.reduceat(high, starts),
+        hbc.OHLCV_LOW: np.minimum.reduceat(low, starts),
+        hbc.OHLCV_CLOSE: close[ends],
+        hbc.OHLCV_VOLUME: np.add.reduceat(volume, starts),
+    }
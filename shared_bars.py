@@ -0,0 +1,270 @@
+import os
+import sys
+import threading
+import time
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+from .ohclv_data import OhclvData, COLUMNS
+from . import hist_bar_const as hbc
+
+# Header: eight little-endian int64 slots ahead of the column buffers
+HEADER_SLOTS = 8
+HEADER_BYTES = HEADER_SLOTS * 8
+SHM_MAGIC = int.from_bytes(b'OHLCVSHM', 'little')
+SHM_LAYOUT_VERSION = 1
+_MAGIC, _LAYOUT, _CAPACITY, _ROWS, _SEQUENCE, _GENERATION = range(6)
+
+READ_RETRIES = 1000
+
+
+def segment_size(capacity):
+    """ Returns the bytes of a segment holding `capacity` bars. """
+    return HEADER_BYTES + capacity * 8 * len(COLUMNS)
+
+
+def _map_segment(buf, capacity, writable):
+    header = np.ndarray((HEADER_SLOTS,), dtype='<i8', buffer=buf)
+    columns = []
+    for position, (_, dtype) in enumerate(COLUMNS):
+        column = np.ndarray((capacity,), dtype=np.dtype(dtype).newbyteorder('<'), buffer=buf,
+                            offset=HEADER_BYTES + position * capacity * 8)
+        column.flags.writeable = writable
+        columns.append(column)
+    return header, columns
+
+
+class SharedBarWriter:
+    """
+    Publishes bars into a named shared-memory segment for other local processes.
+
+    The segment holds a versioned header followed by one fixed-capacity column per OHLCV
+    field, in the same little-endian layout as BarStore. Readers attach with
+    SharedBarReader and get NumPy views of the committed rows without copying or
+    decoding anything.
+
+    Appends write past the committed rows and then publish the new row count, so views
+    of earlier rows are never disturbed. Changes to committed rows (updates of the
+    forming bar, `write` and compaction) are bracketed by a sequence counter that is odd
+    while they are in progress, letting readers retry torn reads. Every change bumps the
+    sequence; rewrites that move rows also bump the generation.
+
+    Args:
+        name (str): The segment name, e.g. 'binance.BTC-USDT.1m'.
+        capacity (int): The number of bars the segment holds. When an append does not fit,
+            the oldest bars are dropped until at most half of the capacity is in use.
+    """
+    def __init__(self, name, capacity):
+        if capacity <= 0:
+            raise ValueError('Capacity must be positive.')
+        self.name = name
+        self.capacity = capacity
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+        except FileExistsError:
+            # Left behind by a writer that crashed before unlinking; readers still attached keep the old mapping
+            print(f"Replacing stale shared memory segment {name}")
+            _unlink_segment(name)
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+        self._header, self._columns = _map_segment(self._shm.buf, capacity, writable=True)
+        # A single writer per segment; the lock only serializes threads of this process
+        self._lock = threading.RLock()
+        self._header[:] = 0
+        self._header[_MAGIC] = SHM_MAGIC
+        self._header[_LAYOUT] = SHM_LAYOUT_VERSION
+        self._header[_CAPACITY] = capacity
+
+    @classmethod
+    def from_ohlcv(cls, name, ohlcv, capacity=None) -> 'SharedBarWriter':
+        """
+        Creates a segment and publishes `ohlcv` into it.
+
+        Args:
+            capacity (int): Defaults to twice the number of bars, leaving room to append.
+        """
+        writer = cls(name, capacity or max(2 * len(ohlcv), 1))
+        writer.write(ohlcv)
+        return writer
+
+    @property
+    def rows(self) -> int:
+        return int(self._header[_ROWS])
+
+    @property
+    def sequence(self) -> int:
+        return int(self._header[_SEQUENCE])
+
+    def write(self, ohlcv):
+        """ Replaces the segment's bars with the newest `capacity` bars of `ohlcv`. """
+        ohlcv = ohlcv.slice(max(len(ohlcv) - self.capacity, 0))
+        with self._lock:
+            self._begin()
+            try:
+                for column, array in zip(self._columns, _arrays(ohlcv)):
+                    column[:len(ohlcv)] = array
+                self._header[_ROWS] = len(ohlcv)
+                self._header[_GENERATION] += 1
+            finally:
+                self._end()
+
+    def append(self, ohlcv) -> int:
+        """
+        Appends bars newer than the last published bar.
+
+        Returns:
+            int: The number of bars appended.
+        """
+        with self._lock:
+            rows = self.rows
+            if rows:
+                ohlcv = ohlcv.between(start_time=int(self._columns[0][rows - 1]) + 1)
+            if len(ohlcv) == 0:
+                return 0
+            if rows + len(ohlcv) > self.capacity:
+                rows = self._compact(len(ohlcv))
+                ohlcv = ohlcv.slice(max(len(ohlcv) - self.capacity, 0))
+            for column, array in zip(self._columns, _arrays(ohlcv)):
+                column[rows:rows + len(ohlcv)] = array
+            # Publishing the row count makes the new bars visible; nothing committed changed
+            self._header[_ROWS] = rows + len(ohlcv)
+            self._header[_SEQUENCE] += 2
+            return len(ohlcv)
+
+    def on_bar(self, bar):
+        """
+        Applies a live bar: replaces the last bar if it has the same timestamp, appends it
+        if it is newer and ignores it otherwise.
+        """
+        with self._lock:
+            rows = self.rows
+            timestamp = bar[hbc.OHLCV_TIMESTAMP]
+            last = int(self._columns[0][rows - 1]) if rows else None
+            if last is None or timestamp > last:
+                self.append(OhclvData({field: [bar[field]] for field, _ in COLUMNS}))
+            elif timestamp == last:
+                self._begin()
+                try:
+                    for (field, _), column in zip(COLUMNS, self._columns):
+                        column[rows - 1] = bar[field]
+                finally:
+                    self._end()
+
+    def close(self):
+        """ Detaches from the segment; readers keep it until it is unlinked. """
+        self._header = self._columns = None
+        self._shm.close()
+
+    def unlink(self):
+        """ Removes the segment name; attached readers keep their mappings. """
+        self._shm.unlink()
+
+    def _begin(self):
+        self._header[_SEQUENCE] += 1
+
+    def _end(self):
+        self._header[_SEQUENCE] += 1
+
+    def _compact(self, incoming):
+        """ Drops the oldest bars so `incoming` bars fit, keeping up to half the capacity. """
+        keep = max(min(self.capacity // 2, self.capacity - incoming), 0)
+        rows = self.rows
+        self._begin()
+        try:
+            for column in self._columns:
+                column[:keep] = column[rows - keep:rows].copy()
+            self._header[_ROWS] = keep
+            self._header[_GENERATION] += 1
+        finally:
+            self._end()
+        return keep
+
+
+class SharedBarReader:
+    """
+    Attaches read-only to a segment published by SharedBarWriter.
+
+    `read` returns an OhclvData of NumPy views over the shared columns. Appended bars
+    never move existing rows, so the views stay valid until the generation changes;
+    the last bar may still be updated in place while it is forming. Copy the result
+    (e.g. with OhclvData(ohlcv.to_dict())) to hold it across compactions.
+
+    Args:
+        name (str): The segment name the writer was created with.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._shm = _attach_untracked(name)
+        header = np.ndarray((HEADER_SLOTS,), dtype='<i8', buffer=self._shm.buf)
+        if header[_MAGIC] != SHM_MAGIC:
+            raise ValueError(f'Shared memory segment {name} does not hold bars.')
+        if header[_LAYOUT] != SHM_LAYOUT_VERSION:
+            raise ValueError(f'Shared memory segment {name} has unsupported layout version {header[_LAYOUT]}.')
+        self.capacity = int(header[_CAPACITY])
+        self._header, self._columns = _map_segment(self._shm.buf, self.capacity, writable=False)
+
+    @property
+    def sequence(self) -> int:
+        """ Changes whenever bars are appended or rewritten; compare to detect new data. """
+        return int(self._header[_SEQUENCE])
+
+    @property
+    def generation(self) -> int:
+        """ Changes when committed rows move, which invalidates earlier views. """
+        return int(self._header[_GENERATION])
+
+    def read(self, start_time=None, end_time=None):
+        """
+        Returns the published bars with start_time <= timestamp <= end_time.
+
+        Returns:
+            tuple: (OhclvData of read-only views, sequence) as of a consistent point.
+        """
+        for _ in range(READ_RETRIES):
+            sequence = self.sequence
+            if sequence % 2 == 0:
+                rows = int(self._header[_ROWS])
+                ohlcv = OhclvData.from_arrays(*(column[:rows] for column in self._columns))
+                ohlcv = ohlcv.between(start_time, end_time)
+                if self.sequence == sequence:
+                    return ohlcv, sequence
+            time.sleep(0)
+        raise TimeoutError(f'Shared memory segment {self.name} is being rewritten.')
+
+    def read_since(self, sequence):
+        """
+        Returns:
+            tuple: (OhclvData, sequence) once the segment has changed since `sequence`,
+                or (None, sequence) if it has not.
+        """
+        if self.sequence == sequence:
+            return None, sequence
+        return self.read()
+
+    def close(self):
+        """ Detaches from the segment once no views returned by `read` are left. """
+        self._header = self._columns = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # Views are still in use; the mapping is released with the last of them
+
+
+def _attach_untracked(name):
+    """ Attaches to an existing segment without letting this process's resource tracker unlink it. """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Only the creating process owns the segment; the tracker knows it by its POSIX name
+    if os.name == 'posix':
+        resource_tracker.unregister(f'/{shm.name}', 'shared_memory')
+    return shm
+
+
+def _unlink_segment(name):
+    shm = shared_memory.SharedMemory(name=name)
+    shm.close()
+    # Unlinking also drops the tracker registration made by attaching
+    shm.unlink()
+
+
+def _arrays(ohlcv):
+    return (ohlcv.timestamps, ohlcv.open, ohlcv.high, ohlcv.low, ohlcv.close, ohlcv.volume)
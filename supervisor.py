@@ -0,0 +1,335 @@
+import asyncio
+import collections
+import functools
+import hashlib
+import multiprocessing
+import os
+import queue
+import time
+from .metrics import REGISTRY
+
+DEFAULT_HEARTBEAT_INTERVAL = 1.0  # seconds between worker heartbeats
+DEFAULT_HEARTBEAT_TIMEOUT = 10.0  # seconds without a heartbeat before a worker is replaced
+DEFAULT_RESTART_BACKOFF = 1.0  # seconds, doubled for every restart of a slot
+MAX_RESTART_BACKOFF = 60.0
+DEFAULT_RETRY_BACKOFF = 1.0  # seconds before a failed subscription is retried, doubled per failure
+
+Subscription = collections.namedtuple('Subscription', ['exchange', 'symbol', 'interval', 'topic'])
+
+
+def shard_owner(subscription, workers):
+    """
+    Picks the worker that owns a subscription with rendezvous (highest random weight) hashing.
+
+    Every subscription goes to the worker with the highest hash of (worker, subscription),
+    so when a worker leaves or joins only the subscriptions it owned or now owns move.
+
+    Args:
+        subscription (Subscription): The subscription to place.
+        workers (list): The ids of the available workers.
+
+    Returns:
+        int: The id of the owning worker.
+    """
+    key = f'{subscription.exchange}|{subscription.symbol}|{subscription.interval}'
+
+    def weight(worker):
+        return hashlib.blake2b(f'{worker}|{key}'.encode('utf-8'), digest_size=8).digest()
+    return max(workers, key=weight)
+
+
+def assign_shards(subscriptions, workers):
+    """
+    Returns:
+        dict: The subscriptions owned by each worker id, for every id in `workers`.
+    """
+    assignment = {worker: [] for worker in workers}
+    if workers:
+        for subscription in subscriptions:
+            assignment[shard_owner(subscription, workers)].append(subscription)
+    return assignment
+
+
+def create_data_service(exchange, credentials=None, **service_kwargs):
+    """ The default service factory: a DataService for `exchange` with its credentials. """
+    from .main import DataService
+    api_key, api_secret = (credentials or {}).get(exchange, (None, None))
+    return DataService(exchange, api_key, api_secret, **service_kwargs)
+
+
+class IngestSupervisor:
+    """
+    Shards a universe of subscriptions across worker processes and keeps them running.
+
+    Each worker process owns one service per exchange (by default a DataService, so its
+    own HistApi, WebSocket client and Kafka producer) and serves the subscriptions the
+    supervisor assigns to it. Subscriptions are placed with rendezvous hashing over the
+    live workers: when a worker dies or stops sending heartbeats its subscriptions move
+    to the survivors, and they move back once the slot has been restarted.
+
+    Workers report health and a snapshot of their metrics with every heartbeat. The
+    snapshots are merged into `registry` with a `worker` label, next to the supervisor's
+    own workers_alive and worker_restarts_total metrics.
+
+    Args:
+        subscriptions (list): Subscription tuples.
+        num_workers (int): The number of worker processes.
+        service_factory (callable): Called in the worker as service_factory(exchange);
+            must be picklable. The service needs awaitable subscribe_ohlcv(symbol,
+            interval, topic) and aclose(), and unsubscribe_ohlcv(symbol, interval).
+        heartbeat_interval (float): Seconds between worker heartbeats.
+        heartbeat_timeout (float): Seconds without a heartbeat before a worker is replaced.
+        restart_backoff (float): Seconds before a dead worker's slot is restarted.
+        registry (MetricsRegistry): Receives the aggregated worker metrics.
+    """
+    def __init__(self, subscriptions, num_workers=None, service_factory=create_data_service,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT,
+                 restart_backoff=DEFAULT_RESTART_BACKOFF, registry=REGISTRY):
+        self.subscriptions = [Subscription(*subscription) for subscription in subscriptions]
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.service_factory = service_factory
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.restart_backoff = restart_backoff
+        self.registry = registry
+
+        # Spawned workers do not inherit the supervisor's threads or sockets
+        self._context = multiprocessing.get_context('spawn')
+        self._events = self._context.Queue()
+        self._workers = {}
+        self._assignment = {}
+        self._restarts = collections.Counter()
+        self._restart_at = {}
+        self._running = False
+
+        self._alive_gauge = registry.gauge('workers_alive', 'Ingestion worker processes that are alive.')
+        self._restarts_total = registry.counter('worker_restarts_total', 'Ingestion worker processes restarted.')
+
+    def start(self):
+        self._running = True
+        for worker_id in range(self.num_workers):
+            self._start_worker(worker_id)
+        self._rebalance()
+
+    def run(self, poll_interval=0.5):
+        """ Starts the workers and supervises them until stop() or KeyboardInterrupt. """
+        if not self._running:
+            self.start()
+        try:
+            while self._running:
+                self.supervise(poll_interval)
+        except KeyboardInterrupt:
+            print("Stopping ingestion workers...")
+        finally:
+            self.stop()
+
+    def supervise(self, timeout=0.5):
+        """
+        Processes worker events for up to `timeout` seconds, then replaces dead workers
+        and rebalances. Call repeatedly when not using run().
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                event = self._events.get(timeout=max(remaining, 0)) if remaining > 0 else self._events.get_nowait()
+            except queue.Empty:
+                break
+            self._on_event(event)
+
+        changed = False
+        now = time.monotonic()
+        for worker_id, worker in list(self._workers.items()):
+            stale = now - worker['last_heartbeat'] > self.heartbeat_timeout
+            if worker['process'].is_alive() and not stale:
+                continue
+            print(f"Worker {worker_id} ({'unresponsive' if stale else 'exited'}); moving its subscriptions")
+            self._terminate(worker)
+            del self._workers[worker_id]
+            backoff = min(self.restart_backoff * 2 ** self._restarts[worker_id], MAX_RESTART_BACKOFF)
+            self._restart_at[worker_id] = now + backoff
+            changed = True
+
+        for worker_id, restart_at in list(self._restart_at.items()):
+            if now >= restart_at and self._running:
+                del self._restart_at[worker_id]
+                self._restarts[worker_id] += 1
+                self._restarts_total.inc()
+                self._start_worker(worker_id)
+                changed = True
+
+        if changed:
+            self._rebalance()
+        self._alive_gauge.set(sum(worker['process'].is_alive() for worker in self._workers.values()))
+
+    def stop(self, timeout=10.0):
+        """ Asks every worker to close its services and waits for them to exit. """
+        self._running = False
+        for worker in self._workers.values():
+            try:
+                worker['commands'].put(('stop',))
+            except (OSError, ValueError):
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in self._workers.values():
+            worker['process'].join(max(deadline - time.monotonic(), 0))
+            self._terminate(worker)
+        self._workers.clear()
+
+    def assignments(self):
+        """
+        Returns:
+            dict: The subscriptions currently assigned to each live worker id.
+        """
+        return {worker_id: list(subscriptions) for worker_id, subscriptions in self._assignment.items()}
+
+    def health(self):
+        """
+        Returns:
+            dict: Per worker id: pid, liveness, seconds since the last heartbeat, the
+                number of assigned and active subscriptions, restarts and the last error.
+        """
+        now = time.monotonic()
+        health = {}
+        for worker_id, worker in self._workers.items():
+            health[worker_id] = {
+                'pid': worker['process'].pid,
+                'alive': worker['process'].is_alive(),
+                'heartbeat_age': now - worker['last_heartbeat'],
+                'assigned': len(self._assignment.get(worker_id, ())),
+                'active': worker['active'],
+                'restarts': self._restarts[worker_id],
+                'last_error': worker['last_error'],
+            }
+        for worker_id in self._restart_at:
+            health[worker_id] = {'alive': False, 'restarts': self._restarts[worker_id]}
+        return health
+
+    def _start_worker(self, worker_id):
+        commands = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self.service_factory, commands, self._events, self.heartbeat_interval),
+            name=f'ingest-worker-{worker_id}',
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = {
+            'process': process,
+            'commands': commands,
+            # Grace period for the interpreter to start before the first heartbeat
+            'last_heartbeat': time.monotonic() + self.heartbeat_timeout,
+            'active': 0,
+            'last_error': None,
+        }
+
+    def _rebalance(self):
+        assignment = assign_shards(self.subscriptions, sorted(self._workers))
+        for worker_id, subscriptions in assignment.items():
+            if subscriptions != self._assignment.get(worker_id) or worker_id not in self._assignment:
+                self._workers[worker_id]['commands'].put(('assign', subscriptions))
+        self._assignment = assignment
+
+    def _on_event(self, event):
+        kind, worker_id, payload = event
+        worker = self._workers.get(worker_id)
+        if worker is None or worker['process'].pid != payload.get('pid'):
+            return  # From a worker that has since been replaced
+        if kind == 'heartbeat':
+            worker['last_heartbeat'] = time.monotonic()
+            worker['active'] = payload['active']
+            self.registry.load_snapshot(payload['metrics'], worker=str(worker_id))
+        elif kind == 'error':
+            worker['last_error'] = payload['error']
+            print(f"Worker {worker_id}: {payload['error']}")
+
+    @staticmethod
+    def _terminate(worker):
+        process = worker['process']
+        if process.is_alive():
+            process.terminate()
+            process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+
+def _worker_main(worker_id, service_factory, commands, events, heartbeat_interval):
+    """ Entry point of a worker process. """
+    try:
+        asyncio.run(_worker_loop(worker_id, service_factory, commands, events, heartbeat_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(worker_id, service_factory, commands, events, heartbeat_interval):
+    pid = os.getpid()
+    services = {}
+    wanted = set()
+    active = set()
+    # Failed subscription -> (failures, monotonic time of the next attempt)
+    retries = {}
+
+    def report_error(error):
+        events.put(('error', worker_id, {'pid': pid, 'error': error}))
+
+    async def heartbeat():
+        # A separate task, so long history backfills do not look like a hung worker
+        while True:
+            events.put(('heartbeat', worker_id, {'pid': pid, 'active': len(active), 'metrics': REGISTRY.snapshot()}))
+            await asyncio.sleep(heartbeat_interval)
+
+    async def subscribe_pending():
+        now = time.monotonic()
+        for subscription in sorted(wanted - active):
+            failures, retry_at = retries.get(subscription, (0, now))
+            if retry_at > now:
+                continue
+            try:
+                service = services.get(subscription.exchange)
+                if service is None:
+                    service = services[subscription.exchange] = await asyncio.to_thread(
+                        service_factory, subscription.exchange)
+                await service.subscribe_ohlcv(subscription.symbol, subscription.interval, subscription.topic)
+                active.add(subscription)
+                retries.pop(subscription, None)
+            except Exception as e:
+                # Keep the shard served: retry with backoff instead of giving up after one error
+                delay = min(DEFAULT_RETRY_BACKOFF * 2 ** failures, MAX_RESTART_BACKOFF)
+                retries[subscription] = (failures + 1, time.monotonic() + delay)
+                report_error(f'{subscription}: {e!r}, retrying in {delay:.0f}s')
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        while True:
+            try:
+                command = await asyncio.to_thread(commands.get, True, 0.5)
+            except queue.Empty:
+                command = None
+
+            if command is not None and command[0] == 'stop':
+                return
+            if command is not None and command[0] == 'assign':
+                wanted = set(command[1])
+                for subscription in active - wanted:
+                    services[subscription.exchange].unsubscribe_ohlcv(subscription.symbol, subscription.interval)
+                    active.discard(subscription)
+                for subscription in set(retries) - wanted:
+                    del retries[subscription]
+            await subscribe_pending()
+    finally:
+        heartbeat_task.cancel()
+        for service in services.values():
+            try:
+                await service.aclose()
+            except Exception as e:
+                report_error(f'close: {e!r}')
+
+
+def supervisor_service_factory(**service_kwargs):
+    """
+    Returns a picklable factory building DataServices with `service_kwargs`, e.g.
+    credentials={'tiger': (api_key, api_secret)} and kafka_config.
+    """
+    return functools.partial(create_data_service, **service_kwargs)
+
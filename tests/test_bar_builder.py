@@ -0,0 +1,210 @@
+import asyncio
+import contextlib
+import io
+import json
+import threading
+import time
+import unittest
+from hist_market_data.benchmarks.replay import ReplayHistApi, ReplayWsApi, REPLAY_EXCHANGE
+from hist_market_data.benchmarks.synthetic import StubAdminClient, StubProducer, synthetic_bars
+from hist_market_data.indicators import SMA
+from hist_market_data.ohclv_data import OhclvData
+from hist_market_data.ws.bar_builder import BarRingBuffer, LiveBarBuilder, EMIT_CLOSED, EMIT_THROTTLED
+from hist_market_data import hist_bar_const as hbc
+
+MINUTE = hbc.INTERVAL_MS[hbc.INTERVAL_1MINUTE]
+
+
+def bar(timestamp, close):
+    return {
+        hbc.OHLCV_TIMESTAMP: timestamp,
+        hbc.OHLCV_OPEN: 1.0,
+        hbc.OHLCV_HIGH: max(1.0, close),
+        hbc.OHLCV_LOW: min(1.0, close),
+        hbc.OHLCV_CLOSE: close,
+        hbc.OHLCV_VOLUME: 1.0,
+    }
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBarRingBuffer(unittest.TestCase):
+
+    def test_view_is_contiguous_after_wraparound(self):
+        buffer = BarRingBuffer(capacity=4)
+        for i in range(7):
+            buffer.append(bar(i * MINUTE, float(i)))
+
+        view = buffer.view()
+        self.assertEqual(view.close.tolist(), [3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(buffer.view(2).close.tolist(), [5.0, 6.0])
+
+    def test_view_is_zero_copy(self):
+        buffer = BarRingBuffer(capacity=4)
+        buffer.append(bar(0, 1.0))
+        view = buffer.view()
+        buffer.update_last(bar(0, 2.0))
+        self.assertEqual(view.close[-1], 2.0)
+
+
+class TestLiveBarBuilder(unittest.TestCase):
+
+    def test_closed_mode_emits_each_bar_once(self):
+        builder = LiveBarBuilder(emit=EMIT_CLOSED)
+        emitted = []
+        for timestamp, close in [(0, 1.0), (0, 2.0), (0, 3.0), (MINUTE, 4.0), (MINUTE, 5.0)]:
+            emitted += builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(timestamp, close))
+
+        self.assertEqual([b[hbc.OHLCV_CLOSE] for b in emitted], [3.0])
+        polled = builder.poll(now_ms=2 * MINUTE)
+        self.assertEqual([(s, b[hbc.OHLCV_CLOSE]) for s, _, b in polled], [('AAPL', 5.0)])
+        self.assertEqual(builder.poll(now_ms=2 * MINUTE), [])
+        self.assertEqual(builder.bars('AAPL', hbc.INTERVAL_1MINUTE).close.tolist(), [3.0, 5.0])
+
+    def test_throttled_mode_limits_partial_updates(self):
+        clock = FakeClock()
+        builder = LiveBarBuilder(emit=EMIT_THROTTLED, throttle=1.0, clock=clock)
+        emitted = builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(0, 1.0))
+        clock.now = 0.5
+        emitted += builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(0, 2.0))
+        self.assertEqual([b[hbc.OHLCV_CLOSE] for b in emitted], [1.0])
+
+        clock.now = 1.2
+        polled = builder.poll(now_ms=30 * 1000)
+        self.assertEqual([b[hbc.OHLCV_CLOSE] for _, _, b in polled], [2.0])
+
+    def test_late_updates_are_ignored(self):
+        builder = LiveBarBuilder(emit=EMIT_CLOSED)
+        builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(MINUTE, 1.0))
+        self.assertEqual(builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(0, 9.0)), [])
+        self.assertEqual(len(builder.bars('AAPL', hbc.INTERVAL_1MINUTE)), 1)
+
+    def test_backfill_merges_missed_bars_without_duplicates(self):
+        builder = LiveBarBuilder(emit=EMIT_CLOSED)
+        builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(0, 1.0))
+        builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(MINUTE, 2.0))
+        # The stream dropped while the second bar was forming
+        missed = OhclvData({field: [b[field] for b in (bar(0, 1.0), bar(MINUTE, 2.5), bar(2 * MINUTE, 3.0))]
+                            for field in bar(0, 0.0)})
+
+        emitted = builder.backfill('AAPL', hbc.INTERVAL_1MINUTE, missed)
+        self.assertEqual([(b[hbc.OHLCV_TIMESTAMP], b[hbc.OHLCV_CLOSE]) for b in emitted], [(MINUTE, 2.5), (2 * MINUTE, 3.0)])
+        self.assertEqual(builder.backfill('AAPL', hbc.INTERVAL_1MINUTE, missed), [])
+
+        # Live updates resume after the repaired bars
+        self.assertEqual(builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(MINUTE, 9.0)), [])
+        builder.on_bar('AAPL', hbc.INTERVAL_1MINUTE, bar(3 * MINUTE, 4.0))
+        self.assertEqual(builder.bars('AAPL', hbc.INTERVAL_1MINUTE).close.tolist(), [1.0, 2.5, 3.0, 4.0])
+
+
+class RecordingProducer(StubProducer):
+    """ Keeps the key and value of every message produced, per topic. """
+    def __init__(self):
+        super().__init__()
+        self.keys = {}
+        self.values = {}
+
+    def produce(self, topic, value=None, key=None, **kwargs):
+        self.keys.setdefault(topic, []).append(int(key))
+        self.values.setdefault(topic, []).append(value)
+        super().produce(topic, value, key, **kwargs)
+
+
+class TestGapRepair(unittest.TestCase):
+
+    def reconnect(self, interval):
+        """ Subscribes, drops the stream for 10 bars and reconnects; returns the bars and topic keys. """
+        now_bar = int(time.time() * 1000) // MINUTE * MINUTE
+        # 29 closed bars and the forming one; the exchange history first ends 10 bars back
+        bars = synthetic_bars(30, start=now_bar - 29 * MINUTE)
+        hist_api = ReplayHistApi({'AAPL': bars.slice(0, 20)})
+        ws_api = ReplayWsApi({}, interval)
+        producer = RecordingProducer()
+        topic = f'replay.AAPL.{interval}'
+
+        async def run():
+            from hist_market_data.main import DataService
+            service = DataService(REPLAY_EXCHANGE, None, None, producer=producer, admin_client=StubAdminClient(),
+                                  hist_api=hist_api, live_emit=EMIT_CLOSED)
+            service.ws_api_manager.register_api(REPLAY_EXCHANGE, ws_api)
+            try:
+                await service.subscribe_ohlcv('AAPL', interval, topic)
+                callback = ws_api.ohlcv_callbacks['AAPL']
+
+                service._on_ws_disconnected(REPLAY_EXCHANGE)
+                hist_api.bars['AAPL'] = bars.slice(0, 29)
+                service._on_ws_connected(REPLAY_EXCHANGE)
+                # The resubscribed stream delivers a stale bar and newer ones before the repair ran
+                for data in (bars[27], bars[29], {**bars[29], hbc.OHLCV_TIMESTAMP: now_bar + MINUTE}):
+                    callback(data)
+                while service._repairing:
+                    await asyncio.sleep(0.01)
+                while len(service.publish_queue) or len(producer):
+                    await asyncio.sleep(0.01)
+            finally:
+                await service.aclose()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+        return bars, producer.keys[topic]
+
+    def test_reconnect_repairs_gap_in_order_without_duplicates(self):
+        bars, keys = self.reconnect(hbc.INTERVAL_1MINUTE)
+        self.assertEqual(keys, bars.timestamps.tolist())
+
+    def test_reconnect_repairs_gap_of_pandas_interval(self):
+        bars, keys = self.reconnect('1min')
+        self.assertEqual(keys, bars.timestamps.tolist())
+
+    def test_push_update_waits_for_polled_close(self):
+        now_bar = int(time.time() * 1000) // MINUTE * MINUTE
+        bars = synthetic_bars(12, start=now_bar - 11 * MINUTE)
+        closing, newer = bars[9], bars[10]
+        hist_api = ReplayHistApi({'AAPL': bars.slice(0, 9)})
+        ws_api = ReplayWsApi({}, hbc.INTERVAL_1MINUTE)
+        producer = RecordingProducer()
+        topic = 'replay.AAPL.1m'
+
+        async def run():
+            from hist_market_data.main import DataService
+            service = DataService(REPLAY_EXCHANGE, None, None, producer=producer, admin_client=StubAdminClient(),
+                                  hist_api=hist_api, live_throttle=3600)
+            service.ws_api_manager.register_api(REPLAY_EXCHANGE, ws_api)
+            try:
+                await service.subscribe_ohlcv('AAPL', hbc.INTERVAL_1MINUTE, topic, indicators={'sma': SMA(2)})
+                callback = ws_api.ohlcv_callbacks['AAPL']
+                callback(closing)
+                poll = service.bar_builder.poll
+                pusher = threading.Thread(target=callback, args=(newer,))
+
+                def poll_then_push(*args):
+                    # The push thread delivers the next bar while the polled close is being published
+                    emitted = poll(*args)
+                    pusher.start()
+                    pusher.join(0.2)
+                    return emitted
+                service.bar_builder.poll = poll_then_push
+                service._publish_due_bars()
+                pusher.join(5)
+                while len(service.publish_queue) or len(producer):
+                    await asyncio.sleep(0.01)
+            finally:
+                await service.aclose()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+
+        live = [json.loads(value) for value in producer.values[topic][9:]]
+        self.assertEqual([bar[hbc.OHLCV_TIMESTAMP] for bar in live],
+                         [closing[hbc.OHLCV_TIMESTAMP]] * 2 + [newer[hbc.OHLCV_TIMESTAMP]])
+        self.assertTrue(all(bar['sma'] is not None for bar in live))
+
+
+if __name__ == '__main__':
+    unittest.main()
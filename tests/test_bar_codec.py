@@ -0,0 +1,96 @@
+import io
+import unittest
+import numpy as np
+from hist_market_data.bar_codec import (
+    BLOCK_HEADER,
+    MODE_XOR,
+    SECTION_HEADER,
+    block_info,
+    decode_block,
+    encode_block,
+    read_blocks,
+    write_blocks,
+)
+from hist_market_data.bar_encoding import ENCODING_COMPRESSED, encode_batch, encode_bar
+from hist_market_data.ohclv_data import OhclvData
+from hist_market_data.tests.test_ohclv_data import make_bars, MINUTE
+from hist_market_data import hist_bar_const as hbc
+
+
+def rounded_bars(n, decimals=2):
+    """ Bars with prices on a tick grid and whole-unit volumes, as exchanges report them. """
+    return OhclvData({field: values if field == hbc.OHLCV_TIMESTAMP else np.round(values, 0 if field == hbc.OHLCV_VOLUME else decimals)
+                      for field, values in make_bars(n).to_dict().items()})
+
+
+class TestBarCodec(unittest.TestCase):
+
+    def assertRoundTrips(self, bars, start=0, stop=None):
+        decoded = decode_block(encode_block(bars, start, stop))
+        expected = bars[start:stop]
+        for column in ('timestamps', 'open', 'high', 'low', 'close', 'volume'):
+            np.testing.assert_array_equal(getattr(decoded, column), getattr(expected, column))
+
+    def test_regular_series_compresses(self):
+        bars = rounded_bars(1000)
+        block = encode_block(bars)
+
+        self.assertRoundTrips(bars)
+        self.assertGreater(len(encode_batch(bars)) / len(block), 5)
+        # The first interval takes three bytes and every later timestamp one
+        self.assertEqual(SECTION_HEADER.unpack_from(block, BLOCK_HEADER.size), (0, 3 + 998))
+
+    def test_arbitrary_floats_round_trip_exactly(self):
+        bars = make_bars(300)
+        bars.close[5] = np.nan
+        bars.volume[7] = -0.0
+        bars.high[9] = np.inf
+        block = encode_block(bars)
+
+        self.assertEqual(block[BLOCK_HEADER.size + SECTION_HEADER.size + 3 + 298], MODE_XOR)
+        decoded = decode_block(block)
+        np.testing.assert_array_equal(decoded.close, bars.close)
+        self.assertTrue(np.signbit(decoded.volume[7]))
+        self.assertRoundTrips(bars)
+
+    def test_slices_irregular_and_empty_blocks(self):
+        bars = rounded_bars(100)
+        timestamps = bars.timestamps.copy()
+        timestamps[50:] += 37 * MINUTE
+        timestamps[70:] -= 12345
+        bars = OhclvData({**bars.to_dict(), hbc.OHLCV_TIMESTAMP: timestamps})
+
+        self.assertRoundTrips(bars, 10, 90)
+        self.assertRoundTrips(bars, 42, 43)
+        self.assertEqual(len(decode_block(encode_block(bars, 0, 0))), 0)
+        self.assertEqual(block_info(encode_block(bars, 10, 90)), (80, timestamps[10], timestamps[89]))
+
+    def test_rejects_foreign_and_truncated_blocks(self):
+        block = encode_block(rounded_bars(10))
+        with self.assertRaises(ValueError):
+            decode_block(b'XXXX' + block[4:])
+        with self.assertRaises(ValueError):
+            decode_block(block[:-3])
+
+    def test_stream_skips_blocks_outside_range(self):
+        bars = rounded_bars(1000)
+        stream = io.BytesIO()
+        written = write_blocks(stream, bars, block_size=100)
+        self.assertEqual(written, len(stream.getvalue()))
+
+        stream.seek(0)
+        self.assertEqual(read_blocks(stream).to_dict(), bars.to_dict())
+        stream.seek(0)
+        start_time, end_time = int(bars.timestamps[250]), int(bars.timestamps[420])
+        self.assertEqual(read_blocks(stream, start_time, end_time).to_dict(), bars[250:421].to_dict())
+
+    def test_encode_bar_compressed(self):
+        bar = rounded_bars(1)[0]
+        key, value = encode_bar(bar, ENCODING_COMPRESSED)
+
+        self.assertEqual(key, str(bar[hbc.OHLCV_TIMESTAMP]).encode('utf-8'))
+        self.assertEqual(decode_block(value)[0], bar)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import unittest
+import numpy as np
+from hist_market_data.bar_encoding import (
+    STRUCT_DTYPE,
+    encode_json_records,
+    encode_struct_records,
+    decode_struct_record,
+    encode_batch,
+    decode_batch,
+)
+from hist_market_data.tests.test_ohclv_data import make_bars
+
+
+class TestBarEncoding(unittest.TestCase):
+
+    def setUp(self):
+        self.bars = make_bars(50)
+
+    def test_struct_records_round_trip(self):
+        keys, values = encode_struct_records(self.bars, 10, 20)
+
+        self.assertEqual(len(values), 10)
+        self.assertTrue(all(len(value) == STRUCT_DTYPE.itemsize for value in values))
+        self.assertEqual(keys[0], str(self.bars.timestamps[10]).encode('utf-8'))
+        decoded = decode_struct_record(values[3])
+        self.assertEqual(decoded['timestamp'], self.bars.timestamps[13])
+        self.assertEqual(decoded['close'], self.bars.close[13])
+
+    def test_json_records_match_struct_records(self):
+        _, json_values = encode_json_records(self.bars, 0, 5)
+        _, struct_values = encode_struct_records(self.bars, 0, 5)
+        for json_value, struct_value in zip(json_values, struct_values):
+            self.assertEqual(json.loads(json_value), decode_struct_record(struct_value))
+
+    def test_json_records_include_extra_columns(self):
+        sma = np.full(len(self.bars), np.nan)
+        sma[2:] = 1.5
+        _, values = encode_json_records(self.bars, 1, 4, {'sma': sma})
+        self.assertEqual([json.loads(value)['sma'] for value in values], [None, 1.5, 1.5])
+
+    def test_batch_round_trip(self):
+        decoded = decode_batch(encode_batch(self.bars, 5, 45))
+        np.testing.assert_array_equal(decoded.timestamps, self.bars.timestamps[5:45])
+        np.testing.assert_array_equal(decoded.volume, self.bars.volume[5:45])
+
+    def test_batch_rejects_unknown_message(self):
+        with self.assertRaises(ValueError):
+            decode_batch(b'XXXX' + bytes(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from unittest import mock
+from hist_market_data.bar_cache import BarCache
+from hist_market_data.bar_store import BarStore
+from hist_market_data.ohclv_data import OhclvData
+from hist_market_data import hist_bar_const as hbc
+from hist_market_data.tests.test_ohclv_data import make_bars
+
+
+class TestBarStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BarStore(self.tmp.name, 'binance', index_stride=8)
+        self.bars = make_bars(100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_append_and_range_load(self):
+        self.assertEqual(self.store.append('BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[:37]), 37)
+        self.assertEqual(self.store.append('BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[30:]), 63)
+
+        loaded = self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE)
+        self.assertEqual(loaded.to_dict(), self.bars.to_dict())
+
+        ts = self.bars.timestamps
+        for lo, hi in [(0, 99), (5, 5), (8, 16), (17, 64), (63, 99)]:
+            selected = self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE, ts[lo], ts[hi])
+            self.assertEqual(selected.timestamps.tolist(), ts[lo:hi + 1].tolist())
+        self.assertEqual(len(self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE, ts[-1] + 1)), 0)
+        self.assertEqual(len(self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE, end_time=ts[0] - 1)), 0)
+
+    def test_uncommitted_tail_is_ignored_and_discarded(self):
+        self.store.append('BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[:10])
+        # Simulate a crash after writing data but before committing the meta file
+        partition = self.store.partition_dir('BTCUSDT', hbc.INTERVAL_1MINUTE)
+        with open(os.path.join(partition, f'{hbc.OHLCV_CLOSE}.0.bin'), 'ab') as f:
+            f.write(b'\xff' * 20)
+
+        self.assertEqual(len(self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE)), 10)
+        self.store.append('BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[10:20])
+        np.testing.assert_array_equal(self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE).close, self.bars.close[:20])
+
+    def test_write_replaces_partition(self):
+        self.store.append('BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[50:])
+        view = self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE)
+        self.store.write('BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars)
+
+        self.assertEqual(self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE).to_dict(), self.bars.to_dict())
+        # Views of the previous generation stay valid
+        np.testing.assert_array_equal(view.close, self.bars.close[50:])
+
+    def test_replace_tail_revises_last_bar_in_place(self):
+        self.store.append('BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[:60])
+        revised = OhclvData(self.bars[59:].to_dict())
+        revised.close[:] = -1.0
+
+        self.assertEqual(self.store.replace_tail('BTCUSDT', hbc.INTERVAL_1MINUTE, revised), 41)
+        loaded = self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE)
+        self.assertEqual(loaded.timestamps.tolist(), self.bars.timestamps.tolist())
+        self.assertEqual(loaded.close.tolist(), self.bars.close[:59].tolist() + [-1.0] * 41)
+        self.assertEqual(self.store._read_meta(self.store.partition_dir('BTCUSDT', hbc.INTERVAL_1MINUTE))['generation'], 0)
+        # The index covers the replaced rows too
+        ts = self.bars.timestamps
+        self.assertEqual(self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE, ts[70], ts[90]).timestamps.tolist(), ts[70:91].tolist())
+        self.assertEqual(self.store.last_timestamp('BTCUSDT', hbc.INTERVAL_1MINUTE), ts[-1])
+
+    def test_replace_tail_keeps_earlier_views_of_replaced_rows(self):
+        self.store.append('BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[:60])
+        view = self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE)
+        revised = OhclvData(self.bars[55:].to_dict())
+        revised.close[:] = -1.0
+
+        self.store.replace_tail('BTCUSDT', hbc.INTERVAL_1MINUTE, revised)
+        loaded = self.store.load('BTCUSDT', hbc.INTERVAL_1MINUTE)
+        self.assertEqual(loaded.close.tolist(), self.bars.close[:55].tolist() + [-1.0] * 45)
+        self.assertEqual(self.store._read_meta(self.store.partition_dir('BTCUSDT', hbc.INTERVAL_1MINUTE))['generation'], 1)
+        np.testing.assert_array_equal(view.close, self.bars.close[:60])
+
+
+class TestBarCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = BarCache(self.tmp.name)
+        self.bars = make_bars(100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_refresh_overlapping_tail_does_not_rewrite_partition(self):
+        ts = self.bars.timestamps
+        self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[:60], [(int(ts[0]), int(ts[59]))])
+        store = self.cache._store('fake')
+        with mock.patch.object(store, 'write', side_effect=AssertionError('rewrote the partition')):
+            # Refreshes start at the last stored bar, which was still forming
+            self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[59:], [(int(ts[59]), int(ts[99]))])
+            # A gap fill earlier in history keeps the bars after it
+            self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[10:20], [(int(ts[10]), int(ts[19]))])
+
+        self.assertEqual(self.cache.load('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE).to_dict(), self.bars.to_dict())
+        self.assertEqual(self.cache.missing_ranges('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, int(ts[0]), int(ts[99])), [])
+
+    def test_gap_fill_keeps_earlier_views(self):
+        ts = self.bars.timestamps
+        self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[10:], [(int(ts[10]), int(ts[99]))])
+        view = self.cache.load('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE)
+
+        self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, self.bars[:10], [(int(ts[0]), int(ts[9]))])
+
+        np.testing.assert_array_equal(view.timestamps, ts[10:])
+        self.assertEqual(self.cache.load('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE).to_dict(), self.bars.to_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
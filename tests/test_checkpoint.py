@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+import numpy as np
+from hist_market_data.checkpoint import CheckpointStore
+from hist_market_data.bar_encoding import ENCODING_BATCH, ENCODING_COMPRESSED, ENCODING_JSON
+from hist_market_data.benchmarks.replay import ReplayHistApi, ReplayWsApi, REPLAY_EXCHANGE
+from hist_market_data.benchmarks.synthetic import StubAdminClient, StubProducer, _StubMessage
+from hist_market_data.indicators import EMA, SMA, VWAP, IndicatorEngine
+from hist_market_data.ohclv_data import OhclvData
+from hist_market_data.tests.test_ohclv_data import make_bars, MINUTE
+from hist_market_data import hist_bar_const as hbc
+
+
+class TestCheckpointStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'state', 'checkpoints.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_advances_monotonically_and_persists(self):
+        store = CheckpointStore(self.path, flush_interval=0)
+        store.advance('t', 'AAPL', '1m', 2000)
+        store.advance('t', 'AAPL', '1m', 1000)
+        store.advance('t', 'AAPL', '1h', 500)
+
+        reopened = CheckpointStore(self.path)
+        self.assertEqual(reopened.get('t', 'AAPL', '1m'), 2000)
+        self.assertEqual(reopened.get('t', 'AAPL', '1h'), 500)
+        self.assertIsNone(reopened.get('t', 'MSFT', '1m'))
+
+    def test_failed_bar_holds_checkpoint(self):
+        store = CheckpointStore(self.path, flush_interval=0)
+        store.advance('t', 'AAPL', '1m', 1000)
+        store.hold('t', 'AAPL', '1m', 2000)
+        store.advance('t', 'AAPL', '1m', 3000)
+        store.advance('t', 'AAPL', '1m', 1500)
+        self.assertEqual(CheckpointStore(self.path).get('t', 'AAPL', '1m'), 1500)
+
+    def test_writes_are_throttled_until_flush(self):
+        store = CheckpointStore(self.path, flush_interval=3600)
+        store.advance('t', 'AAPL', '1m', 1000)
+        self.assertFalse(os.path.exists(self.path))
+        store.flush()
+        self.assertEqual(CheckpointStore(self.path).get('t', 'AAPL', '1m'), 1000)
+
+
+class TestDataServiceCheckpoints(unittest.TestCase):
+
+    def setUp(self):
+        from hist_market_data.main import DataService
+        self.tmp = tempfile.TemporaryDirectory()
+        self.hist_api = ReplayHistApi({})
+        self.service = DataService(REPLAY_EXCHANGE, None, None, batch_size=100,
+                                   checkpoint_path=os.path.join(self.tmp.name, 'checkpoints.json'),
+                                   producer=StubProducer(), admin_client=StubAdminClient(), hist_api=self.hist_api)
+
+    def tearDown(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.service.close()
+        self.tmp.cleanup()
+
+    def test_closed_services_release_their_gauges(self):
+        from hist_market_data.main import DataService
+        from hist_market_data.metrics import REGISTRY
+        producer = unittest.mock.MagicMock()
+        producer.__len__.return_value = 7
+        newer = DataService(REPLAY_EXCHANGE, None, None, producer=producer, admin_client=StubAdminClient(),
+                            hist_api=ReplayHistApi({}))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.service.close()
+            # The newer service still reports its own producer
+            self.assertEqual(REGISTRY.gauge('kafka_producer_queue_depth').value, 7)
+            newer.close()
+
+        self.assertNotIn('kafka_producer_queue_depth', [name for name, _, _, _ in REGISTRY.collect()])
+
+    def test_resume_time_follows_checkpoint(self):
+        self.assertEqual(self.service._resume_time('t', 'AAPL', '1m', 1000), 1000)
+        self.service.checkpoints.advance('t', 'AAPL', '1m', 5000)
+        self.assertEqual(self.service._resume_time('t', 'AAPL', '1m', None), 5000)
+        self.assertEqual(self.service._resume_time('t', 'AAPL', '1m', 1000), 5000)
+        self.assertEqual(self.service._resume_time('t', 'AAPL', '1m', 9000), 9000)
+
+    def test_acknowledged_bars_advance_checkpoint(self):
+        bars = make_bars(250)
+        for encoding in (ENCODING_JSON, ENCODING_BATCH, ENCODING_COMPRESSED):
+            topic = f'bars.{encoding}'
+            self.service.encoding = encoding
+            self.service._resume_time(topic, 'AAPL', '1m', None)
+            self.service.publish_bars(topic, bars)
+            self.service.producer.flush()
+            self.assertEqual(self.service.checkpoints.get(topic, 'AAPL', '1m'), bars.timestamps[-1])
+
+    def test_checkpoint_errors_do_not_escape_delivery_reports(self):
+        self.service._resume_time('t', 'AAPL', '1m', None)
+        self.service.checkpoints.flush_interval = 0
+        failing_write = unittest.mock.patch.object(self.service.checkpoints, '_write', side_effect=OSError('disk full'))
+
+        with failing_write, contextlib.redirect_stdout(io.StringIO()) as output:
+            self.service._checkpoint_delivery(None, _StubMessage('t', b'1000', b''))
+            self.service._checkpoint_delivery(None, _StubMessage('t', b'not-a-timestamp', b''))
+
+        self.assertEqual(self.service.checkpoints.get('t', 'AAPL', '1m'), 1000)
+        self.assertEqual(output.getvalue().count('Failed to checkpoint'), 2)
+
+    def test_indicators_resume_with_warm_up_history(self):
+        # The daily VWAP session starts at the 100th bar
+        bars = make_bars(200, start=1672531200000 - 100 * MINUTE)
+        self.hist_api.bars['AAPL'] = bars
+        self.service.ws_api_manager.register_api(REPLAY_EXCHANGE, ReplayWsApi({}))
+        self.service.checkpoints.advance('t', 'AAPL', '1m', int(bars.timestamps[150]))
+        published = []
+        produce = self.service.producer.produce
+
+        def record(topic, value=None, **kwargs):
+            published.append(json.loads(value))
+            produce(topic, value, **kwargs)
+        self.service.producer.produce = record
+
+        def indicators():
+            return {'sma': SMA(20), 'ema': EMA(5), 'vwap': VWAP()}
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(self.service.subscribe_ohlcv('AAPL', '1m', 't', indicators=indicators()))
+
+        expected = IndicatorEngine(indicators()).compute(bars)
+        self.assertEqual([bar[hbc.OHLCV_TIMESTAMP] for bar in published], bars.timestamps[150:].tolist())
+        for name, values in expected.items():
+            for bar, value in zip(published, values[150:].tolist()):
+                self.assertAlmostEqual(bar[name], value, places=6, msg=name)
+
+    def test_indicator_warm_up_spans_market_closures(self):
+        bars = make_bars(200)
+        # The market was closed for a weekend before each of the last 60 bars
+        timestamps = bars.timestamps.copy()
+        timestamps[140:] += 2 * 24 * 60 * MINUTE
+        bars = OhclvData({**bars.to_dict(), hbc.OHLCV_TIMESTAMP: timestamps})
+        self.hist_api.bars['AAPL'] = bars
+        self.service.ws_api_manager.register_api(REPLAY_EXCHANGE, ReplayWsApi({}))
+        self.service.checkpoints.advance('t', 'AAPL', '1m', int(timestamps[150]))
+        published = []
+        produce = self.service.producer.produce
+
+        def record(topic, value=None, **kwargs):
+            published.append(json.loads(value))
+            produce(topic, value, **kwargs)
+        self.service.producer.produce = record
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(self.service.subscribe_ohlcv('AAPL', '1m', 't', indicators={'sma': SMA(30)}))
+
+        expected = IndicatorEngine({'sma': SMA(30)}).compute(bars)['sma']
+        self.assertEqual([bar[hbc.OHLCV_TIMESTAMP] for bar in published], timestamps[150:].tolist())
+        np.testing.assert_allclose([bar['sma'] for bar in published], expected[150:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import tempfile
+import unittest
+from hist_market_data.bar_cache import BarCache
+from hist_market_data.hist_api import HistApi
+from hist_market_data.ohclv_data import OhclvData
+from hist_market_data import hist_bar_const as hbc
+
+MINUTE = hbc.INTERVAL_MS[hbc.INTERVAL_1MINUTE]
+
+
+class FakeApi:
+    """ Serves a contiguous 1m series, honouring the page limit. """
+    exchange = 'fake'
+    page_limit = 10
+
+    def __init__(self):
+        self.calls = []
+
+    def get_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        self.calls.append((start_time, end_time))
+        # Overlap by one bar on each side to exercise de-duplication
+        timestamps = list(range(start_time - MINUTE, end_time + 2 * MINUTE, MINUTE))[:self.page_limit + 2]
+        # Return the page newest first to exercise sorting
+        timestamps = timestamps[::-1]
+        return OhclvData({
+            hbc.OHLCV_TIMESTAMP: timestamps,
+            hbc.OHLCV_OPEN: [float(ts) for ts in timestamps],
+            hbc.OHLCV_HIGH: [float(ts) for ts in timestamps],
+            hbc.OHLCV_LOW: [float(ts) for ts in timestamps],
+            hbc.OHLCV_CLOSE: [float(ts) for ts in timestamps],
+            hbc.OHLCV_VOLUME: [1.0] * len(timestamps),
+        })
+
+    async def aget_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        await asyncio.sleep(0)
+        return self.get_hist_bars(symbol, interval, start_time, end_time)
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class TestHistApi(unittest.TestCase):
+
+    def setUp(self):
+        self.hist_api = HistApi('binance', max_workers=4)
+        self.fake_api = FakeApi()
+        self.hist_api.api = self.fake_api
+
+    def tearDown(self):
+        self.hist_api.close()
+
+    def test_split_range_uses_page_limit(self):
+        chunks = self.hist_api._split_range(hbc.INTERVAL_1MINUTE, 0, 25 * MINUTE)
+        self.assertEqual(chunks, [(0, 10 * MINUTE - 1), (10 * MINUTE, 20 * MINUTE - 1), (20 * MINUTE, 25 * MINUTE)])
+
+    def test_get_hist_bars_stitches_pages(self):
+        start_time, end_time = 1672531200000, 1672531200000 + 99 * MINUTE
+        hist_data = self.hist_api.get_hist_bars('BTCUSDT', hbc.INTERVAL_1MINUTE, start_time, end_time)
+
+        self.assertEqual(len(self.fake_api.calls), 10)
+        expected = list(range(start_time, end_time + 1, MINUTE))
+        self.assertEqual(hist_data.timestamps.tolist(), expected)
+        self.assertEqual(hist_data.close.tolist(), [float(ts) for ts in expected])
+
+    def test_aget_hist_bars_matches_sync(self):
+        start_time, end_time = 1672531200000, 1672531200000 + 99 * MINUTE
+        expected = self.hist_api.get_hist_bars('BTCUSDT', hbc.INTERVAL_1MINUTE, start_time, end_time)
+        hist_data = asyncio.run(self.hist_api.aget_hist_bars('BTCUSDT', hbc.INTERVAL_1MINUTE, start_time, end_time))
+
+        self.assertEqual(hist_data.to_dict(), expected.to_dict())
+
+    def test_unsupported_interval_range(self):
+        with self.assertRaises(ValueError):
+            self.hist_api.get_hist_bars('BTCUSDT', '3m', 0, MINUTE)
+
+    def test_cache_fetches_only_missing_ranges(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.hist_api.cache = BarCache(cache_dir)
+            start_time = 1672531200000
+            self.hist_api.get_hist_bars('BTCUSDT', hbc.INTERVAL_1MINUTE, start_time, start_time + 19 * MINUTE)
+            self.fake_api.calls.clear()
+
+            hist_data = self.hist_api.get_hist_bars('BTCUSDT', hbc.INTERVAL_1MINUTE, start_time + 10 * MINUTE, start_time + 29 * MINUTE)
+
+            self.assertEqual(self.fake_api.calls, [(start_time + 20 * MINUTE, start_time + 29 * MINUTE)])
+            self.assertEqual(hist_data.timestamps.tolist(), list(range(start_time + 10 * MINUTE, start_time + 30 * MINUTE, MINUTE)))
+            self.assertEqual(self.hist_api.cache.missing_ranges('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, start_time, start_time + 29 * MINUTE), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import unittest
+import numpy as np
+from hist_market_data.REST_api.binance_api import BinanceApi
+from hist_market_data.REST_api.okx_api import OkxApi
+from hist_market_data.REST_api.xt_api import XtApi
+from hist_market_data.REST_api.http_api import HttpApi, decode_kline_array
+from hist_market_data.ohclv_data import OhclvData
+from hist_market_data import hist_bar_const as hbc
+
+BINANCE_PAYLOAD = [
+    [1672531200000, "16541.77", "16544.76", "16538.45", "16543.67", "83.08", 1672531259999, "1374268.5", 1753, "50.6", "837240.3", "0"],
+    [1672531260000, "16543.04", "16544.41", "16538.48", "16539.31", "49.04", 1672531319999, "811246.1", 1418, "20.0", "331043.5", "0"],
+]
+EXPECTED = {
+    hbc.OHLCV_TIMESTAMP: [1672531200000, 1672531260000],
+    hbc.OHLCV_OPEN: [16541.77, 16543.04],
+    hbc.OHLCV_HIGH: [16544.76, 16544.41],
+    hbc.OHLCV_LOW: [16538.45, 16538.48],
+    hbc.OHLCV_CLOSE: [16543.67, 16539.31],
+    hbc.OHLCV_VOLUME: [83.08, 49.04],
+}
+
+
+class TestHttpApiParsing(unittest.TestCase):
+
+    def test_adapter_without_request_builder_fails_on_creation(self):
+        class IncompleteApi(HttpApi):
+            exchange = 'incomplete'
+
+        with self.assertRaises(TypeError):
+            IncompleteApi()
+
+    def test_binance_raw_fast_path(self):
+        content = json.dumps(BINANCE_PAYLOAD).encode('utf-8')
+        parsed = BinanceApi()._parse_content(content)
+
+        self.assertEqual(OhclvData(parsed).to_dict(), EXPECTED)
+        self.assertEqual(parsed[hbc.OHLCV_TIMESTAMP].dtype, np.int64)
+        # Parsed columns are adopted without copies
+        ohlcv = OhclvData(parsed)
+        self.assertTrue(np.shares_memory(ohlcv.open, parsed[hbc.OHLCV_OPEN]))
+        self.assertTrue(np.shares_memory(ohlcv.volume, parsed[hbc.OHLCV_VOLUME]))
+
+    def test_binance_fast_path_matches_json_path(self):
+        content = json.dumps(BINANCE_PAYLOAD).encode('utf-8')
+        api = BinanceApi()
+        fast = OhclvData(api._parse_content(content)).to_dict()
+        slow = OhclvData(api._parse_data(json.loads(content))).to_dict()
+        self.assertEqual(fast, slow)
+
+    def test_decode_kline_array_rejects_other_payloads(self):
+        self.assertIsNone(decode_kline_array(b'{"code": -1121, "msg": "Invalid symbol."}', 12))
+        self.assertIsNone(decode_kline_array(b'[[1, "a"]]', 2))
+        self.assertEqual(decode_kline_array(b'[]', 12).shape, (0, 12))
+
+    def test_okx_rows_are_reversed(self):
+        rows = [[str(v) for v in row[:6]] + ['0', '0', '1'] for row in BINANCE_PAYLOAD[::-1]]
+        content = json.dumps({'code': '0', 'msg': '', 'data': rows}).encode('utf-8')
+        self.assertEqual(OhclvData(OkxApi()._parse_content(content)).to_dict(), EXPECTED)
+
+    def test_xt_rows(self):
+        rows = [{'t': row[0], 'o': row[1], 'h': row[2], 'l': row[3], 'c': row[4], 'q': row[5], 'v': row[7]}
+                for row in BINANCE_PAYLOAD[::-1]]
+        content = json.dumps({'rc': 0, 'mc': 'SUCCESS', 'result': rows}).encode('utf-8')
+        self.assertEqual(OhclvData(XtApi()._parse_content(content)).to_dict(), EXPECTED)
+
+    def test_exchange_errors_raise(self):
+        with self.assertRaises(ValueError):
+            OkxApi()._parse_content(b'{"code": "51001", "msg": "Instrument ID does not exist"}')
+
+
+if __name__ == '__main__':
+    unittest.main()
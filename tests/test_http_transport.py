@@ -0,0 +1,114 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+import requests
+from hist_market_data.REST_api.http_transport import HttpTransport, RateLimiter, request_priority
+from hist_market_data import hist_bar_const as hbc
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_live_requests_overtake_backfill(self):
+        limiter = RateLimiter(capacity=1, refill_per_second=20)
+        limiter.acquire()  # drain the bucket
+        order = []
+
+        def worker(name, priority, delay):
+            time.sleep(delay)
+            limiter.acquire(1, priority)
+            order.append(name)
+
+        threads = [
+            threading.Thread(target=worker, args=('backfill-1', hbc.PRIORITY_BACKFILL, 0)),
+            threading.Thread(target=worker, args=('backfill-2', hbc.PRIORITY_BACKFILL, 0.001)),
+            threading.Thread(target=worker, args=('live', hbc.PRIORITY_LIVE, 0.002)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order[0], 'live')
+
+    def test_refill_rate_is_respected(self):
+        limiter = RateLimiter(capacity=2, refill_per_second=50)
+        started = time.monotonic()
+        for _ in range(7):
+            limiter.acquire()
+        # 2 tokens are available immediately, the other 5 refill at 50 per second
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+
+class TestHttpTransport(unittest.TestCase):
+
+    def make_response(self, status, payload=None, headers=None):
+        return MagicMock(status_code=status, headers=headers or {}, content=json.dumps(payload).encode('utf-8'))
+
+    def test_retries_throttled_requests(self):
+        transport = HttpTransport(backoff_base=0.001, rate_limits={'test': (10, 1000.0)})
+        transport.session = MagicMock()
+        transport.session.get.side_effect = [
+            self.make_response(429, headers={'Retry-After': '0.01'}),
+            self.make_response(503),
+            self.make_response(200, [1, 2, 3]),
+        ]
+
+        with request_priority(hbc.PRIORITY_LIVE):
+            self.assertEqual(transport.get_json('test', 'https://example.com'), [1, 2, 3])
+        self.assertEqual(transport.session.get.call_count, 3)
+
+    def test_retries_timed_out_requests(self):
+        transport = HttpTransport(backoff_base=0.001)
+        transport.session = MagicMock()
+        transport.session.get.side_effect = [requests.ReadTimeout('read timed out'), self.make_response(200, [1])]
+
+        self.assertEqual(transport.get_json('test', 'https://example.com'), [1])
+        self.assertEqual(transport.session.get.call_count, 2)
+
+    def test_retries_timed_out_async_requests(self):
+        transport = HttpTransport(backoff_base=0.001)
+        session = FakeAsyncSession([asyncio.TimeoutError(), FakeAsyncResponse(200, b'[1]')])
+        transport._get_async_session = lambda: session
+
+        self.assertEqual(asyncio.run(transport.aget_json('test', 'https://example.com')), [1])
+        self.assertEqual(session.calls, 2)
+
+
+class FakeAsyncResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.headers = {}
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def read(self):
+        return self.body
+
+
+class FakeAsyncSession:
+    """ Returns or raises the given outcomes in order, like an aiohttp.ClientSession.get. """
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, params=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+if __name__ == '__main__':
+    unittest.main()
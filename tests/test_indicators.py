@@ -0,0 +1,110 @@
+import threading
+import time
+import unittest
+import numpy as np
+import pandas as pd
+from hist_market_data.indicators import ATR, EMA, SMA, VWAP, Indicator, IndicatorEngine, Returns, RollingHigh, RollingLow
+from hist_market_data import hist_bar_const as hbc
+from hist_market_data.tests.test_ohclv_data import make_bars
+
+
+def make_indicators():
+    return {
+        'sma': SMA(20),
+        'ema': EMA(12),
+        'atr': ATR(14),
+        'vwap': VWAP(session_ms=hbc.INTERVAL_MS[hbc.INTERVAL_1HOUR]),
+        'high': RollingHigh(30),
+        'low': RollingLow(30),
+        'returns': Returns(),
+        'log_returns': Returns(log=True),
+    }
+
+
+class TestIndicators(unittest.TestCase):
+
+    def setUp(self):
+        self.bars = make_bars(500)
+        self.frame = self.bars.to_df()
+
+    def test_batch_matches_pandas(self):
+        results = IndicatorEngine(make_indicators()).compute(self.bars)
+        close = self.frame['close']
+
+        np.testing.assert_allclose(results['sma'], close.rolling(20).mean(), equal_nan=True)
+        np.testing.assert_allclose(results['ema'], close.ewm(span=12, adjust=False).mean())
+        np.testing.assert_allclose(results['high'], self.frame['high'].rolling(30).max(), equal_nan=True)
+        np.testing.assert_allclose(results['low'], self.frame['low'].rolling(30).min(), equal_nan=True)
+        np.testing.assert_allclose(results['returns'], close.pct_change(), equal_nan=True)
+
+        typical = (self.frame['high'] + self.frame['low'] + close) / 3
+        session = self.frame.index.floor('1h')
+        expected_vwap = (typical * self.frame['volume']).groupby(session).cumsum() / self.frame['volume'].groupby(session).cumsum()
+        np.testing.assert_allclose(results['vwap'], expected_vwap)
+
+        prev_close = close.shift()
+        true_range = pd.concat([self.frame['high'] - self.frame['low'], (self.frame['high'] - prev_close).abs(),
+                                (self.frame['low'] - prev_close).abs()], axis=1).max(axis=1)
+        np.testing.assert_allclose(results['atr'], true_range.ewm(alpha=1 / 14, adjust=False).mean())
+
+    def test_incremental_matches_batch(self):
+        expected = IndicatorEngine(make_indicators()).compute(self.bars)
+        engine = IndicatorEngine(make_indicators())
+        engine.compute(self.bars[:100])
+
+        for row in range(99, len(self.bars)):
+            bar = self.bars[row]
+            # A revision of the forming bar replaces it rather than advancing the state
+            engine.update(dict(bar, close=bar['close'] + 5, high=bar['high'] + 5))
+            values = engine.update(bar)
+            for name, value in values.items():
+                if np.isnan(expected[name][row]):
+                    self.assertIsNone(value, name)
+                else:
+                    self.assertAlmostEqual(value, expected[name][row], places=9, msg=name)
+
+    def test_live_updates_from_empty_history(self):
+        engine = IndicatorEngine({'sma': SMA(3), 'high': RollingHigh(3), 'returns': Returns()})
+        engine.compute(self.bars[:0])
+        values = [engine.update(self.bars[row]) for row in range(5)]
+
+        self.assertEqual(values[0], {'sma': None, 'high': None, 'returns': None})
+        self.assertAlmostEqual(values[4]['sma'], self.bars.close[2:5].mean())
+        self.assertEqual(values[4]['high'], self.bars.high[2:5].max())
+        self.assertEqual(engine.update(self.bars[1]), {})
+
+    def test_indicator_without_live_update_fails_on_creation(self):
+        class BatchOnly(Indicator):
+            def compute(self, ohlcv):
+                return ohlcv.close
+
+        with self.assertRaises(TypeError):
+            BatchOnly()
+
+    def test_concurrent_updates_are_serialized(self):
+        class Overlap(SMA):
+            """ Counts calls that start while another one is still running. """
+            active = 0
+            overlaps = 0
+
+            def value_with(self, bar):
+                Overlap.active += 1
+                Overlap.overlaps += Overlap.active > 1
+                time.sleep(0.001)
+                Overlap.active -= 1
+                return super().value_with(bar)
+
+        engine = IndicatorEngine({'sma': Overlap(3)})
+        engine.compute(self.bars[:10])
+        # The WebSocket thread and the event loop both publish the forming bar
+        threads = [threading.Thread(target=lambda: [engine.update(self.bars[9]) for _ in range(20)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Overlap.overlaps, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
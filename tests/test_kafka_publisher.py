@@ -0,0 +1,161 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from hist_market_data.kafka_publisher import (
+    KafkaPublisher,
+    PublishQueue,
+    POLICY_BLOCK,
+    POLICY_DROP_OLDEST,
+    POLICY_COALESCE,
+    produce_with_retry,
+)
+from hist_market_data.bar_encoding import encode_bar
+from hist_market_data.benchmarks.synthetic import StubProducer
+from hist_market_data.metrics import MetricsRegistry
+from hist_market_data import hist_bar_const as hbc
+
+
+def bar(timestamp, close=1.0):
+    return {
+        hbc.OHLCV_TIMESTAMP: timestamp,
+        hbc.OHLCV_OPEN: 1.0,
+        hbc.OHLCV_HIGH: 1.0,
+        hbc.OHLCV_LOW: 1.0,
+        hbc.OHLCV_CLOSE: close,
+        hbc.OHLCV_VOLUME: 1.0,
+    }
+
+
+class TestPublishQueue(unittest.TestCase):
+
+    def test_drop_oldest(self):
+        queue = PublishQueue(maxsize=2, policy=POLICY_DROP_OLDEST)
+        for ts in range(3):
+            queue.put('t', bar(ts))
+
+        self.assertEqual([data[hbc.OHLCV_TIMESTAMP] for _, data in queue.get_batch(10, 0)], [1, 2])
+        self.assertEqual(queue.stats()['dropped'], 1)
+
+    def test_coalesce_updates_forming_bar_in_place(self):
+        queue = PublishQueue(maxsize=10, policy=POLICY_COALESCE)
+        queue.put('t', bar(0, close=1.0))
+        queue.put('t', bar(1, close=1.0))
+        queue.put('t', bar(0, close=2.0))
+
+        batch = queue.get_batch(10, 0)
+        self.assertEqual([(data[hbc.OHLCV_TIMESTAMP], data[hbc.OHLCV_CLOSE]) for _, data in batch], [(0, 2.0), (1, 1.0)])
+        self.assertEqual(queue.stats()['coalesced'], 1)
+
+        # Once published, a further update for the same bar is queued again
+        queue.put('t', bar(0, close=3.0))
+        self.assertEqual(len(queue), 1)
+
+    def test_block_times_out(self):
+        queue = PublishQueue(maxsize=1, policy=POLICY_BLOCK, block_timeout=0.01)
+        self.assertTrue(queue.put('t', bar(0)))
+        self.assertFalse(queue.put('t', bar(1)))
+        self.assertEqual(queue.stats()['dropped'], 1)
+
+    def test_block_waits_for_space(self):
+        queue = PublishQueue(maxsize=1, policy=POLICY_BLOCK)
+        queue.put('t', bar(0))
+        producer = threading.Thread(target=queue.put, args=('t', bar(1)))
+        producer.start()
+
+        self.assertEqual(len(queue.get_batch(10, 0)), 1)
+        producer.join(1)
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(len(queue.get_batch(10, 1)), 1)
+
+
+class TestKafkaPublisher(unittest.TestCase):
+
+    def test_drains_queue_in_micro_batches(self):
+        producer = MagicMock()
+        queue = PublishQueue()
+        publisher = KafkaPublisher(producer, queue, lambda data: encode_bar(data) + ([],), batch_size=4)
+        publisher.start()
+        for ts in range(10):
+            queue.put('t', bar(ts))
+        publisher.stop(timeout=5)
+
+        self.assertFalse(publisher.is_alive())
+        self.assertEqual(publisher.stats.produced, 10)
+        self.assertEqual(producer.produce.call_count, 10)
+        self.assertEqual(producer.produce.call_args.kwargs['key'], b'9')
+
+    def test_survives_encode_and_callback_errors(self):
+        def encode(data):
+            if data[hbc.OHLCV_TIMESTAMP] == 1:
+                raise TypeError('bad bar')
+            return encode_bar(data) + ([],)
+
+        def delivery_callback(err, msg):
+            raise OSError('disk full')
+
+        producer = StubProducer()
+        queue = PublishQueue(maxsize=2, policy=POLICY_BLOCK)
+        publisher = KafkaPublisher(producer, queue, encode, batch_size=1, delivery_callback=delivery_callback)
+        publisher.start()
+        for ts in range(5):
+            queue.put('t', bar(ts))
+        publisher.stop(timeout=5)
+
+        self.assertFalse(publisher.is_alive())
+        self.assertEqual(producer.messages, 4)
+        self.assertEqual((publisher.stats.produced, publisher.stats.failed), (5, 1))
+        self.assertEqual(publisher.stats.delivered, 4)
+
+    def test_stalled_broker_fails_messages_instead_of_hanging(self):
+        # A producer whose local queue never frees up, like one cut off from the broker
+        producer = StubProducer(queue_limit=0)
+        queue = PublishQueue(maxsize=10, policy=POLICY_BLOCK)
+        publisher = KafkaPublisher(producer, queue, lambda data: encode_bar(data) + ([],))
+        publisher.produce_timeout = 0.2
+        with self.assertRaises(BufferError):
+            produce_with_retry(producer, 't', b'0', b'', [], None, timeout=0.05)
+
+        publisher.start()
+        for ts in range(5):
+            queue.put('t', bar(ts))
+        started = time.monotonic()
+        publisher.stop(timeout=5)
+
+        self.assertFalse(publisher.is_alive())
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(publisher.stats.failed, 5)
+
+    def test_records_latency_metrics(self):
+        registry = MetricsRegistry()
+        queue = PublishQueue()
+        publisher = KafkaPublisher(MagicMock(), queue, lambda data: encode_bar(data) + ([],), registry=registry,
+                                   interval_ms={'t': 60000})
+        publisher.start()
+        queue.put('t', bar(0))
+        publisher.stop(timeout=5)
+
+        msg = MagicMock()
+        msg.topic.return_value = 't'
+        # Opened 90s ago, so closed 30s ago
+        msg.key.return_value = str(int(time.time() * 1000) - 90000).encode('utf-8')
+        msg.latency.return_value = 0.002
+        publisher._on_delivery(None, msg)
+
+        self.assertEqual(registry.histogram('publish_queue_seconds', topic='t').count, 1)
+        self.assertGreater(registry.counter('kafka_bytes_out_total', topic='t').value, 0)
+        self.assertAlmostEqual(registry.histogram('kafka_ack_seconds', topic='t').quantile(0.5), 0.002, delta=0.0002)
+        end_to_end = registry.histogram('live_bar_end_to_end_seconds', topic='t')
+        self.assertEqual(end_to_end.count, 1)
+        # Measured from the bar's close, one interval after its open timestamp
+        self.assertAlmostEqual(end_to_end.quantile(0.5), 30, delta=5)
+        self.assertEqual(publisher.stats.delivered, 1)
+
+        # A forming bar acknowledged before its close is not a lag sample
+        msg.key.return_value = str(int(time.time() * 1000)).encode('utf-8')
+        publisher._on_delivery(None, msg)
+        self.assertEqual(end_to_end.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import time
+import unittest
+import numpy as np
+from hist_market_data.hist_api import HistApi
+from hist_market_data.memory_cache import MemoryBarCache, SingleFlight, BAR_BYTES
+from hist_market_data.ohclv_data import OhclvData
+from hist_market_data.tests.test_hist_api import FakeApi, MINUTE
+from hist_market_data import hist_bar_const as hbc
+
+START = 1672531200000
+
+
+def bars(start_time, count, close=0.0):
+    timestamps = list(range(start_time, start_time + count * MINUTE, MINUTE))
+    return OhclvData({
+        hbc.OHLCV_TIMESTAMP: timestamps,
+        hbc.OHLCV_OPEN: [close] * count,
+        hbc.OHLCV_HIGH: [close] * count,
+        hbc.OHLCV_LOW: [close] * count,
+        hbc.OHLCV_CLOSE: [close] * count,
+        hbc.OHLCV_VOLUME: [1.0] * count,
+    })
+
+
+class SlowFakeApi(FakeApi):
+    """ Holds every request until released, so concurrent callers overlap. """
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def get_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        self.release.wait(5)
+        return super().get_hist_bars(symbol, interval, start_time, end_time)
+
+    async def aget_hist_bars(self, symbol, interval, start_time=None, end_time=None):
+        await asyncio.sleep(0.05)
+        return FakeApi.get_hist_bars(self, symbol, interval, start_time, end_time)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.hist_api = HistApi('binance', max_workers=4)
+        self.fake_api = SlowFakeApi()
+        self.hist_api.api = self.fake_api
+
+    def tearDown(self):
+        self.hist_api.close()
+
+    def test_concurrent_identical_calls_share_one_fetch(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.hist_api.get_hist_bars(
+            'BTCUSDT', hbc.INTERVAL_1MINUTE, START, START + 9 * MINUTE))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        while self.hist_api.single_flight.coalesced < 7:
+            time.sleep(0.001)
+        self.fake_api.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.fake_api.calls), 1)
+        self.assertEqual(len(results), 8)
+        # Callers share the fetched arrays through separate read-only views
+        self.assertEqual(len({id(result) for result in results}), 8)
+        self.assertTrue(all(np.shares_memory(result.close, results[0].close) for result in results))
+        with self.assertRaises(ValueError):
+            results[0].close[0] = 0.0
+
+    def test_errors_reach_every_waiter(self):
+        single_flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ConnectionError('rate limited')
+
+        errors = []
+
+        def call():
+            try:
+                single_flight.do('key', fail)
+            except ConnectionError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call)
+        follower.start()
+        while single_flight.coalesced < 1:
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(len(errors), 2)
+        # Finished calls are not remembered
+        self.assertEqual(single_flight.do('key', lambda: 1), 1)
+
+    def test_concurrent_awaits_share_one_fetch(self):
+        async def run():
+            return await asyncio.gather(*(self.hist_api.aget_hist_bars(
+                'BTCUSDT', hbc.INTERVAL_1MINUTE, START, START + 9 * MINUTE) for _ in range(5)))
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(self.fake_api.calls), 1)
+        self.assertEqual(self.hist_api.single_flight.coalesced, 4)
+        self.assertTrue(all(result.to_dict() == results[0].to_dict() for result in results))
+
+    def test_instances_do_not_share_fetches(self):
+        other = HistApi('binance', max_workers=4)
+        other.api = other_api = SlowFakeApi()
+        self.fake_api.release.set()
+        other_api.release.set()
+        async def run():
+            return await asyncio.gather(*(hist_api.aget_hist_bars('BTCUSDT', hbc.INTERVAL_1MINUTE, START, START + 9 * MINUTE)
+                                          for hist_api in (self.hist_api, other)))
+
+        try:
+            asyncio.run(run())
+        finally:
+            other.close()
+
+        # Each instance may have its own adapter and caches, so neither waits on the other's fetch
+        self.assertEqual((len(self.fake_api.calls), len(other_api.calls)), (1, 1))
+        self.assertEqual(self.hist_api.single_flight.coalesced + other.single_flight.coalesced, 0)
+
+
+class TestMemoryBarCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = MemoryBarCache(ttl=60, clock=lambda: self.now)
+
+    def test_recent_window_fetches_only_the_tail(self):
+        hist_api = HistApi('binance', max_workers=4, memory_cache=self.cache, single_flight=None)
+        fake_api = hist_api.api = FakeApi()
+        end_time = int(time.time() * 1000) // MINUTE * MINUTE - 1
+        try:
+            hist_api.get_hist_bars('BTCUSDT', hbc.INTERVAL_1MINUTE, end_time - 30 * MINUTE + 1, end_time - 5 * MINUTE)
+            fake_api.calls.clear()
+
+            hist_data = hist_api.get_hist_bars('BTCUSDT', hbc.INTERVAL_1MINUTE, end_time - 20 * MINUTE + 1, end_time)
+        finally:
+            hist_api.close()
+
+        self.assertEqual(fake_api.calls, [(end_time - 5 * MINUTE + 1, end_time)])
+        self.assertEqual(hist_data.timestamps.tolist(), list(range(end_time - 20 * MINUTE + 1, end_time, MINUTE)))
+        self.assertEqual(self.cache.missing_ranges('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE,
+                                                   end_time - 30 * MINUTE + 1, end_time), [])
+
+    def test_forming_bar_is_not_cached(self):
+        now = int(time.time() * 1000)
+        forming = now // MINUTE * MINUTE
+        self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, bars(forming - 10 * MINUTE, 11), [(forming - 10 * MINUTE, now)])
+
+        self.assertEqual(self.cache.missing_ranges('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, forming - 10 * MINUTE, now),
+                         [(forming, now)])
+
+    def test_adjacent_ranges_merge_and_refetched_bars_win(self):
+        self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, bars(START + 10 * MINUTE, 10, close=1.0),
+                         [(START + 10 * MINUTE, START + 20 * MINUTE - 1)])
+        head = bars(START, 10, close=2.0)
+        tail = bars(START + 20 * MINUTE, 5, close=3.0)
+        ranges = [(START, START + 10 * MINUTE - 1), (START + 20 * MINUTE, START + 25 * MINUTE - 1)]
+        self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, OhclvData({
+            field: head.to_dict()[field] + tail.to_dict()[field] for field in head.to_dict()}), ranges)
+
+        cached = self.cache.load('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE)
+        self.assertEqual(cached.timestamps.tolist(), list(range(START, START + 25 * MINUTE, MINUTE)))
+        self.assertEqual(cached.close.tolist(), [2.0] * 10 + [1.0] * 10 + [3.0] * 5)
+        self.assertEqual(self.cache.bytes, 25 * BAR_BYTES)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.store('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, bars(START, 10), [(START, START + 10 * MINUTE - 1)])
+        self.now = 59.0
+        self.assertEqual(self.cache.missing_ranges('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE, START, START + 10 * MINUTE - 1), [])
+
+        self.now = 60.0
+        self.assertEqual(len(self.cache.load('fake', 'BTCUSDT', hbc.INTERVAL_1MINUTE)), 0)
+        self.assertEqual((len(self.cache), self.cache.bytes), (0, 0))
+
+    def test_least_recently_used_evicted_by_bytes(self):
+        self.cache.max_bytes = 25 * BAR_BYTES
+        for symbol in ('A', 'B'):
+            self.cache.store('fake', symbol, hbc.INTERVAL_1MINUTE, bars(START, 10), [(START, START + 10 * MINUTE - 1)])
+        self.cache.load('fake', 'A', hbc.INTERVAL_1MINUTE)
+        self.cache.store('fake', 'C', hbc.INTERVAL_1MINUTE, bars(START, 10), [(START, START + 10 * MINUTE - 1)])
+
+        self.assertEqual(list(self.cache._entries), [('fake', 'A', hbc.INTERVAL_1MINUTE), ('fake', 'C', hbc.INTERVAL_1MINUTE)])
+        self.assertEqual((self.cache.bytes, self.cache.evictions), (20 * BAR_BYTES, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
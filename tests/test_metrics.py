@@ -0,0 +1,94 @@
+import unittest
+import urllib.request
+from hist_market_data.metrics import (
+    Histogram,
+    MetricsRegistry,
+    PrometheusExporter,
+    SamplingProfiler,
+    render_prometheus,
+)
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_quantiles_within_bucket_precision(self):
+        histogram = Histogram()
+        for micros in range(1, 100001):
+            histogram.record(micros / 1e6)
+
+        for q in (0.5, 0.9, 0.99):
+            expected = q * 0.1
+            self.assertAlmostEqual(histogram.quantile(q), expected, delta=expected * 0.07)
+        self.assertEqual(histogram.count, 100000)
+
+    def test_clamps_negative_and_oversized_values(self):
+        histogram = Histogram(max_seconds=1.0)
+        histogram.record(-5.0)
+        histogram.record(10.0)
+
+        self.assertEqual(histogram.quantile(0.0), 0.0)
+        self.assertLessEqual(histogram.quantile(1.0), 1.0 * 1.05)
+
+    def test_empty_quantile_is_nan(self):
+        self.assertNotEqual(Histogram().quantile(0.5), Histogram().quantile(0.5))
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_render_prometheus(self):
+        registry = MetricsRegistry()
+        registry.counter('bytes_total', 'Bytes.', topic='a').inc(3)
+        registry.counter('bytes_total', topic='b').inc()
+        registry.gauge('depth', 'Depth.', function=lambda: 7)
+        registry.histogram('latency_seconds', 'Latency.', symbol='AAPL').record(0.001)
+
+        text = render_prometheus(registry, quantiles=(0.5,))
+        self.assertIn('# TYPE bytes_total counter', text)
+        self.assertIn('bytes_total{topic="a"} 3', text)
+        self.assertIn('bytes_total{topic="b"} 1', text)
+        self.assertIn('depth 7', text)
+        self.assertIn('latency_seconds{symbol="AAPL",quantile="0.5"}', text)
+        self.assertIn('latency_seconds_count{symbol="AAPL"} 1', text)
+
+    def test_same_labels_return_same_metric(self):
+        registry = MetricsRegistry()
+        self.assertIs(registry.counter('c', a='1', b='2'), registry.counter('c', b='2', a='1'))
+        with self.assertRaises(ValueError):
+            registry.histogram('c')
+
+    def test_remove(self):
+        registry = MetricsRegistry()
+        registry.gauge('depth', topic='a')
+        registry.gauge('depth', topic='b')
+        registry.remove('depth', topic='a')
+        self.assertEqual([labels for labels, _ in registry.collect()[0][3]], [(('topic', 'b'),)])
+
+        registry.remove('depth', topic='b')
+        self.assertEqual(registry.collect(), [])
+
+
+class TestPrometheusExporter(unittest.TestCase):
+
+    def test_serves_metrics_and_switches_profiling(self):
+        registry = MetricsRegistry()
+        registry.counter('requests_total').inc()
+        profiler = SamplingProfiler()
+        exporter = PrometheusExporter(registry, port=0, profiler=profiler)
+        exporter.start()
+        try:
+            base = f'http://127.0.0.1:{exporter.port}'
+            with urllib.request.urlopen(f'{base}/metrics') as response:
+                self.assertIn('requests_total 1', response.read().decode())
+            urllib.request.urlopen(f'{base}/profile?rate=1').close()
+            self.assertEqual(profiler.sample_rate, 1.0)
+
+            with profiler.sample():
+                sum(range(1000))
+            with urllib.request.urlopen(f'{base}/profile') as response:
+                self.assertIn('function calls', response.read().decode())
+        finally:
+            exporter.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
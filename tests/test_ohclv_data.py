@@ -0,0 +1,155 @@
+import unittest
+import unittest.mock
+import numpy as np
+import pandas as pd
+from hist_market_data.ohclv_data import OhclvData, KEEP_FIRST
+from hist_market_data import hist_bar_const as hbc
+
+MINUTE = hbc.INTERVAL_MS[hbc.INTERVAL_1MINUTE]
+
+
+def make_bars(n, start=1672531200000, step=MINUTE, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(size=n))
+    return OhclvData({
+        hbc.OHLCV_TIMESTAMP: start + np.arange(n, dtype=np.int64) * step,
+        hbc.OHLCV_OPEN: close + rng.normal(size=n),
+        hbc.OHLCV_HIGH: close + 2,
+        hbc.OHLCV_LOW: close - 2,
+        hbc.OHLCV_CLOSE: close,
+        hbc.OHLCV_VOLUME: rng.uniform(1, 10, size=n),
+    })
+
+
+class TestOhclvData(unittest.TestCase):
+
+    def test_refreq_matches_pandas(self):
+        # Drop some bars so that a few buckets are partial or empty
+        bars = make_bars(500)
+        keep = np.ones(500, dtype=bool)
+        keep[[3, 4, 50, 51, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64]] = False
+        bars = OhclvData({k: np.asarray(v)[keep] for k, v in bars.to_dict().items()})
+
+        resampled = bars.refreq(hbc.INTERVAL_15MINUTE).to_df()
+        expected = bars.to_df().resample('15min').agg({
+            hbc.OHLCV_OPEN: 'first',
+            hbc.OHLCV_HIGH: 'max',
+            hbc.OHLCV_LOW: 'min',
+            hbc.OHLCV_CLOSE: 'last',
+            hbc.OHLCV_VOLUME: 'sum',
+        }).dropna()
+        pd.testing.assert_frame_equal(resampled, expected, check_freq=False, check_index_type=False)
+
+    def test_refreq_unsorted_input(self):
+        bars = make_bars(30)
+        reversed_bars = OhclvData({k: v[::-1] for k, v in bars.to_dict().items()})
+        np.testing.assert_array_equal(reversed_bars.refreq('5m').close, bars.refreq('5m').close)
+
+    def test_refreq_session_boundaries(self):
+        bars = make_bars(120)
+        boundaries = bars.timestamps[[10, 70]]
+        resampled = bars.refreq(None, boundaries=boundaries)
+
+        self.assertEqual(resampled.timestamps.tolist(), boundaries.tolist())
+        self.assertEqual(resampled.open[0], bars.open[10])
+        self.assertEqual(resampled.close[0], bars.close[69])
+        self.assertAlmostEqual(resampled.volume[1], bars.volume[70:].sum())
+
+    def test_append_grows_by_doubling(self):
+        bars = make_bars(100)
+        grown = OhclvData({})
+        capacities = set()
+        for i in range(len(bars)):
+            grown.append(bars[i])
+            capacities.add(grown.capacity)
+
+        self.assertEqual(grown.to_dict(), bars.to_dict())
+        self.assertEqual(sorted(capacities), [16, 32, 64, 128])
+
+    def test_extend(self):
+        bars = make_bars(50)
+        grown = bars.slice(0, 20)
+        grown.extend(bars.slice(20, 35))
+        grown.extend({k: np.asarray(v) for k, v in bars.slice(35).to_dict().items()})
+        self.assertEqual(grown.to_dict(), bars.to_dict())
+
+    def test_slices_are_views(self):
+        bars = make_bars(50)
+        view = bars[10:20]
+        self.assertTrue(np.shares_memory(view.close, bars.close))
+        self.assertEqual(view.timestamps.tolist(), bars.timestamps[10:20].tolist())
+
+        # Appending to a view must not overwrite the parent
+        view.append(bars[0])
+        self.assertFalse(np.shares_memory(view.close, bars.close))
+        self.assertEqual(bars[20], make_bars(50)[20])
+
+    def test_between(self):
+        bars = make_bars(50)
+        selected = bars.between(bars.timestamps[5], bars.timestamps[9])
+        self.assertEqual(selected.timestamps.tolist(), bars.timestamps[5:10].tolist())
+        self.assertEqual(len(bars.between(end_time=bars.timestamps[0] - 1)), 0)
+        self.assertEqual(len(bars.between(start_time=bars.timestamps[-1])), 1)
+
+    def test_merge_keeps_last_by_default(self):
+        bars = make_bars(30)
+        first, second = bars[:20], OhclvData(bars[10:].to_dict())
+        second.close[:] = -1.0
+
+        merged = OhclvData.merge(second, first)
+        self.assertEqual(merged.timestamps.tolist(), bars.timestamps.tolist())
+        self.assertEqual(merged.close[:20].tolist(), bars.close[:20].tolist())
+        self.assertEqual(merged.close[20:].tolist(), [-1.0] * 10)
+        self.assertTrue(merged.is_sorted)
+
+        merged = OhclvData.merge(second, first, keep=KEEP_FIRST)
+        self.assertEqual(merged.close.tolist(), bars.close[:10].tolist() + [-1.0] * 20)
+
+    def test_merge_pages_sharing_boundary_bars(self):
+        bars = make_bars(30)
+        pages = [OhclvData(bars[start:start + 11].to_dict()) for start in (0, 10, 20)]
+        for number, page in enumerate(pages):
+            page.close[:] = number
+        single = OhclvData(bars[10:11].to_dict())
+        single.close[:] = -1.0
+
+        with unittest.mock.patch('numpy.argsort', side_effect=AssertionError('sorted the pages')):
+            merged = OhclvData.merge(pages[2], single, pages[0], pages[1])
+            first = OhclvData.merge(pages[2], single, pages[0], pages[1], keep=KEEP_FIRST)
+
+        self.assertEqual(merged.timestamps.tolist(), bars.timestamps.tolist())
+        self.assertEqual(merged.close.tolist(), [0.0] * 10 + [1.0] * 11 + [2.0] * 9)
+        self.assertEqual(first.close.tolist(), [0.0] * 10 + [-1.0] + [1.0] * 9 + [2.0] * 10)
+        self.assertTrue(merged.is_sorted)
+
+    def test_merge_disjoint_and_unsorted_inputs(self):
+        bars = make_bars(30)
+        merged = OhclvData.merge(bars[20:], bars[:10], OhclvData({}), bars[10:20])
+        self.assertEqual(merged.to_dict(), bars.to_dict())
+
+        reversed_bars = OhclvData({field: values[::-1] for field, values in bars.to_dict().items()})
+        self.assertFalse(reversed_bars.is_sorted)
+        self.assertEqual(OhclvData.merge(reversed_bars).to_dict(), bars.to_dict())
+
+        with self.assertRaises(ValueError):
+            OhclvData.merge(bars, keep='middle')
+
+    def test_sorted_flag_follows_appends(self):
+        bars = make_bars(3)
+        self.assertTrue(bars.is_sorted)
+        self.assertTrue(bars[1:].is_sorted)
+
+        bars.extend(make_bars(2, start=int(bars.timestamps[-1]) + MINUTE))
+        self.assertTrue(bars.is_sorted)
+        bars.append(bars[0])
+        self.assertFalse(bars.is_sorted)
+        self.assertTrue(bars.to_df().index.is_monotonic_increasing)
+        self.assertTrue(bars.to_df(ascending=False).index.is_monotonic_decreasing)
+
+    def test_to_df_descending_when_sorted(self):
+        bars = make_bars(10)
+        pd.testing.assert_frame_equal(bars.to_df(ascending=False), bars.to_df().sort_index(ascending=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import subprocess
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+from hist_market_data.registry import AdapterRegistry
+
+
+class DummyApi:
+    def __init__(self, value=None):
+        self.value = value
+
+
+class TestAdapterRegistry(unittest.TestCase):
+
+    def test_imports_target_on_first_use(self):
+        registry = AdapterRegistry('hist_market_data.test_adapters')
+        registry.register('dummy', f'{__name__}:DummyApi')
+
+        api = registry.create('dummy', value=3)
+        self.assertIsInstance(api, DummyApi)
+        self.assertEqual(api.value, 3)
+        self.assertIs(registry.load('dummy'), DummyApi)
+
+    def test_unknown_exchange(self):
+        registry = AdapterRegistry('hist_market_data.test_adapters')
+        with self.assertRaises(ValueError):
+            registry.create('nope')
+
+    def test_discovers_entry_points(self):
+        entry_point = MagicMock(group='hist_market_data.test_adapters')
+        entry_point.name = 'plugin'
+        entry_point.load.return_value = DummyApi
+        registry = AdapterRegistry('hist_market_data.test_adapters')
+        with patch('hist_market_data.registry.entry_points', return_value=[entry_point]) as discover:
+            self.assertIn('plugin', registry.names())
+            self.assertIsInstance(registry.create('plugin'), DummyApi)
+        discover.assert_called_once_with(group='hist_market_data.test_adapters')
+
+    def test_hist_api_only_imports_selected_exchange(self):
+        code = ('import sys\n'
+                'from hist_market_data.hist_api import HistApi\n'
+                'HistApi("binance")\n'
+                'print("tigeropen" in sys.modules, "hist_market_data.REST_api.okx_api" in sys.modules)\n')
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                env={'PYTHONPATH': ':'.join(sys.path)})
+        self.assertEqual(result.stdout.split(), ['False', 'False'])
+
+
+if __name__ == '__main__':
+    unittest.main()
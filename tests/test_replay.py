@@ -0,0 +1,64 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from hist_market_data.bar_store import BarStore
+from hist_market_data.benchmarks.replay import ReplayHarness, load_recorded, parse_speed
+from hist_market_data.benchmarks.synthetic import synthetic_bars
+from hist_market_data import hist_bar_const as hbc
+from hist_market_data.ws.bar_builder import EMIT_CLOSED
+
+
+class TestReplayHarness(unittest.TestCase):
+
+    def test_parse_speed(self):
+        self.assertEqual(parse_speed('100x'), 100.0)
+        self.assertIsNone(parse_speed('max'))
+
+    def test_replays_through_data_service(self):
+        harness = ReplayHarness.synthetic(num_symbols=5, bars=4, history=10, live_emit=EMIT_CLOSED)
+        report = asyncio.run(harness.run())
+
+        self.assertEqual(report['symbols'], 5)
+        self.assertEqual(report['updates'], 5 * 4 * 4)
+        # Every bar but the still-forming last one is closed and acknowledged once
+        self.assertEqual(report['acked'], 5 * 3)
+        self.assertEqual(report['dropped'], 0)
+        self.assertEqual(harness.hist_api.requests, 5 * 2)  # history and gap repair per symbol
+        self.assertGreater(report['latency_ms']['p50'], 0)
+
+    def test_replays_recorded_bars(self):
+        recorded = {'AAA': synthetic_bars(20, seed=1), 'BBB': synthetic_bars(15, seed=2)}
+        with tempfile.TemporaryDirectory() as tmp:
+            store = BarStore(tmp, 'binance')
+            for symbol, ohlcv in recorded.items():
+                store.write(symbol, hbc.INTERVAL_1MINUTE, ohlcv)
+            self.assertEqual({symbol: ohlcv.to_dict() for symbol, ohlcv in load_recorded(tmp, hbc.INTERVAL_1MINUTE, 'binance').items()},
+                             {symbol: ohlcv.to_dict() for symbol, ohlcv in recorded.items()})
+
+            path = os.path.join(tmp, 'bars.csv')
+            frames = [pd.DataFrame(ohlcv.to_dict()).assign(symbol=symbol) for symbol, ohlcv in recorded.items()]
+            # Out of order, with a bar recorded twice
+            pd.concat(frames + [frames[0].iloc[:1]]).iloc[::-1].to_csv(path, index=False)
+            loaded = load_recorded(path, hbc.INTERVAL_1MINUTE)
+        self.assertEqual(list(loaded), ['AAA', 'BBB'])
+        for symbol, ohlcv in recorded.items():
+            np.testing.assert_array_equal(loaded[symbol].timestamps, ohlcv.timestamps)
+            np.testing.assert_allclose(loaded[symbol].close, ohlcv.close)
+
+        harness = ReplayHarness.recorded(loaded, history=10, bars=4, live_emit=EMIT_CLOSED)
+        # Rebased so the live part starts at the current bar, keeping the recorded prices
+        live = harness.ws_api.bars['AAA']
+        self.assertEqual(len(harness.hist_api.bars['AAA']), 10)
+        np.testing.assert_allclose(live.close, recorded['AAA'].close[10:14])
+        self.assertEqual(np.diff(live.timestamps).tolist(), np.diff(recorded['AAA'].timestamps[10:14]).tolist())
+
+        report = asyncio.run(harness.run())
+        self.assertEqual(report['symbols'], 2)
+        self.assertEqual(report['acked'], 2 * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
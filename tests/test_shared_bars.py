@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import unittest
+import numpy as np
+from hist_market_data.shared_bars import SharedBarReader, SharedBarWriter
+from hist_market_data.tests.test_ohclv_data import make_bars
+
+
+def read_close_sum(name, results):
+    reader = SharedBarReader(name)
+    ohlcv, sequence = reader.read()
+    results.put((len(ohlcv), float(ohlcv.close.sum()), ohlcv.close.flags.writeable))
+
+
+class TestSharedBars(unittest.TestCase):
+
+    def setUp(self):
+        self.name = f'test_bars_{os.getpid()}_{self._testMethodName}'
+        self.bars = make_bars(100)
+
+    def tearDown(self):
+        self.writer.close()
+        self.writer.unlink()
+
+    def test_reader_sees_zero_copy_views(self):
+        self.writer = self.bars.slice(0, 60).to_shared_memory(self.name, capacity=100)
+        reader = SharedBarReader(self.name)
+        ohlcv, sequence = reader.read()
+
+        np.testing.assert_array_equal(ohlcv.timestamps, self.bars.timestamps[:60])
+        self.assertFalse(ohlcv.close.flags.writeable)
+        self.assertEqual(reader.read_since(sequence), (None, sequence))
+
+        self.assertEqual(self.writer.append(self.bars.slice(50, 80)), 20)
+        # Earlier views are not moved by appends
+        np.testing.assert_array_equal(ohlcv.close, self.bars.close[:60])
+        appended, new_sequence = reader.read_since(sequence)
+        self.assertGreater(new_sequence, sequence)
+        np.testing.assert_array_equal(appended.timestamps, self.bars.timestamps[:80])
+        reader.close()
+
+    def test_live_bars_update_and_append(self):
+        self.writer = SharedBarWriter(self.name, 10)
+        reader = SharedBarReader(self.name)
+        self.writer.on_bar(self.bars[0])
+        self.writer.on_bar(dict(self.bars[0], close=1.5))
+        self.writer.on_bar(self.bars[1])
+
+        ohlcv, _ = reader.read()
+        self.assertEqual(ohlcv.close.tolist(), [1.5, self.bars.close[1]])
+        reader.close()
+
+    def test_replaces_segment_left_by_crashed_writer(self):
+        stale = SharedBarWriter(self.name, 4)
+        stale.close()  # Never unlinked, as if the process had died
+        self.writer = self.bars.slice(0, 20).to_shared_memory(self.name, capacity=40)
+        reader = SharedBarReader(self.name)
+
+        ohlcv, _ = reader.read()
+        self.assertEqual(reader.capacity, 40)
+        np.testing.assert_array_equal(ohlcv.timestamps, self.bars.timestamps[:20])
+        reader.close()
+
+    def test_full_segment_drops_oldest_bars(self):
+        self.writer = self.bars.slice(0, 10).to_shared_memory(self.name, capacity=10)
+        reader = SharedBarReader(self.name)
+        generation = reader.generation
+        self.writer.append(self.bars.slice(10, 13))
+
+        ohlcv, _ = reader.read()
+        np.testing.assert_array_equal(ohlcv.timestamps, self.bars.timestamps[5:13])
+        self.assertGreater(reader.generation, generation)
+        reader.close()
+
+    def test_other_process_attaches(self):
+        self.writer = self.bars.to_shared_memory(self.name)
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        process = context.Process(target=read_close_sum, args=(self.name, results))
+        process.start()
+        count, close_sum, writeable = results.get(timeout=30)
+        process.join(30)
+
+        self.assertEqual(count, 100)
+        self.assertAlmostEqual(close_sum, float(self.bars.close.sum()))
+        self.assertFalse(writeable)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import time
+import unittest
+from hist_market_data.metrics import MetricsRegistry, REGISTRY
+from hist_market_data.supervisor import IngestSupervisor, Subscription, assign_shards
+
+
+class FakeService:
+    """ Runs in the worker processes; counts subscriptions in the worker's registry. """
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    async def subscribe_ohlcv(self, symbol, interval, topic):
+        REGISTRY.counter('fake_subscribed_total').inc()
+
+    def unsubscribe_ohlcv(self, symbol, interval):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class FlakyService(FakeService):
+    """ Fails the first subscription attempt of every symbol in a worker. """
+    failed = set()
+
+    async def subscribe_ohlcv(self, symbol, interval, topic):
+        if symbol not in self.failed:
+            self.failed.add(symbol)
+            raise ConnectionError('exchange unavailable')
+        await super().subscribe_ohlcv(symbol, interval, topic)
+
+
+def universe(n):
+    return [Subscription('binance', f'SYM{i}', '1m', f'binance.SYM{i}.1m') for i in range(n)]
+
+
+class TestShardAssignment(unittest.TestCase):
+
+    def test_assignment_covers_all_and_is_balanced(self):
+        assignment = assign_shards(universe(1000), [0, 1, 2, 3])
+        sizes = [len(subscriptions) for subscriptions in assignment.values()]
+        self.assertEqual(sum(sizes), 1000)
+        self.assertGreater(min(sizes), 200)
+
+    def test_only_the_lost_workers_subscriptions_move(self):
+        before = assign_shards(universe(500), [0, 1, 2, 3])
+        after = assign_shards(universe(500), [0, 1, 3])
+        for worker in (0, 1, 3):
+            self.assertTrue(set(before[worker]) <= set(after[worker]))
+        self.assertEqual(assign_shards(universe(500), [0, 1, 2, 3]), before)
+
+
+class TestIngestSupervisor(unittest.TestCase):
+
+    def wait_for(self, supervisor, condition, timeout=30):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            supervisor.supervise(0.2)
+
+    def test_rebalances_when_a_worker_dies(self):
+        registry = MetricsRegistry()
+        supervisor = IngestSupervisor(universe(20), num_workers=2, service_factory=FakeService,
+                                      heartbeat_interval=0.2, restart_backoff=60, registry=registry)
+        supervisor.start()
+        try:
+            self.wait_for(supervisor, lambda: all(h.get('active') for h in supervisor.health().values()))
+            self.assertEqual(sum(h['active'] for h in supervisor.health().values()), 20)
+            self.assertEqual(registry.counter('fake_subscribed_total', worker='0').value
+                             + registry.counter('fake_subscribed_total', worker='1').value, 20)
+
+            os.kill(supervisor.health()[0]['pid'], 9)
+            self.wait_for(supervisor, lambda: supervisor.health().get(1, {}).get('active') == 20)
+            self.assertEqual(list(supervisor.assignments()), [1])
+            self.assertFalse(supervisor.health()[0]['alive'])
+        finally:
+            supervisor.stop()
+
+    def test_failed_subscriptions_are_retried(self):
+        supervisor = IngestSupervisor(universe(4), num_workers=1, service_factory=FlakyService,
+                                      heartbeat_interval=0.2, registry=MetricsRegistry())
+        supervisor.start()
+        try:
+            self.wait_for(supervisor, lambda: supervisor.health().get(0, {}).get('active') == 4)
+            self.assertIn('retrying', supervisor.health()[0]['last_error'])
+        finally:
+            supervisor.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch
+from hist_market_data import hist_bar_const as hbc
+
+try:
+    from hist_market_data.ws.tiger_ws_api import TigerWsApi
+except ImportError:  # tigeropen releases without the push client logger helper
+    TigerWsApi = None
+
+
+@unittest.skipIf(TigerWsApi is None, 'tigeropen push client is not importable')
+class TestTigerWsApi(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('hist_market_data.ws.tiger_ws_api.PushClient')
+        self.push_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.ws_api = TigerWsApi()
+
+    def test_failed_connect_is_retried_by_next_subscription(self):
+        self.push_client.connect.side_effect = [ConnectionError('refused'), None]
+
+        with self.assertRaises(ConnectionError):
+            self.ws_api.subscribe_ohlcv('AAPL', hbc.INTERVAL_1MINUTE, lambda bar: None)
+        self.ws_api.subscribe_ohlcv('MSFT', hbc.INTERVAL_1MINUTE, lambda bar: None)
+
+        self.assertEqual(self.push_client.connect.call_count, 2)
+        self.ws_api._on_connect()
+        self.push_client.subscribe_kline.assert_called_once_with(symbols=['AAPL', 'MSFT'])
+
+    def test_reconnect_restores_subscriptions(self):
+        self.ws_api.subscribe_ohlcv('AAPL', hbc.INTERVAL_1MINUTE, lambda bar: None)
+        self.ws_api._on_connect()
+        self.ws_api.subscribe_ohlcv('MSFT', hbc.INTERVAL_1MINUTE, lambda bar: None)
+        self.push_client.subscribe_kline.reset_mock()
+        # The push client calls back once a connect succeeds
+        self.push_client.connect.side_effect = lambda *args: self.ws_api._on_connect()
+
+        with patch('hist_market_data.ws.tiger_ws_api.RECONNECT_BACKOFF', 0.01):
+            self.ws_api._on_disconnect()
+            self.ws_api._reconnect_thread.join(5)
+
+        self.assertTrue(self.ws_api.connected)
+        self.push_client.subscribe_kline.assert_called_once_with(symbols=['AAPL', 'MSFT'])
+
+
+if __name__ == '__main__':
+    unittest.main()
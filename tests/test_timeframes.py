@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+from hist_market_data.timeframes import TimeframeRollup, derive_timeframes, plan_timeframes
+from hist_market_data import hist_bar_const as hbc
+from hist_market_data.tests.test_ohclv_data import make_bars
+
+MINUTE = hbc.INTERVAL_MS[hbc.INTERVAL_1MINUTE]
+INTERVALS = [hbc.INTERVAL_1MINUTE, hbc.INTERVAL_5MINUTE, hbc.INTERVAL_15MINUTE,
+             hbc.INTERVAL_1HOUR, hbc.INTERVAL_4HOUR, hbc.INTERVAL_1DAY]
+
+
+class TestDeriveTimeframes(unittest.TestCase):
+
+    def test_plan_cascades_through_divisors(self):
+        base, plan = plan_timeframes(INTERVALS)
+        self.assertEqual(base, hbc.INTERVAL_1MINUTE)
+        self.assertEqual(dict(plan)[hbc.INTERVAL_1DAY], hbc.INTERVAL_4HOUR)
+        self.assertEqual(dict(plan)[hbc.INTERVAL_15MINUTE], hbc.INTERVAL_5MINUTE)
+        with self.assertRaises(ValueError):
+            plan_timeframes([hbc.INTERVAL_15MINUTE, hbc.INTERVAL_1HOUR], base_interval='7min')
+
+    def test_matches_direct_refreq(self):
+        bars = make_bars(3 * 24 * 60 + 17)
+        derived = derive_timeframes(bars, INTERVALS)
+
+        self.assertIs(derived[hbc.INTERVAL_1MINUTE], bars)
+        for interval in INTERVALS[1:]:
+            expected = bars.refreq(interval)
+            for column in ('timestamps', 'open', 'high', 'low', 'close', 'volume'):
+                np.testing.assert_allclose(getattr(derived[interval], column), getattr(expected, column))
+
+
+class TestTimeframeRollup(unittest.TestCase):
+
+    def test_live_rollup_matches_batch_derivation(self):
+        bars = make_bars(2 * 60 + 7)
+        rollup = TimeframeRollup(hbc.INTERVAL_1MINUTE, [hbc.INTERVAL_1MINUTE, hbc.INTERVAL_15MINUTE, hbc.INTERVAL_1HOUR])
+        latest = {}
+        for row in range(len(bars)):
+            bar = bars[row]
+            # A partial update first, then the final values
+            rollup.update(dict(bar, **{hbc.OHLCV_CLOSE: bar[hbc.OHLCV_OPEN], hbc.OHLCV_VOLUME: 0.0}))
+            for interval, current in rollup.update(bar):
+                latest.setdefault(interval, {})[current[hbc.OHLCV_TIMESTAMP]] = current
+
+        for interval in (hbc.INTERVAL_15MINUTE, hbc.INTERVAL_1HOUR):
+            expected = bars.refreq(interval)
+            got = [latest[interval][ts] for ts in expected.timestamps.tolist()]
+            np.testing.assert_allclose([b[hbc.OHLCV_HIGH] for b in got], expected.high)
+            np.testing.assert_allclose([b[hbc.OHLCV_CLOSE] for b in got], expected.close)
+            np.testing.assert_allclose([b[hbc.OHLCV_VOLUME] for b in got], expected.volume)
+
+    def test_seed_folds_history_of_forming_buckets(self):
+        bars = make_bars(90)
+        seeded = TimeframeRollup(hbc.INTERVAL_1MINUTE, [hbc.INTERVAL_1HOUR])
+        seeded.seed(bars.slice(0, 89))
+        update = dict(seeded.update(bars[89]))[hbc.INTERVAL_1HOUR]
+
+        expected = bars.refreq(hbc.INTERVAL_1HOUR)
+        self.assertEqual(update[hbc.OHLCV_TIMESTAMP], expected.timestamps[-1])
+        self.assertAlmostEqual(update[hbc.OHLCV_VOLUME], expected.volume[-1])
+        self.assertEqual(seeded.update(bars[0]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+from .ohclv_data import OhclvData
+from .resample import interval_to_ms, resample
+from . import hist_bar_const as hbc
+
+
+def plan_timeframes(intervals, base_interval=None):
+    """
+    Orders intervals for cascaded derivation.
+
+    Every interval is derived from the coarsest already derived interval that divides
+    it, so e.g. 1d is built from 4h bars rather than from the base bars.
+
+    Args:
+        intervals (list): The intervals to derive.
+        base_interval (str): The interval of the source bars. Defaults to the finest
+            of `intervals`.
+
+    Returns:
+        tuple: (base_interval, [(interval, source_interval), ...]) from fine to coarse.
+
+    Raises:
+        ValueError: If an interval is not a multiple of the base interval.
+    """
+    lengths = {interval: interval_to_ms(interval) for interval in intervals}
+    if base_interval is None:
+        base_interval = min(lengths, key=lengths.get)
+    base_ms = interval_to_ms(base_interval)
+
+    plan = []
+    derived = [(base_interval, base_ms)]
+    for interval in sorted(lengths, key=lengths.get):
+        interval_ms = lengths[interval]
+        if interval_ms % base_ms:
+            raise ValueError(f'Interval {interval} is not a multiple of the base interval {base_interval}.')
+        if interval == base_interval:
+            continue
+        source = max((candidate for candidate in derived if interval_ms % candidate[1] == 0), key=lambda c: c[1])
+        plan.append((interval, source[0]))
+        derived.append((interval, interval_ms))
+    return base_interval, plan
+
+
+def derive_timeframes(ohlcv, intervals, base_interval=None, offset=0) -> dict:
+    """
+    Derives several coarser timeframes from one series of base-interval bars.
+
+    Each timeframe is aggregated from the previous one it divides, so every step runs
+    over an already reduced array and the base bars are read only once.
+
+    Args:
+        ohlcv (OhclvData): Base-interval bars in ascending timestamp order.
+        intervals (list): The intervals to return, e.g. ['1m', '5m', '1h', '1d'].
+        base_interval (str): The interval of `ohlcv`. Defaults to the finest of `intervals`.
+        offset (int): Alignment of the derived bars in milliseconds past the epoch.
+
+    Returns:
+        dict: OhclvData per requested interval. The base interval, if requested, is `ohlcv` itself.
+    """
+    base_interval, plan = plan_timeframes(intervals, base_interval)
+    series = {base_interval: ohlcv}
+    for interval, source_interval in plan:
+        source = series[source_interval]
+        series[interval] = OhclvData(resample(source.timestamps, source.open, source.high, source.low,
+                                              source.close, source.volume, interval_to_ms(interval), offset))
+    return {interval: series[interval] for interval in intervals}
+
+
+class TimeframeRollup:
+    """
+    Rolls live base-interval bars up into coarser timeframes incrementally.
+
+    Updates of the forming base bar replace it; once a newer base bar starts, the
+    previous one is folded into the aggregate of every timeframe's current bucket. Each
+    update returns the current bar of every timeframe, which LiveBarBuilder then turns
+    into partial and closed emissions like any other live bar.
+    """
+    def __init__(self, base_interval, intervals, offset=0):
+        # Validates that every interval is a multiple of the base interval
+        base_interval, _ = plan_timeframes(list(intervals) + [base_interval], base_interval)
+        self.base_interval = base_interval
+        self.offset = offset
+        self.intervals = [interval for interval in intervals if interval != base_interval]
+        self.include_base = base_interval in intervals
+        self._lengths = {interval: interval_to_ms(interval) for interval in self.intervals}
+        self._buckets = {interval: None for interval in self.intervals}
+        self._folded = {interval: None for interval in self.intervals}
+        self._base = None
+
+    @property
+    def last_timestamp(self):
+        return None if self._base is None else self._base[hbc.OHLCV_TIMESTAMP]
+
+    def seed(self, ohlcv):
+        """ Folds in the history of the buckets that are still forming. """
+        if len(ohlcv) == 0:
+            return
+        last = int(ohlcv.timestamps[-1])
+        coarsest = max(self._lengths.values(), default=0)
+        start = last if not coarsest else (last - self.offset) // coarsest * coarsest + self.offset
+        recent = ohlcv.between(start_time=start)
+        for row in range(len(recent)):
+            self.update(recent[row])
+
+    def update(self, bar):
+        """
+        Applies an update of a base-interval bar.
+
+        Returns:
+            list: (interval, bar) pairs with the current bar of every timeframe,
+                including the base interval if it was requested. Empty for late updates.
+        """
+        timestamp = bar[hbc.OHLCV_TIMESTAMP]
+        if self._base is not None:
+            base_timestamp = self._base[hbc.OHLCV_TIMESTAMP]
+            if timestamp < base_timestamp:
+                return []
+            if timestamp > base_timestamp:
+                for interval in self.intervals:
+                    self._folded[interval] = _combine(self._folded[interval], self._base)
+        self._base = bar
+
+        updates = [(self.base_interval, bar)] if self.include_base else []
+        for interval in self.intervals:
+            interval_ms = self._lengths[interval]
+            bucket = (timestamp - self.offset) // interval_ms * interval_ms + self.offset
+            if bucket != self._buckets[interval]:
+                self._buckets[interval] = bucket
+                self._folded[interval] = None
+            current = _combine(self._folded[interval], bar)
+            current[hbc.OHLCV_TIMESTAMP] = bucket
+            updates.append((interval, current))
+        return updates
+
+
+def _combine(aggregate, bar):
+    if aggregate is None:
+        return dict(bar)
+    return {
+        hbc.OHLCV_TIMESTAMP: aggregate[hbc.OHLCV_TIMESTAMP],
+        hbc.OHLCV_OPEN: aggregate[hbc.OHLCV_OPEN],
+        hbc.OHLCV_HIGH: max(aggregate[hbc.OHLCV_HIGH], bar[hbc.OHLCV_HIGH]),
+        hbc.OHLCV_LOW: min(aggregate[hbc.OHLCV_LOW], bar[hbc.OHLCV_LOW]),
+        hbc.OHLCV_CLOSE: bar[hbc.OHLCV_CLOSE],
+        hbc.OHLCV_VOLUME: aggregate[hbc.OHLCV_VOLUME] + bar[hbc.OHLCV_VOLUME],
+    }
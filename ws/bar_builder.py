@@ -0,0 +1,246 @@
+import threading
+import time
+import numpy as np
+from ..ohclv_data import OhclvData
+from ..resample import interval_to_ms
+from .. import hist_bar_const as hbc
+
+EMIT_CLOSED = 'closed'
+EMIT_THROTTLED = 'throttled'
+
+DEFAULT_RING_CAPACITY = 1000
+DEFAULT_THROTTLE = 1.0  # seconds between partial updates of the same bar
+
+FIELDS = (
+    hbc.OHLCV_TIMESTAMP,
+    hbc.OHLCV_OPEN,
+    hbc.OHLCV_HIGH,
+    hbc.OHLCV_LOW,
+    hbc.OHLCV_CLOSE,
+    hbc.OHLCV_VOLUME,
+)
+
+
+class BarRingBuffer:
+    """
+    A preallocated ring buffer of the most recent `capacity` bars.
+
+    Every bar is written twice, at slot `i` and `i + capacity`, so the most recent
+    bars always form one contiguous slice and can be returned as a zero-copy view.
+    """
+    def __init__(self, capacity=DEFAULT_RING_CAPACITY):
+        self.capacity = capacity
+        self.count = 0
+        self._arrays = {
+            field: np.zeros(2 * capacity, dtype=np.int64 if field == hbc.OHLCV_TIMESTAMP else np.float64)
+            for field in FIELDS
+        }
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def last_timestamp(self):
+        if self.count == 0:
+            return None
+        return int(self._arrays[hbc.OHLCV_TIMESTAMP][(self.count - 1) % self.capacity])
+
+    def append(self, data):
+        self._write(self.count % self.capacity, data)
+        self.count += 1
+
+    def update_last(self, data):
+        """ Overwrites the most recent bar in place. """
+        self._write((self.count - 1) % self.capacity, data)
+
+    def last(self):
+        """
+        Returns:
+            dict: A copy of the most recent bar.
+        """
+        slot = (self.count - 1) % self.capacity
+        return {field: self._arrays[field][slot].item() for field in FIELDS}
+
+    def view(self, n=None) -> OhclvData:
+        """
+        Returns the most recent `n` bars (all retained bars by default) as a zero-copy view.
+
+        The view shares memory with the buffer: the forming bar updates in place and the
+        oldest bars are overwritten once `capacity` newer bars have been appended.
+        """
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % self.capacity + self.capacity
+        return OhclvData.from_arrays(*(self._arrays[field][end - n:end] for field in FIELDS))
+
+    def _write(self, slot, data):
+        for field in FIELDS:
+            column = self._arrays[field]
+            column[slot] = column[slot + self.capacity] = data[field]
+
+
+class LiveBarBuilder:
+    """
+    Assembles live kline updates into bars per (symbol, interval).
+
+    Exchanges such as Tiger push the still-forming bar again on every change. The
+    builder keeps it in a BarRingBuffer, updates it in place and only returns what
+    should be published:
+
+    - EMIT_CLOSED: each bar once, when a newer bar starts or `poll` sees it has ended.
+    - EMIT_THROTTLED: closed bars as above, plus the forming bar at most once every
+      `throttle` seconds.
+    """
+    def __init__(self, emit=EMIT_THROTTLED, throttle=DEFAULT_THROTTLE, capacity=DEFAULT_RING_CAPACITY, clock=time.monotonic):
+        if emit not in (EMIT_CLOSED, EMIT_THROTTLED):
+            raise ValueError(f'Emit mode {emit} is not supported.')
+        self.emit = emit
+        self.throttle = throttle
+        self.capacity = capacity
+        self.clock = clock
+        self._buffers = {}
+        # Per key: [closed bar already emitted, last partial emit time, partial pending]
+        self._state = {}
+        self._interval_lengths = {}
+        self._lock = threading.Lock()
+
+    def on_bar(self, symbol, interval, data):
+        """
+        Applies a kline update.
+
+        Returns:
+            list: The bar dicts to publish, oldest first.
+        """
+        key = (symbol, interval)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = BarRingBuffer(self.capacity)
+                self._state[key] = [True, None, False]
+            state = self._state[key]
+
+            emitted = []
+            last_timestamp = buffer.last_timestamp
+            timestamp = data[hbc.OHLCV_TIMESTAMP]
+            if last_timestamp is not None and timestamp < last_timestamp:
+                # Late update for a bar that has already been superseded
+                return emitted
+
+            if last_timestamp is None or timestamp > last_timestamp:
+                if not state[0]:
+                    emitted.append(buffer.last())
+                buffer.append(data)
+                state[:] = [False, None, False]
+            else:
+                buffer.update_last(data)
+
+            if self.emit == EMIT_THROTTLED:
+                now = self.clock()
+                if state[1] is None or now - state[1] >= self.throttle:
+                    emitted.append(buffer.last())
+                    state[1] = now
+                    state[2] = False
+                else:
+                    state[2] = True
+            return emitted
+
+    def backfill(self, symbol, interval, ohlcv):
+        """
+        Merges closed bars fetched over REST, e.g. to repair a gap after a reconnect.
+
+        Bars older than the newest bar in the buffer are ignored, a bar with the same
+        timestamp replaces it with its final values, and newer bars are appended. All
+        merged bars are treated as closed, so each is returned exactly once.
+
+        Args:
+            ohlcv (OhclvData): Closed bars in ascending timestamp order.
+
+        Returns:
+            list: The bar dicts to publish, oldest first.
+        """
+        key = (symbol, interval)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = BarRingBuffer(self.capacity)
+                self._state[key] = [True, None, False]
+            state = self._state[key]
+
+            emitted = []
+            merged = False
+            last_timestamp = buffer.last_timestamp
+            if last_timestamp is not None:
+                ohlcv = ohlcv.between(start_time=last_timestamp)
+            for row in range(len(ohlcv)):
+                data = ohlcv[row]
+                if data[hbc.OHLCV_TIMESTAMP] == last_timestamp:
+                    if state[0] and buffer.last() == data:
+                        continue  # Already published with these values
+                    buffer.update_last(data)
+                else:
+                    if not state[0] and buffer.count:
+                        emitted.append(buffer.last())
+                    buffer.append(data)
+                state[0] = False
+                merged = True
+            if merged:
+                emitted.append(buffer.last())
+                state[:] = [True, None, False]
+            return emitted
+
+    def last_timestamp(self, symbol, interval):
+        """
+        Returns:
+            int: The timestamp of the newest bar of a subscription, or None if it has none.
+        """
+        buffer = self._buffers.get((symbol, interval))
+        return None if buffer is None else buffer.last_timestamp
+
+    def poll(self, now_ms=None, keys=None):
+        """
+        Emits bars whose interval has ended and throttled partial updates that are due.
+
+        Args:
+            now_ms (int): The current time in epoch milliseconds.
+            keys (list): Only poll these (symbol, interval) keys, all if None.
+
+        Returns:
+            list: (symbol, interval, bar) tuples to publish.
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        now = self.clock()
+        emitted = []
+        with self._lock:
+            for key in (self._buffers if keys is None else keys):
+                buffer = self._buffers.get(key)
+                if buffer is None:
+                    continue
+                state = self._state[key]
+                if state[0] or buffer.count == 0:
+                    continue
+                interval_ms = self._interval_ms(key[1])
+                if interval_ms is not None and buffer.last_timestamp + interval_ms <= now_ms:
+                    emitted.append((key[0], key[1], buffer.last()))
+                    state[0] = True
+                elif state[2] and now - state[1] >= self.throttle:
+                    emitted.append((key[0], key[1], buffer.last()))
+                    state[1] = now
+                    state[2] = False
+        return emitted
+
+    def _interval_ms(self, interval):
+        if interval not in self._interval_lengths:
+            try:
+                self._interval_lengths[interval] = interval_to_ms(interval)
+            except ValueError:
+                # Bars of intervals without a fixed length only close on a newer bar
+                self._interval_lengths[interval] = None
+        return self._interval_lengths[interval]
+
+    def bars(self, symbol, interval, n=None) -> OhclvData:
+        """
+        Returns the most recent bars of a subscription as a zero-copy OhclvData view.
+        """
+        buffer = self._buffers.get((symbol, interval))
+        if buffer is None:
+            return OhclvData({})
+        return buffer.view(n)
@@ -1,3 +1,5 @@
+import threading
+import time
 from tigeropen.push.push_client import PushClient
 from tigeropen.common.util.common_utils import get_logger
 from ..hist_bar_const import (
@@ -15,6 +17,10 @@ TIGER_LICENSE = 'your_license'
 TIGER_PRIVATE_KEY = 'your_private_key'
 TIGER_ACCOUNT = 'your_account'
 
+RECONNECT_BACKOFF = 1.0  # seconds, doubled after every failed attempt
+MAX_RECONNECT_BACKOFF = 60.0
+CONNECT_TIMEOUT = 10.0  # seconds to wait for connect_callback after connect()
+
 _logger = get_logger(__name__)
 
 class TigerWsApi(BaseWsApi):
@@ -26,6 +32,70 @@ class TigerWsApi(BaseWsApi):
         # Register the kline_changed callback
         self.push_client.kline_changed = self._on_kline_changed
 
+        # Track the connection so dropped streams are reconnected and resubscribed
+        self.push_client.connect_callback = self._on_connect
+        self.push_client.disconnect_callback = self._on_disconnect
+        self.push_client.error_callback = self._on_error
+        self._connected_event = threading.Event()
+        self._reconnect_thread = None
+        self._connecting = False
+        self._closing = False
+        self._lock = threading.Lock()
+
+    def connect(self):
+        self._closing = False
+        with self._lock:
+            self._connecting = True
+        try:
+            self.push_client.connect(TIGER_ACCOUNT, TIGER_PRIVATE_KEY)
+        except Exception:
+            # Let the next subscribe_ohlcv try again instead of waiting for a callback that never comes
+            with self._lock:
+                self._connecting = False
+            raise
+
+    def disconnect(self):
+        self._closing = True
+        self.push_client.disconnect()
+
+    def _on_connect(self, *args):
+        _logger.info("Tiger push connection established")
+        with self._lock:
+            symbols = list(self.ohlcv_callbacks)
+            self.connected = True
+            self._connecting = False
+        if symbols:
+            # A new session has no subscriptions, so restore them after a reconnect
+            self.push_client.subscribe_kline(symbols=symbols)
+        self._connected_event.set()
+        self._notify_connection(True)
+
+    def _on_disconnect(self, *args):
+        self._connected_event.clear()
+        self._notify_connection(False)
+        if self._closing:
+            return
+        _logger.warning("Tiger push connection lost, reconnecting")
+        with self._lock:
+            if self._reconnect_thread is None or not self._reconnect_thread.is_alive():
+                self._reconnect_thread = threading.Thread(target=self._reconnect, name='tiger-ws-reconnect', daemon=True)
+                self._reconnect_thread.start()
+
+    def _on_error(self, *args):
+        _logger.error(f"Tiger push error: {args}")
+
+    def _reconnect(self):
+        backoff = RECONNECT_BACKOFF
+        while not self._closing and not self._connected_event.is_set():
+            time.sleep(backoff)
+            try:
+                self.push_client.connect(TIGER_ACCOUNT, TIGER_PRIVATE_KEY)
+            except Exception as e:
+                _logger.warning(f"Tiger push reconnect failed: {e}")
+            if self._connected_event.wait(CONNECT_TIMEOUT):
+                return
+            backoff = min(backoff * 2, MAX_RECONNECT_BACKOFF)
+
     def _on_kline_changed(self, kline_data):
         symbol = kline_data.symbol
         # Assuming interval is not directly available in kline_data, 
@@ -55,11 +125,17 @@ class TigerWsApi(BaseWsApi):
         # We'll subscribe to the symbol and assume the callback handles the interval filtering if needed.
         # The interval parameter here is for standardization with BaseWsApi.
         
-        if symbol not in self.ohlcv_callbacks:
-            self.ohlcv_callbacks[symbol] = []
-        self.ohlcv_callbacks[symbol].append(callback)
+        with self._lock:
+            if symbol not in self.ohlcv_callbacks:
+                self.ohlcv_callbacks[symbol] = []
+            self.ohlcv_callbacks[symbol].append(callback)
+            connected, connecting = self.connected, self._connecting
 
-        self.push_client.subscribe_kline(symbols=[symbol])
+        if connected:
+            self.push_client.subscribe_kline(symbols=[symbol])
+        elif not connecting:
+            # _on_connect subscribes every registered symbol
+            self.connect()
         _logger.info(f"Subscribed to OHLCV for {symbol} (interval: {interval})")
 
     def subscribe_trades(self, symbol, callback):
@@ -1,8 +1,26 @@
 from abc import ABC, abstractmethod
+from ..registry import WS_ADAPTERS
 
 class BaseWsApi(ABC):
     def __init__(self, exchange_name):
         self.exchange_name = exchange_name
+        self.connected = False
+        self._connection_listeners = []
+
+    def add_connection_listener(self, on_connected=None, on_disconnected=None):
+        """
+        Registers callbacks for connection state changes. Both are called with the
+        exchange name from the client's thread; on_connected also fires after every
+        successful reconnect.
+        """
+        self._connection_listeners.append((on_connected, on_disconnected))
+
+    def _notify_connection(self, connected):
+        self.connected = connected
+        for on_connected, on_disconnected in list(self._connection_listeners):
+            listener = on_connected if connected else on_disconnected
+            if listener is not None:
+                listener(self.exchange_name)
 
     @abstractmethod
     def subscribe_ohlcv(self, symbol, interval, callback):
@@ -18,32 +36,40 @@ class BaseWsApi(ABC):
 
     # Add other common subscription methods as needed
 
-from .tiger_ws_api import TigerWsApi
-
 class WsApi:
-    def __init__(self):
+    """
+    Routes subscriptions to per-exchange WebSocket APIs.
+
+    Adapters from the WS_ADAPTERS registry are imported and constructed on the first
+    subscription to their exchange, unless listed in `warm_up`.
+    """
+    def __init__(self, warm_up=()):
         self.apis = {}
-        self.register_api('tiger', TigerWsApi())
+        for exchange_name in warm_up:
+            self.get_api(exchange_name)
 
     def register_api(self, exchange_name, api_instance):
         if not isinstance(api_instance, BaseWsApi):
             raise ValueError("API instance must inherit from BaseWsApi")
         self.apis[exchange_name] = api_instance
 
-    def subscribe_ohlcv(self, exchange, symbol, interval, callback):
+    def get_api(self, exchange):
         api = self.apis.get(exchange)
-        if not api:
-            raise ValueError(f"No WebSocket API registered for exchange: {exchange}")
-        api.subscribe_ohlcv(symbol, interval, callback)
+        if api is None:
+            if exchange not in WS_ADAPTERS:
+                raise ValueError(f"No WebSocket API registered for exchange: {exchange}")
+            api = WS_ADAPTERS.create(exchange)
+            self.register_api(exchange, api)
+        return api
+
+    def add_connection_listener(self, exchange, on_connected=None, on_disconnected=None):
+        self.get_api(exchange).add_connection_listener(on_connected, on_disconnected)
+
+    def subscribe_ohlcv(self, exchange, symbol, interval, callback):
+        self.get_api(exchange).subscribe_ohlcv(symbol, interval, callback)
 
     def subscribe_trades(self, exchange, symbol, callback):
-        api = self.apis.get(exchange)
-        if not api:
-            raise ValueError(f"No WebSocket API registered for exchange: {exchange}")
-        api.subscribe_trades(symbol, callback)
+        self.get_api(exchange).subscribe_trades(symbol, callback)
 
     def subscribe_depth(self, exchange, symbol, callback):
-        api = self.apis.get(exchange)
-        if not api:
-            raise ValueError(f"No WebSocket API registered for exchange: {exchange}")
-        api.subscribe_depth(symbol, callback)
+        self.get_api(exchange).subscribe_depth(symbol, callback)